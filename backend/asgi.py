@@ -0,0 +1,169 @@
+import asyncio
+import contextvars
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from events import EventStream
+from main import createApp
+
+
+class AsgiAdapter:
+    """
+    Serves the Flask app over ASGI.
+
+    The event loop reads each request body and writes each response, however slowly the client
+    sends or receives them. A worker thread is only borrowed while the Flask view runs, so thousands
+    of idle or slow connections no longer pin thousands of threads. `maxThreads` bounds how many
+    views run at once, in line with the database pool size. Event streams are awaited on the loop itself,
+    so an open stream waiting for its next event holds no thread. Other streamed bodies, such as exports,
+    read each chunk after the first on a separate pool of up to `maxStreams` threads, so they never hold up
+    views. Request bodies over `spoolBytes` are buffered in a temporary file rather than in memory, so large
+    uploads such as inventory imports stay within a constant footprint.
+    """
+
+    def __init__(self, wsgiApp, maxThreads=32, maxStreams=64, spoolBytes=1048576):
+        self.wsgiApp = wsgiApp
+        self.spoolBytes = spoolBytes
+        self.executor = ThreadPoolExecutor(max_workers=maxThreads, thread_name_prefix="asgi")
+        self.streamExecutor = ThreadPoolExecutor(max_workers=maxStreams, thread_name_prefix="asgi-stream")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.handle(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # Waiting for running views would block the loop, and with it every other connection
+                await loop.run_in_executor(None, self.executor.shutdown, True)
+                self.streamExecutor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def handle(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=self.spoolBytes)
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                body.close()
+                return
+            body.write(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+
+        loop = asyncio.get_running_loop()
+        environ = buildEnviron(scope, body)
+        response = {}
+
+        def startResponse(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                   for name, value in headers]
+
+        def callApp():
+            # Runs until the first body chunk, since start_response may be deferred until then
+            result = self.wsgiApp(environ, startResponse)
+            chunks = iter(result)
+            return result, chunks, next(chunks, None)
+
+        # Each step of the request may run on a different thread, so all of them share one context, as they
+        # would on a WSGI server's single thread; stream_with_context bodies rely on it between chunks
+        context = contextvars.copy_context()
+        result, chunks, chunk = await loop.run_in_executor(self.executor, context.run, callApp)
+        eventStream = environ.get(EventStream.ENVIRON_KEY)
+        asyncFrames = eventStream.asyncFrames() if eventStream is not None else None
+        disconnected = asyncio.Event()
+
+        async def nextChunk():
+            if asyncFrames is None:
+                return await loop.run_in_executor(self.streamExecutor, context.run, next, chunks, None)
+            # An event stream waits on the loop, and stops waiting as soon as the client goes away
+            frame = asyncio.ensure_future(asyncFrames.__anext__())
+            gone = asyncio.ensure_future(disconnected.wait())
+            await asyncio.wait({frame, gone}, return_when=asyncio.FIRST_COMPLETED)
+            gone.cancel()
+            if not frame.done():
+                frame.cancel()
+                await asyncio.wait({frame})  # Lets the generator unwind before it is closed
+                return None
+            try:
+                return frame.result()
+            except StopAsyncIteration:
+                return None
+
+        async def watchDisconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watchDisconnect())
+        try:
+            await send({"type": "http.response.start", "status": response["status"],
+                        "headers": response["headers"]})
+            while chunk is not None and not disconnected.is_set():
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await nextChunk()
+            if not disconnected.is_set():
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+            if asyncFrames is not None:
+                await asyncFrames.aclose()
+            if hasattr(result, "close"):
+                # Closing a generator body runs its cleanup, e.g. an event stream unsubscribing
+                await loop.run_in_executor(self.streamExecutor, context.run, result.close)
+            body.close()
+
+
+def buildEnviron(scope, body):
+    """Translates an ASGI HTTP scope and a file holding its complete body into a WSGI environ"""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.input_terminated": True,  # The whole body is buffered, so it can be read without a Content-Length
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "asgi.scope": scope,
+    }
+
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    return environ
+
+
+def createAsgiApp(config):
+    app = createApp(config)
+    return AsgiAdapter(app, maxThreads=app.config.get('ASGI_THREADS', 32),
+                       maxStreams=app.config.get('ASGI_STREAM_THREADS', 64),
+                       spoolBytes=app.config.get('ASGI_BODY_SPOOL_BYTES', 1048576))
@@ -1,8 +1,8 @@
 from flask import jsonify, request, make_response # Flask
 from flask_restx import Resource, Namespace, fields
-from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
 from models import User
+from passwords import getPasswordHasher
 
 authNS = Namespace('auth', description="A namespace for authentication")
 
@@ -34,7 +34,7 @@ class Register(Resource):
         newUser = User(
             username = data.get('username'),
             email = data.get('email'),
-            password = generate_password_hash(data.get('password'))
+            password = getPasswordHasher().hash(data.get('password'))
         )
 
         newUser.save()
@@ -51,10 +51,17 @@ class Login(Resource):
         password = data.get('password')
 
         dbUser = User.query.filter_by(username=username).first()
+        hasher = getPasswordHasher()
 
-        if dbUser and check_password_hash(dbUser.password, password):
-            accessToken = create_access_token(identity=dbUser.username)
-            refreshToken = create_refresh_token(identity=dbUser.username)
+        if dbUser and hasher.verify(dbUser.password, password):
+            if hasher.needsRehash(dbUser.password):
+                # Upgrade hashes made with an older method or cost while the plaintext is at hand
+                dbUser.password = hasher.hash(password)
+                dbUser.save()
+
+            # The user id rides along as a claim so inventory requests can scope rows without a user lookup
+            accessToken = create_access_token(identity=dbUser.username, additional_claims={"uid": dbUser.id})
+            refreshToken = create_refresh_token(identity=dbUser.username, additional_claims={"uid": dbUser.id})
 
             return make_response(jsonify({
                 "accessToken": accessToken, "refreshToken": refreshToken
@@ -65,6 +72,7 @@ class RefreshToken(Resource):
     @jwt_required(refresh=True)
     def post(self):
         currentUser = get_jwt_identity()
-        newAccessToken = create_access_token(identity=currentUser)
+        claims = {"uid": get_jwt()["uid"]} if "uid" in get_jwt() else None
+        newAccessToken = create_access_token(identity=currentUser, additional_claims=claims)
 
         return make_response(jsonify({"accessToken" : newAccessToken}), 200)
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""
+Per-endpoint throughput and latency of the API at several dataset sizes.
+
+Each size gets a fresh SQLite database seeded with deterministic data (see benchmarks.datasets), then every
+scenario is driven with concurrent requests through either the Flask test client or a server launched
+locally on a free port. Results are printed as JSON; with --baseline they are compared against an earlier
+run and the exit status is 1 if any scenario's p95 latency regressed by more than --threshold.
+
+Run from backend/:
+    python -m benchmarks.api_latency --sizes 10000 100000 --target testclient server --output results.json
+    python -m benchmarks.api_latency --sizes 10000 --baseline results.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.datasets import BENCHMARK_PASSWORD, FOODS, seedDatabase
+from config import Config, TestConfig
+from exts import db
+from main import createApp
+
+
+def makeConfig(databasePath, hashMethod, responseCache):
+    class BenchmarkConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + databasePath
+        PASSWORD_HASH_METHOD = hashMethod
+        RESPONSE_CACHE_BACKEND = Config.RESPONSE_CACHE_BACKEND if responseCache else ""
+        JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    return BenchmarkConfig
+
+
+# Scenarios: functions of (rng, context) returning (method, path, json body)
+
+def listFirstPage(rng, context):
+    return "GET", "/inventory/inventory?limit=50", None
+
+
+def listDeepPage(rng, context):
+    return "GET", f"/inventory/inventory?limit=50&cursor={rng.choice(context['itemIDs'])}", None
+
+
+def listFiltered(rng, context):
+    return "GET", f"/inventory/inventory?limit=50&max_quantity={rng.randint(0, 5)}", None
+
+
+def expiring(rng, context):
+    return "GET", f"/inventory/inventory/expiring?days={rng.randint(1, 30)}", None
+
+
+def expired(rng, context):
+    return "GET", "/inventory/inventory/expired", None
+
+
+def search(rng, context):
+    term = rng.choice(FOODS).split()[0].lower()
+    return "GET", f"/inventory/inventory/search?q={term[:rng.randint(3, len(term))]}", None
+
+
+def getItem(rng, context):
+    return "GET", f"/inventory/inventory/{rng.choice(context['itemIDs'])}", None
+
+
+def syncRecent(rng, context):
+    return "GET", f"/inventory/inventory/sync?since={max(0, context['version'] - rng.randint(1, 5))}", None
+
+
+def patchDelta(rng, context):
+    return "PATCH", f"/inventory/inventory/{rng.choice(context['itemIDs'])}", {"delta": rng.choice([-1, 1])}
+
+
+def login(rng, context):
+    return "POST", "/auth/login", {"username": context['username'], "password": BENCHMARK_PASSWORD}
+
+
+SCENARIOS = {
+    "list_first_page": listFirstPage,
+    "list_deep_page": listDeepPage,
+    "list_filtered": listFiltered,
+    "expiring": expiring,
+    "expired": expired,
+    "search": search,
+    "get_item": getItem,
+    "sync_recent": syncRecent,
+    "patch_delta": patchDelta,
+    "login": login,
+}
+SLOW_SCENARIOS = {"login"}  # Dominated by password hashing, so they run a tenth of the requests
+
+
+class TestClientTarget:
+    """Calls the app in-process through Flask's test client"""
+    name = "testclient"
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method, path, headers, body):
+        response = self.app.test_client().open(path, method=method, headers=headers, json=body)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_request(self, *args, **kwargs):
+        pass  # An access log line per request would be measured too
+
+
+class ServerTarget:
+    """Serves the app from a threaded server on a free local port and calls it over HTTP keep-alive connections"""
+    name = "server"
+
+    def __init__(self, app):
+        self.server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=KeepAliveRequestHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.local = threading.local()
+
+    def request(self, method, path, headers, body):
+        if not hasattr(self.local, "connection"):
+            self.local.connection = http.client.HTTPConnection("127.0.0.1", self.server.server_port)
+        payload = json.dumps(body) if body is not None else None
+        requestHeaders = {**headers, "Content-Type": "application/json"} if body is not None else headers
+        self.local.connection.request(method, path, body=payload, headers=requestHeaders)
+        response = self.local.connection.getresponse()
+        response.read()
+        return response.status
+
+    def close(self):
+        self.server.shutdown()
+
+
+TARGETS = {"testclient": TestClientTarget, "server": ServerTarget}
+
+
+def percentile(sortedValues, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * fraction))]
+
+
+def runScenario(target, scenario, context, headers, requests, concurrency, seed):
+    rng = random.Random(seed)
+    calls = [SCENARIOS[scenario](rng, context) for _ in range(requests)]
+    for method, path, body in calls[:min(5, requests)]:  # Warms up connections, caches and the query planner
+        target.request(method, path, headers, body)
+
+    def timed(call):
+        method, path, body = call
+        started = time.perf_counter()
+        status = target.request(method, path, headers, body)
+        elapsed = time.perf_counter() - started
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} returned {status}")
+        return elapsed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(timed, calls))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "requests_per_second": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+def runSize(size, args):
+    userCount = max(1, size // args.items_per_user)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        app = createApp(makeConfig(os.path.join(directory, "bench.db"), args.hash_method, args.response_cache))
+        started = time.perf_counter()
+        with app.app_context():
+            seedDatabase(size, userCount, seed=args.seed)
+        print(f"Seeded {size} items for {userCount} users in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        # The benchmark user is user 1, whose items are every userCount-th one
+        context = {"username": "bench0", "itemIDs": list(range(1, size + 1, userCount)),
+                   "version": -(-size // userCount)}
+        loginResponse = app.test_client().post('/auth/login', json={"username": "bench0", "password": BENCHMARK_PASSWORD})
+        headers = {"Authorization": f"Bearer {loginResponse.json['accessToken']}"}
+
+        for targetName in args.target:
+            target = TARGETS[targetName](app)
+            try:
+                for scenario in args.scenarios:
+                    requests = max(10, args.requests // 10) if scenario in SLOW_SCENARIOS else args.requests
+                    result = runScenario(target, scenario, context, headers, requests, args.concurrency, args.seed)
+                    results.append({"size": size, "users": userCount, "target": targetName, "scenario": scenario,
+                                    **result})
+                    print(f"{size:>9} {targetName:<10} {scenario:<16} p50 {result['p50_ms']:>9.2f}ms  "
+                          f"p95 {result['p95_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+                          f"{result['requests_per_second']:>9.1f} req/s", file=sys.stderr)
+            finally:
+                target.close()
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    return results
+
+
+def compareToBaseline(results, baseline, threshold):
+    """Returns a comparison row per result that has a baseline counterpart, flagging p95 regressions"""
+    baselineResults = {(result["size"], result["target"], result["scenario"]): result
+                       for result in baseline["results"]}
+    comparisons = []
+    for result in results:
+        before = baselineResults.get((result["size"], result["target"], result["scenario"]))
+        if before is None:
+            continue
+        change = result["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        comparisons.append({"size": result["size"], "target": result["target"], "scenario": result["scenario"],
+                            "baseline_p95_ms": before["p95_ms"], "p95_ms": result["p95_ms"],
+                            "p95_change": round(change, 3), "regressed": change > threshold})
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="Total inventory items")
+    parser.add_argument("--items-per-user", type=int, default=1000)
+    parser.add_argument("--target", nargs="+", choices=sorted(TARGETS), default=["testclient"])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hash-method", default=Config.PASSWORD_HASH_METHOD)
+    parser.add_argument("--response-cache", action="store_true",
+                        help="Keep the response cache on; by default every request reaches the database")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p95 slowdown before failing, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {"date": date.today().isoformat(), "python": platform.python_version(),
+                 "platform": platform.platform(), "cpus": os.cpu_count(), "seed": args.seed,
+                 "concurrency": args.concurrency, "response_cache": args.response_cache},
+        "results": [result for size in args.sizes for result in runSize(size, args)],
+    }
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            report["comparison"] = compareToBaseline(report["results"], json.load(baselineFile), args.threshold)
+        for row in report["comparison"]:
+            flag = "REGRESSED" if row["regressed"] else ""
+            print(f"{row['size']:>9} {row['target']:<10} {row['scenario']:<16} p95 {row['baseline_p95_ms']:>9.2f}ms -> "
+                  f"{row['p95_ms']:>9.2f}ms ({row['p95_change']:+.0%}) {flag}", file=sys.stderr)
+        regressed = any(row["regressed"] for row in report["comparison"])
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            outputFile.write(output)
+    print(output)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
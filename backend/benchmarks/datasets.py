@@ -0,0 +1,99 @@
+"""
+Deterministic dataset generators for the benchmarks.
+
+The same seed and sizes always produce the same users and items, so results from different runs and
+machines are measured against identical data. Rows are generated lazily and inserted in batches with
+executemany, so seeding a million items keeps memory flat.
+"""
+import random
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from exts import db
+from models import FoodInventory, InventoryVersion, User
+
+BENCHMARK_PASSWORD = "password"
+SEED_BATCH_SIZE = 10000
+
+FOODS = ["Milk", "Eggs", "Bread", "Butter", "Cheddar Cheese", "Greek Yoghurt", "Chicken Breast", "Ground Beef",
+         "Salmon Fillet", "Tofu", "Rice", "Pasta", "Oats", "Flour", "Sugar", "Olive Oil", "Tomato Sauce", "Black Beans",
+         "Chickpeas", "Lentils", "Apples", "Bananas", "Oranges", "Strawberries", "Spinach", "Carrots", "Onions",
+         "Potatoes", "Garlic", "Broccoli", "Peanut Butter", "Honey", "Coffee", "Tea", "Orange Juice", "Frozen Peas"]
+PANTRY_STAPLES = ["Salt", "Black Pepper", "Water", "Vegetable Oil", "Soy Sauce", "Vinegar", "Paprika", "Cumin",
+                  "Basil", "Oregano", "Thyme", "Parsley", "Cinnamon", "Ginger", "Lemons", "Limes", "Chili Flakes"]
+RECIPE_STYLES = ["Stew", "Salad", "Soup", "Bake", "Stir Fry", "Curry", "Pie", "Wraps", "Casserole", "Bowl"]
+BRANDS = ["Organic", "Value", "Farm Fresh", "Store Brand", "Premium", "Local", "Family Size", "Light"]
+
+
+def userRows(count):
+    """Yields count users named bench0, bench1, ... all with BENCHMARK_PASSWORD"""
+    # One cheap hash shared by every user; logins still run the configured method through the rehash path
+    passwordHash = generate_password_hash(BENCHMARK_PASSWORD, "pbkdf2:sha256:1000")
+    for index in range(count):
+        yield {"id": index + 1, "username": f"bench{index}", "email": f"bench{index}@company.com",
+               "password": passwordHash}
+
+
+def itemRows(count, userCount, seed=0, today=None):
+    """
+    Yields count items spread round-robin over users 1..userCount.
+    Expiry dates span from 30 days ago to a year ahead, so the expired and expiring views have work to do.
+    Each item's row_version is its position in its owner's inventory, as if written one at a time.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    for index in range(count):
+        userID = index % userCount + 1
+        yield {
+            "id": index + 1,
+            "name": f"{rng.choice(BRANDS)} {rng.choice(FOODS)}",
+            "quantity": rng.randint(0, 20),
+            "expiry_date": today + timedelta(days=rng.randint(-30, 365)),
+            "user_id": userID,
+            "row_version": index // userCount + 1,
+            "updated_at": datetime(2026, 1, 1),
+        }
+
+
+def recipeRows(count, seed=0, ingredientCount=2000):
+    """
+    Yields count recipes with 3 to 12 ingredients from a vocabulary of about ingredientCount.
+    Ingredients are drawn with Zipf-like weights, so staples such as salt appear in a large share of the recipes,
+    as they do in real corpora, and changes to them touch many recipes.
+    """
+    rng = random.Random(seed)
+    vocabulary = [food.lower() for food in FOODS + PANTRY_STAPLES]
+    vocabulary += [f"{word} {index}" for index in range(ingredientCount - len(vocabulary))
+                   for word in [rng.choice(FOODS + PANTRY_STAPLES).lower()]]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    for index in range(count):
+        ingredients = set(rng.choices(vocabulary, weights, k=rng.randint(3, 12)))
+        yield {"id": index + 1, "name": f"{rng.choice(FOODS)} {rng.choice(RECIPE_STYLES)} {index}",
+               "ingredients": "\n".join(sorted(ingredients))}
+
+
+def insertBatches(table, rows):
+    while True:
+        batch = list(islice(rows, SEED_BATCH_SIZE))
+        if not batch:
+            return
+        db.session.execute(insert(table), batch)
+        db.session.commit()
+
+
+def seedDatabase(itemCount, userCount, seed=0):
+    """Creates the schema and fills it with userCount users and itemCount items; needs an app context"""
+    db.create_all()
+    insertBatches(User.__table__, userRows(userCount))
+    insertBatches(FoodInventory.__table__, itemRows(itemCount, userCount, seed))
+
+    now = datetime.utcnow()
+    versions = ({"user_id": userID, "version": -(-itemCount // userCount), "updated_at": now}
+                for userID in range(1, userCount + 1))
+    insertBatches(InventoryVersion.__table__, versions)
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(db.text("ANALYZE"))  # Gives the planner row counts, as a long-running database has
+        db.session.commit()
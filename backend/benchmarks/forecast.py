@@ -0,0 +1,146 @@
+"""
+Latency of the run-out forecasts at several inventory sizes.
+
+Each size gets a fresh SQLite database with one user's items (see benchmarks.datasets) and a deterministic
+consumption history of --events-per-item events per item spread over the forecast window. It reports the
+whole forecastInventory call (both queries included), the vectorized fit on its own, and the same fit done
+item by item with np.polyfit for comparison. Results are printed as JSON.
+
+Run from backend/:
+    python -m benchmarks.forecast --items 100 1000 10000 --output forecast.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from benchmarks.datasets import insertBatches, seedDatabase
+from config import TestConfig
+from exts import db
+from forecast import fitConsumptionRates, forecastInventory
+from main import createApp
+from models import FoodInventory, InventoryEvent
+
+
+def makeConfig(databasePath):
+    class BenchmarkConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + databasePath
+        METRICS_ENABLED = False
+    return BenchmarkConfig
+
+
+def eventRows(items, eventsPerItem, windowDays, seed=0, now=None):
+    """Yields a create per item followed by eventsPerItem uses and restocks at random times in the window"""
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    for item in items:
+        ages = sorted((rng.uniform(0, windowDays) for _ in range(eventsPerItem + 1)), reverse=True)
+        level = item.quantity + eventsPerItem
+        yield {"item_id": item.id, "user_id": 1, "name": item.name, "action": "create", "quantity": level,
+               "delta": level, "created_at": now - timedelta(days=ages[0])}
+        for age in ages[1:]:
+            delta = -rng.randint(1, 2) if level > 0 and rng.random() < 0.85 else rng.randint(1, 5)
+            level += delta
+            yield {"item_id": item.id, "user_id": 1, "name": item.name, "action": "update", "quantity": level,
+                   "delta": delta, "created_at": now - timedelta(days=age)}
+
+
+def perItemRates(groups, days, deltas, windowDays, itemCount):
+    """The reference fit: one np.polyfit per item over the same points as fitConsumptionRates"""
+    rates = np.full(itemCount, np.nan)
+    for item in range(itemCount):
+        mine = groups == item
+        if not mine.any():
+            continue
+        t = days[mine]
+        y = np.cumsum(np.maximum(-deltas[mine], 0))
+        t, y = np.r_[t[0], t, windowDays], np.r_[0, y, y[-1]]
+        if windowDays - t[0] >= 1:
+            rates[item] = max(np.polyfit(t, y, 1)[0], 0.0)
+    return rates
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def runSize(itemCount, args):
+    with tempfile.TemporaryDirectory() as directory:
+        app = createApp(makeConfig(os.path.join(directory, "bench.db")))
+        with app.app_context():
+            seedDatabase(itemCount, 1, seed=args.seed)
+            now = datetime.utcnow()
+            items = db.session.execute(db.select(FoodInventory.id, FoodInventory.name, FoodInventory.quantity)
+                                       .order_by(FoodInventory.id)).all()
+            insertBatches(InventoryEvent.__table__,
+                          eventRows(items, args.events_per_item, args.window, args.seed, now))
+
+            forecasts = forecastInventory(1, args.window, now)
+            endToEnd = timed(lambda: forecastInventory(1, args.window, now), args.repeat)
+
+            events = db.session.execute(
+                db.select(InventoryEvent.item_id, InventoryEvent.created_at, InventoryEvent.delta,
+                          InventoryEvent.quantity).order_by(InventoryEvent.item_id, InventoryEvent.id)).all()
+            db.session.remove()
+            db.engine.dispose()
+
+    groups = np.array([event.item_id - 1 for event in events])
+    windowStart = now - timedelta(days=args.window)
+    days = np.array([(event.created_at - windowStart) / timedelta(days=1) for event in events])
+    deltas = np.array([event.delta for event in events])
+    levels = np.array([event.quantity for event in events])
+    fresh = np.r_[True, groups[1:] != groups[:-1]]
+    vectorized = fitConsumptionRates(groups, days, deltas, levels, fresh, itemCount, args.window)
+    reference = perItemRates(groups, days, deltas, args.window, itemCount)
+    if not np.allclose(vectorized, reference, equal_nan=True):
+        raise RuntimeError("The vectorized and per-item fits disagree")
+
+    fit = timed(lambda: fitConsumptionRates(groups, days, deltas, levels, fresh, itemCount, args.window), args.repeat)
+    loop = timed(lambda: perItemRates(groups, days, deltas, args.window, itemCount), max(1, args.repeat // 10))
+    result = {"items": itemCount, "events": len(events), "forecast_median_ms": round(endToEnd[len(endToEnd) // 2], 3),
+              "fit_median_ms": round(fit[len(fit) // 2], 3), "per_item_fit_median_ms": round(loop[len(loop) // 2], 3),
+              "low_stock_items": sum(1 for forecast in forecasts
+                                     if forecast["days_left"] is not None and forecast["days_left"] <= 7)}
+    print(f"{itemCount:>9} items {len(events):>9} events  forecast {result['forecast_median_ms']:9.2f}ms  "
+          f"fit {result['fit_median_ms']:8.2f}ms  per-item fit {result['per_item_fit_median_ms']:10.2f}ms",
+          file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[100, 1000, 10000], help="Items in the inventory")
+    parser.add_argument("--events-per-item", type=int, default=20)
+    parser.add_argument("--window", type=int, default=28, help="Forecast window in days")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {"date": date.today().isoformat(), "python": platform.python_version(),
+                 "platform": platform.platform(), "seed": args.seed, "repeat": args.repeat},
+        "results": [runSize(itemCount, args) for itemCount in args.items],
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            outputFile.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
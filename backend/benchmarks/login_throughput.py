@@ -0,0 +1,76 @@
+"""
+Login throughput under concurrency, with password hashing inline versus in the process pool.
+
+Run from backend/:
+    python -m benchmarks.login_throughput --concurrency 16 --requests 128 --workers 0 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import TestConfig
+from exts import db
+from main import createApp
+
+
+def makeConfig(databasePath, method, workers):
+    class BenchmarkConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + databasePath
+        PASSWORD_HASH_METHOD = method
+        PASSWORD_HASH_WORKERS = workers
+        RESPONSE_CACHE_BACKEND = ""
+    return BenchmarkConfig
+
+
+def runLogins(workers, method, concurrency, requests):
+    with tempfile.TemporaryDirectory() as directory:
+        app = createApp(makeConfig(os.path.join(directory, "bench.db"), method, workers))
+        with app.app_context():
+            db.create_all()
+
+        client = app.test_client()
+        client.post('/auth/register', json={"username": "bench", "email": "bench@company.com", "password": "password"})
+        client.post('/auth/login', json={"username": "bench", "password": "password"})  # Warms up the pool
+
+        def login(_):
+            started = time.perf_counter()
+            response = app.test_client().post('/auth/login', json={"username": "bench", "password": "password"})
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = sorted(executor.map(login, range(requests)))
+        elapsed = time.perf_counter() - started
+
+        app.extensions['passwordHasher'].shutdown()
+
+    return {
+        "hash_workers": workers,
+        "method": method,
+        "concurrency": concurrency,
+        "requests": requests,
+        "logins_per_second": round(requests / elapsed, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--method", default="pbkdf2:sha256:600000")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 2],
+                        help="Pool sizes to compare; 0 hashes on the request thread")
+    args = parser.parse_args()
+
+    results = [runLogins(workers, args.method, args.concurrency, args.requests) for workers in args.workers]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
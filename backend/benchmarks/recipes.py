@@ -0,0 +1,117 @@
+"""
+Latency of the use-it-first recipe suggestions at several corpus sizes.
+
+Each size gets a fresh SQLite database seeded with deterministic recipes and one user's inventory (see
+benchmarks.datasets). It reports the one-off cost of building the ranker from the recipe table, the cost of
+scoring every recipe for a user from scratch, the latency of ranking a cached user, and the latency of
+applying one changed item to that user's scores through the inverted index. Results are printed as JSON.
+
+Run from backend/:
+    python -m benchmarks.recipes --recipes 10000 100000 --output recipes.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.datasets import FOODS, PANTRY_STAPLES, insertBatches, recipeRows, seedDatabase
+from config import TestConfig
+from exts import db
+from main import createApp
+from models import Recipe
+from recipes import suggestRecipes, usableItems
+
+
+def makeConfig(databasePath):
+    class BenchmarkConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + databasePath
+        METRICS_ENABLED = False
+        RECIPE_CORPUS_CHECK_SECONDS = 3600
+    return BenchmarkConfig
+
+
+def timed(function, repeat):
+    """Returns the sorted timings of repeat calls, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def summary(timings):
+    return {"best_ms": round(timings[0], 3), "median_ms": round(timings[len(timings) // 2], 3),
+            "p95_ms": round(timings[int(len(timings) * 0.95)], 3)}
+
+
+def runSize(recipeCount, args):
+    with tempfile.TemporaryDirectory() as directory:
+        app = createApp(makeConfig(os.path.join(directory, "bench.db")))
+        with app.app_context():
+            seedDatabase(args.items, 1, seed=args.seed)
+            insertBatches(Recipe.__table__, recipeRows(recipeCount, seed=args.seed))
+            corpus = app.extensions['recipeCorpus']
+            today = date.today()
+
+            started = time.perf_counter()
+            ranker = corpus.get()
+            loadSeconds = time.perf_counter() - started
+
+            rows = usableItems(1, today)
+            build = timed(lambda: ranker.buildPantry(rows, today), args.repeat)
+            suggestRecipes(1, args.limit, today=today)  # Caches the user's pantry
+            rank = timed(lambda: suggestRecipes(1, args.limit, today=today), args.repeat)
+
+            # Moves one item to a random food and expiry date, so each call shifts the recipes of its old and new ingredients
+            rng = random.Random(args.seed)
+            names = FOODS + PANTRY_STAPLES
+            row = {"id": 10 ** 9, "quantity": 1, "user_id": 1}
+
+            def change():
+                ranker.applyChange("update", [{**row, "name": rng.choice(names),
+                                               "expiry_date": today + timedelta(days=rng.randint(0, 14))}])
+            update = timed(change, args.repeat)
+
+            db.session.remove()
+            db.engine.dispose()
+
+    result = {"recipes": recipeCount, "ranked_recipes": len(ranker), "ingredients": len(ranker.ingredientNames),
+              "inventory_items": len(rows), "load_seconds": round(loadSeconds, 3),
+              "build": summary(build), "rank": summary(rank), "update": summary(update)}
+    print(f"{recipeCount:>9} recipes  load {loadSeconds:6.2f}s  build {result['build']['median_ms']:8.2f}ms  "
+          f"rank {result['rank']['median_ms']:8.2f}ms (p95 {result['rank']['p95_ms']:.2f})  "
+          f"update {result['update']['median_ms']:8.3f}ms", file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipes", type=int, nargs="+", default=[10000, 100000], help="Corpus sizes")
+    parser.add_argument("--items", type=int, default=500, help="Items in the user's inventory")
+    parser.add_argument("--limit", type=int, default=10, help="Suggestions requested per ranking")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed calls per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {"date": date.today().isoformat(), "python": platform.python_version(),
+                 "platform": platform.platform(), "seed": args.seed, "repeat": args.repeat},
+        "results": [runSize(recipeCount, args) for recipeCount in args.recipes],
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            outputFile.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
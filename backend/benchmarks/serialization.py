@@ -0,0 +1,138 @@
+"""
+Throughput and memory of serializing inventory rows: ORM objects through marshal, as the list endpoints
+used to, against column tuples through a precompiled RowEncoder.
+
+Each row count gets a fresh SQLite database seeded with deterministic data (see benchmarks.datasets). Every
+path runs the same query, serializes its rows and encodes them to JSON, and reports rows per second over
+--repeat runs along with the peak memory traced while doing so. Results are printed as JSON.
+
+Run from backend/:
+    python -m benchmarks.serialization --rows 1000 10000 100000 --output serialization.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+from flask_restx import marshal
+
+from benchmarks.datasets import seedDatabase
+from config import TestConfig
+from exts import db
+from inventory import foodinvEncoder, foodinvModel
+from main import createApp
+from models import FoodInventory
+
+
+def makeConfig(databasePath):
+    class BenchmarkConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + databasePath
+        METRICS_ENABLED = False
+    return BenchmarkConfig
+
+
+# Paths: functions of a row limit returning the JSON-ready data for that many rows
+
+def ormMarshal(limit):
+    return marshal(FoodInventory.query.order_by(FoodInventory.id).limit(limit).all(), foodinvModel)
+
+
+def tuplesMarshal(limit):
+    rows = FoodInventory.query.with_entities(*foodinvEncoder.columns).order_by(FoodInventory.id).limit(limit).all()
+    return marshal(rows, foodinvModel)
+
+
+def tuplesEncoder(limit):
+    rows = FoodInventory.query.with_entities(*foodinvEncoder.columns).order_by(FoodInventory.id).limit(limit).all()
+    return foodinvEncoder.rows(rows)
+
+
+PATHS = {
+    "orm_marshal": ormMarshal,
+    "tuples_marshal": tuplesMarshal,
+    "tuples_encoder": tuplesEncoder,
+}
+
+
+def runPath(path, rows, repeat):
+    def serialize():
+        body = json.dumps(PATHS[path](rows))
+        db.session.remove()  # Drops the identity map, as the end of a request does
+        return body
+
+    expected = serialize()  # Warms up the connection, statement cache and page cache
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        body = serialize()
+        timings.append(time.perf_counter() - started)
+        if body != expected:
+            raise RuntimeError(f"{path} produced a different body on a later run")
+
+    gc.collect()
+    tracemalloc.start()
+    serialize()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        "rows_per_second": round(rows / best),
+        "best_ms": round(best * 1000, 3),
+        "median_ms": round(sorted(timings)[len(timings) // 2] * 1000, 3),
+        "peak_memory_kib": round(peak / 1024, 1),
+        "body_hash": hash(expected) & 0xffffffff,
+    }
+
+
+def runSize(rows, args):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        app = createApp(makeConfig(os.path.join(directory, "bench.db")))
+        with app.app_context():
+            seedDatabase(rows, 1, seed=args.seed)
+            bodies = set()
+            for path in args.paths:
+                result = runPath(path, rows, args.repeat)
+                bodies.add(result.pop("body_hash"))
+                results.append({"rows": rows, "path": path, **result})
+                print(f"{rows:>9} {path:<16} {result['rows_per_second']:>12,} rows/s  best {result['best_ms']:>9.2f}ms  "
+                      f"peak {result['peak_memory_kib']:>10.1f} KiB", file=sys.stderr)
+            if len(bodies) > 1:
+                raise RuntimeError("The paths serialized the rows differently")
+            db.session.remove()
+            db.engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="Rows serialized per run")
+    parser.add_argument("--paths", nargs="+", choices=list(PATHS), default=list(PATHS))
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per path; the best is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {"date": date.today().isoformat(), "python": platform.python_version(),
+                 "platform": platform.platform(), "seed": args.seed, "repeat": args.repeat},
+        "results": [result for rows in args.rows for result in runSize(rows, args)],
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            outputFile.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
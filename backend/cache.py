@@ -0,0 +1,195 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from werkzeug.utils import import_string
+from models import onInventoryChange
+
+
+class CacheBackend:
+    """
+    Storage interface for the response cache.
+
+    Entries carry tags so writes can invalidate exactly the entries they affect. A shared store
+    (for example one backed by Redis) only has to implement these methods to replace LRUCache.
+    """
+
+    def get(self, key):
+        """Returns the stored value, or None on a miss"""
+        raise NotImplementedError
+
+    def set(self, key, value, tags=()):
+        raise NotImplementedError
+
+    def invalidate(self, tags):
+        """Removes every entry carrying any of the tags, returning how many were removed"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        """Returns backend-specific counters such as size and evictions"""
+        return {}
+
+
+def approximateSize(value):
+    """Estimates the bytes held by a marshalled response, walking its dicts, lists and tuples down to the leaves"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximateSize(key) + approximateSize(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approximateSize(item) for item in value)
+    return size
+
+
+class LRUCache(CacheBackend):
+    """
+    In-process cache bounded by entry count and by the approximate bytes the entries hold, evicting the least
+    recently used entries, with a per-entry TTL. A value larger than `maxBytes` on its own is not stored, so
+    unbounded bodies such as a full sync cannot push everything else out.
+    """
+
+    def __init__(self, maxEntries=2048, ttl=300, maxBytes=67108864, clock=time.monotonic):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (expiresAt, value, tags, size), oldest first
+        self.tags = {}                # tag -> set of keys
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.oversized = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                self.remove(key)
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, tags=()):
+        size = approximateSize(value)  # Measured before taking the lock, since it walks the whole value
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            if size > self.maxBytes:
+                self.oversized += 1
+                return
+            self.entries[key] = (self.clock() + self.ttl, value, tuple(tags), size)
+            self.bytes += size
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.maxEntries or self.bytes > self.maxBytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        with self.lock:
+            keys = set()
+            for tag in tags:
+                keys |= self.tags.get(tag, set())
+            for key in keys:
+                self.remove(key)
+            return len(keys)
+
+    def remove(self, key):
+        # Callers hold the lock
+        _, _, tags, size = self.entries.pop(key)
+        self.bytes -= size
+        for tag in tags:
+            taggedKeys = self.tags.get(tag)
+            if taggedKeys is not None:
+                taggedKeys.discard(key)
+                if not taggedKeys:
+                    del self.tags[tag]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "max_entries": self.maxEntries, "bytes": self.bytes,
+                    "max_bytes": self.maxBytes, "ttl": self.ttl, "evictions": self.evictions,
+                    "expirations": self.expirations, "oversized": self.oversized}
+
+
+class ResponseCache:
+    """
+    Read-through cache of marshalled inventory responses in front of a CacheBackend.
+
+    Each entry remembers the inventory version it was built at and is only served while that is still the
+    user's current version, so a response built concurrently with a write, or made stale by another worker,
+    is never returned. Writes in this process also drop the affected entries straight away by tag.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()  # Guards the counters, which request threads update concurrently
+
+    def get(self, key, version):
+        entry = self.backend.get(key)
+        hit = entry is not None and entry[0] == version
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry[1] if hit else None
+
+    def set(self, key, version, data, tags):
+        self.backend.set(key, (version, data), tags)
+
+    def invalidate(self, tags):
+        removed = self.backend.invalidate(tags)
+        with self.lock:
+            self.invalidations += removed
+
+    def stats(self):
+        with self.lock:
+            hits, misses, invalidations = self.hits, self.misses, self.invalidations
+        lookups = hits + misses
+        return {"hits": hits, "misses": misses, "hit_ratio": hits / lookups if lookups else 0.0,
+                "invalidations": invalidations, **self.backend.stats()}
+
+
+def initResponseCache(app):
+    """Builds the backend named by RESPONSE_CACHE_BACKEND and attaches the response cache to the app; empty disables it"""
+    backendPath = app.config.get('RESPONSE_CACHE_BACKEND', 'cache.LRUCache')
+    if not backendPath:
+        return None
+
+    backendClass = import_string(backendPath)
+    backend = backendClass(maxEntries=app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 2048),
+                           ttl=app.config.get('RESPONSE_CACHE_TTL', 300),
+                           maxBytes=app.config.get('RESPONSE_CACHE_MAX_BYTES', 67108864))
+    app.extensions['responseCache'] = ResponseCache(backend)
+    return app.extensions['responseCache']
+
+
+def getResponseCache():
+    return current_app.extensions.get('responseCache')
+
+
+@onInventoryChange
+def invalidateResponseCache(action, rows, versions):
+    responseCache = getResponseCache()
+    if responseCache is None:
+        return
+
+    tags = {f"list:{row['user_id']}" for row in rows} | {f"item:{row['id']}" for row in rows}
+    responseCache.invalidate(tags)
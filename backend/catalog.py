@@ -0,0 +1,102 @@
+import csv
+import re
+from datetime import date, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from cache import LRUCache
+from exts import db
+from models import Product
+
+UPC_PATTERN = re.compile(r"^\d{8,14}$")  # UPC-E through GTIN-14
+IMPORT_BATCH_SIZE = 5000
+MISSING = {}  # Cached for unknown UPCs so repeated scans of them skip the database too
+
+
+def isValidUPC(upc):
+    return isinstance(upc, str) and bool(UPC_PATTERN.match(upc))
+
+
+def lookupProduct(upc):
+    """Returns the catalog entry for upc as a dict, or None, answering repeat lookups from the in-memory LRU"""
+    productCache = current_app.extensions['productCache']
+    cached = productCache.get(upc)
+    if cached is not None:
+        return cached or None
+
+    product = db.session.get(Product, upc)
+    entry = product.toDict() if product else MISSING
+    productCache.set(upc, entry)
+    return entry or None
+
+
+def defaultExpiryDate(product, today=None):
+    """Returns today + the product's shelf life, or None when the catalog has no shelf life for it"""
+    if product is None or product["shelf_life_days"] is None:
+        return None
+    return (today or date.today()) + timedelta(days=product["shelf_life_days"])
+
+
+def upsertStatement():
+    # Imported on demand: only product imports need a dialect's insert, and the postgresql one is slow to import
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects import postgresql as dialect
+    else:
+        from sqlalchemy.dialects import sqlite as dialect
+    statement = dialect.insert(Product.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=[Product.upc],
+        set_={"name": statement.excluded.name, "shelf_life_days": statement.excluded.shelf_life_days})
+
+
+def importProducts(lines, batchSize=IMPORT_BATCH_SIZE):
+    """
+    Upserts products from CSV lines with a header of upc,name[,shelf_life_days].
+    Rows are read incrementally and written as one executemany upsert per batch, each in its own short
+    transaction, so memory stays flat however large the dataset is.
+    :return: A tuple of (imported, skipped) row counts
+    """
+    statement = upsertStatement()
+    imported = skipped = 0
+    batch = []
+
+    def flush():
+        db.session.execute(statement, batch)
+        db.session.commit()
+        batch.clear()
+
+    for row in csv.DictReader(lines):
+        upc = (row.get("upc") or "").strip()
+        name = (row.get("name") or "").strip()
+        shelfLife = (row.get("shelf_life_days") or "").strip()
+        if not isValidUPC(upc) or not name or (shelfLife and not shelfLife.isdigit()):
+            skipped += 1
+            continue
+
+        batch.append({"upc": upc, "name": name, "shelf_life_days": int(shelfLife) if shelfLife else None})
+        imported += 1
+        if len(batch) >= batchSize:
+            flush()
+
+    if batch:
+        flush()
+
+    current_app.extensions['productCache'].clear()
+    return imported, skipped
+
+
+@click.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+@with_appcontext
+def importProductsCommand(path, batch_size):
+    """Bulk loads the UPC product catalog from a CSV file"""
+    with open(path, newline="", encoding="utf-8") as lines:
+        imported, skipped = importProducts(lines, batch_size)
+    click.echo(f"Imported {imported} products, skipped {skipped} invalid rows")
+
+
+def initProductCatalog(app):
+    app.extensions['productCache'] = LRUCache(maxEntries=app.config.get('PRODUCT_CACHE_MAX_ENTRIES', 50000),
+                                              ttl=app.config.get('PRODUCT_CACHE_TTL', 3600))
+    app.cli.add_command(importProductsCommand)
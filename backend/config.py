@@ -8,6 +8,42 @@ class Config:
     SECRET_KEY = config('SECRET_KEY')
     SQLALCHEMY_TRACK_MODIFICATIONS = config(
         'SQLALCHEMY_TRACK_MODIFICATIONS', cast=bool)
+    EXPIRY_TICK_SECONDS = config('EXPIRY_TICK_SECONDS', default=3600, cast=int)  # 0 disables the tick
+    EXPIRY_SWEEP_SECONDS = config('EXPIRY_SWEEP_SECONDS', default=3600, cast=int)  # 0 disables background sweeps
+    EXPIRY_SWEEP_GRACE_DAYS = config('EXPIRY_SWEEP_GRACE_DAYS', default=30, cast=int)  # Days past expiry before archiving
+    EXPIRY_SWEEP_CHUNK_SIZE = config('EXPIRY_SWEEP_CHUNK_SIZE', default=500, cast=int)  # Items moved per transaction
+    EXPIRY_SWEEP_PAUSE_SECONDS = config('EXPIRY_SWEEP_PAUSE_SECONDS', default=0.05, cast=float)  # Between chunks
+    RESPONSE_CACHE_BACKEND = config('RESPONSE_CACHE_BACKEND', default='cache.LRUCache')  # Empty disables the cache
+    RESPONSE_CACHE_MAX_ENTRIES = config('RESPONSE_CACHE_MAX_ENTRIES', default=2048, cast=int)
+    RESPONSE_CACHE_MAX_BYTES = config('RESPONSE_CACHE_MAX_BYTES', default=67108864, cast=int)  # Approximate, 64 MiB; larger bodies are not cached
+    RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=300, cast=int)  # Seconds
+    # werkzeug method string including the cost, e.g. pbkdf2:sha256:600000; hashes made otherwise are upgraded at login
+    PASSWORD_HASH_METHOD = config('PASSWORD_HASH_METHOD', default='pbkdf2:sha256:600000')
+    # Processes that hash passwords, capping the cores logins can take; 0 hashes on the request thread, which is faster on one core
+    PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=0, cast=int)
+    PRODUCT_CACHE_MAX_ENTRIES = config('PRODUCT_CACHE_MAX_ENTRIES', default=50000, cast=int)
+    PRODUCT_CACHE_TTL = config('PRODUCT_CACHE_TTL', default=3600, cast=int)  # Seconds, bounds staleness after imports
+    SCAN_BUFFER_MAX_PENDING = config('SCAN_BUFFER_MAX_PENDING', default=10000, cast=int)  # Distinct products
+    SCAN_FLUSH_SIZE = config('SCAN_FLUSH_SIZE', default=500, cast=int)
+    SCAN_FLUSH_SECONDS = config('SCAN_FLUSH_SECONDS', default=2, cast=float)  # 0 flushes only when SCAN_FLUSH_SIZE is reached
+    RECIPE_URGENCY_HALF_LIFE_DAYS = config('RECIPE_URGENCY_HALF_LIFE_DAYS', default=3.0, cast=float)  # Urgency halves per this many days to expiry
+    RECIPE_URGENCY_WEIGHT = config('RECIPE_URGENCY_WEIGHT', default=1.0, cast=float)  # Urgency against plain coverage in the score
+    RECIPE_PANTRY_MAX_ENTRIES = config('RECIPE_PANTRY_MAX_ENTRIES', default=64, cast=int)  # Users whose recipe scores are kept, ~12 bytes per recipe each
+    RECIPE_PANTRY_TTL = config('RECIPE_PANTRY_TTL', default=300, cast=int)  # Seconds an idle user's recipe scores are kept
+    RECIPE_CORPUS_CHECK_SECONDS = config('RECIPE_CORPUS_CHECK_SECONDS', default=300, cast=int)  # Between checks for recipes imported elsewhere
+    ASGI_THREADS = config('ASGI_THREADS', default=32, cast=int)  # Views running at once when served over ASGI
+    ASGI_STREAM_THREADS = config('ASGI_STREAM_THREADS', default=64, cast=int)  # Streamed bodies other than event streams, e.g. exports, read at once
+    ASGI_BODY_SPOOL_BYTES = config('ASGI_BODY_SPOOL_BYTES', default=1048576, cast=int)  # Larger bodies are buffered on disk
+    INVENTORY_EXPORT_CHUNK_ROWS = config('INVENTORY_EXPORT_CHUNK_ROWS', default=1000, cast=int)  # Rows fetched and sent at a time
+    INVENTORY_IMPORT_BATCH_SIZE = config('INVENTORY_IMPORT_BATCH_SIZE', default=1000, cast=int)  # Rows per insert transaction
+    EVENT_STREAM_MAX_QUEUE = config('EVENT_STREAM_MAX_QUEUE', default=100, cast=int)  # Frames before a slow client is dropped
+    EVENT_STREAM_MAX_SUBSCRIBERS = config('EVENT_STREAM_MAX_SUBSCRIBERS', default=1000, cast=int)
+    EVENT_STREAM_HEARTBEAT_SECONDS = config('EVENT_STREAM_HEARTBEAT_SECONDS', default=15, cast=float)
+    EVENT_STREAM_POLL_SECONDS = config('EVENT_STREAM_POLL_SECONDS', default=5, cast=float)  # Between checks for writes from other processes, 0 disables
+    METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)  # Request and SQL timings on /metrics
+    METRICS_SERVER_TIMING = config('METRICS_SERVER_TIMING', default=False, cast=bool)  # Adds a Server-Timing header
+    API_DOCS = config('API_DOCS', default=True, cast=bool)  # Swagger UI on /docs
+    SWAGGER_JSON = config('SWAGGER_JSON', default='')  # Spec written by `flask export-swagger`, served as /swagger.json
 
 
 class DevConfig(Config):
@@ -18,10 +54,41 @@ class DevConfig(Config):
 
 
 class ProdConfig(Config):
-    pass
+    SQLALCHEMY_DATABASE_URI = config('DATABASE_URL', default="sqlite:///" + os.path.join(BASE_DIR, 'prod.db'))
+    # Optional engine for read-only inventory GETs, e.g. sqlite:///file:/srv/prod.db?mode=ro&uri=true or a replica
+    READ_DATABASE_URL = config('READ_DATABASE_URL', default='')
+    SQLALCHEMY_BINDS = {"read": READ_DATABASE_URL} if READ_DATABASE_URL else {}
+    SQLALCHEMY_ECHO = False
+    API_DOCS = config('API_DOCS', default=False, cast=bool)  # Set SWAGGER_JSON to keep serving the spec cheaply
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": config('DB_POOL_SIZE', default=10, cast=int),
+        "max_overflow": config('DB_MAX_OVERFLOW', default=5, cast=int),
+        "pool_timeout": config('DB_POOL_TIMEOUT', default=10, cast=int),  # Seconds to wait for a free connection
+        "pool_recycle": config('DB_POOL_RECYCLE', default=1800, cast=int),
+        "pool_pre_ping": True,
+    }
+    # Applied on every new SQLite connection. WAL lets readers run alongside the single writer, and
+    # synchronous=NORMAL is durable in WAL mode while only syncing at checkpoints.
+    SQLITE_PRAGMAS = {
+        "journal_mode": config('SQLITE_JOURNAL_MODE', default='WAL'),
+        "synchronous": config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+        "cache_size": config('SQLITE_CACHE_SIZE', default=-65536, cast=int),  # Negative means KiB, so 64 MiB
+        "mmap_size": config('SQLITE_MMAP_SIZE', default=268435456, cast=int),  # Bytes, 256 MiB
+        "busy_timeout": config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),  # Milliseconds
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    }
 
 
 class TestConfig(Config):
     SQLALCHEMY_DATABASE_URI = "sqlite:///test.db"
     SQLALCHEMY_ECHO = False
     TESTING = True
+    EXPIRY_TICK_SECONDS = 0
+    EXPIRY_SWEEP_SECONDS = 0  # Tests sweep explicitly
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # Cheap hashes keep the auth tests fast
+    PASSWORD_HASH_WORKERS = 0
+    SCAN_FLUSH_SECONDS = 0  # Tests flush the scan buffer explicitly
+    EVENT_STREAM_POLL_SECONDS = 0  # Tests poll explicitly
+    RECIPE_CORPUS_CHECK_SECONDS = 0  # Tests import recipes in the same process
+    API_DOCS = False  # Skips registering the docs routes in every setUp
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from exts import db
+from models import InventoryVersion, onInventoryChange
+
+
+class Subscriber:
+    """One open event stream: a bounded queue of encoded frames for a single user"""
+
+    def __init__(self, userID, maxQueue):
+        self.userID = userID
+        self.maxQueue = maxQueue
+        self.frames = deque()
+        self.ready = threading.Condition()
+        self.dropped = False
+        self.waker = None  # Called on every push when an event loop, rather than a thread, waits for frames
+
+    def push(self, frame):
+        """Queues frame, or drops the subscriber if it has fallen maxQueue frames behind; O(1) either way"""
+        with self.ready:
+            if self.dropped:
+                return False
+            if len(self.frames) >= self.maxQueue:
+                self.dropped = True
+                self.frames.clear()
+            else:
+                self.frames.append(frame)
+            self.ready.notify()
+            if self.waker is not None:
+                self.waker()
+            return not self.dropped
+
+    def next(self, timeout):
+        """Returns the next frame, or None if none arrived within timeout or the subscriber was dropped"""
+        with self.ready:
+            if not self.frames and not self.dropped:
+                self.ready.wait(timeout)
+            return self.frames.popleft() if self.frames else None
+
+    def take(self):
+        """Returns the next frame without waiting, or None"""
+        with self.ready:
+            return self.frames.popleft() if self.frames else None
+
+
+class EventStream:
+    """
+    The body of one SSE response. WSGI servers iterate frames() on a thread that blocks between events. The
+    ASGI adapter finds the stream in the request environ under ENVIRON_KEY and awaits asyncFrames() on its
+    event loop instead, so an open stream waiting for its next event holds no thread.
+    """
+
+    ENVIRON_KEY = "foodinv.eventStream"
+    CONNECTED = b"retry: 3000\n: connected\n\n"
+    RESYNC = b"event: resync\ndata: {}\n\n"  # Events were lost; the client should re-fetch
+    KEEP_ALIVE = b": keep-alive\n\n"
+
+    def __init__(self, broker, subscriber, heartbeat):
+        self.broker = broker
+        self.subscriber = subscriber
+        self.heartbeat = heartbeat
+
+    def frames(self):
+        try:
+            yield self.CONNECTED
+            while True:
+                frame = self.subscriber.next(self.heartbeat)
+                if self.subscriber.dropped:
+                    yield self.RESYNC
+                    return
+                yield frame if frame is not None else self.KEEP_ALIVE
+        finally:
+            self.broker.unsubscribe(self.subscriber)
+
+    async def asyncFrames(self):
+        """Yields the frames after CONNECTED, which frames() has already produced, from the running event loop"""
+        loop = asyncio.get_running_loop()
+        arrived = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(arrived.set)
+            except RuntimeError:
+                pass  # The loop has closed; the stream is being torn down
+
+        self.subscriber.waker = wake
+        try:
+            while True:
+                arrived.clear()  # Before taking, so a push landing in between still wakes the wait below
+                frame = self.subscriber.take()
+                if self.subscriber.dropped:
+                    yield self.RESYNC
+                    return
+                if frame is not None:
+                    yield frame
+                    continue
+                try:
+                    await asyncio.wait_for(arrived.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield self.KEEP_ALIVE
+        finally:
+            self.subscriber.waker = None
+
+
+class EventBroker:
+    """
+    In-process pub/sub for inventory change events.
+
+    Each event is encoded once as an SSE frame and appended to the queue of every subscriber of its user, so a
+    publish costs one dict lookup plus an O(1) append per subscriber, whatever the number of other users.
+    A subscriber that lets `maxQueue` frames pile up is dropped rather than blocking the writer or growing
+    without bound; its stream ends with a "resync" event telling the client to re-fetch.
+
+    Writes made by other workers or the CLI never pass through publish. poll() reads the inventory versions of
+    the subscribed users in one query and sends a "resync" event carrying the new version to those whose
+    version moved past the last one published here, so their clients delta sync from it.
+    """
+
+    def __init__(self, maxQueue=100, maxSubscribers=1000):
+        self.maxQueue = maxQueue
+        self.maxSubscribers = maxSubscribers
+        self.subscribers = {}
+        self.versions = {}  # user_id -> inventory version their subscribers are up to date with
+        self.count = 0
+        self.lock = threading.Lock()
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def subscribe(self, userID, version=0):
+        """
+        Returns a new Subscriber for userID, or None when maxSubscribers streams are already open.
+        :param version: userID's inventory version when the stream opened
+        """
+        with self.lock:
+            if self.count >= self.maxSubscribers:
+                return None
+            subscriber = Subscriber(userID, self.maxQueue)
+            self.subscribers.setdefault(userID, set()).add(subscriber)
+            self.versions.setdefault(userID, version)  # Streams already open keep theirs, which may be older
+            self.count += 1
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            userSubscribers = self.subscribers.get(subscriber.userID)
+            if userSubscribers and subscriber in userSubscribers:
+                userSubscribers.remove(subscriber)
+                self.count -= 1
+                if not userSubscribers:
+                    del self.subscribers[subscriber.userID]
+                    del self.versions[subscriber.userID]
+
+    def publish(self, userID, event, data):
+        with self.lock:
+            subscribers = list(self.subscribers.get(userID, ()))
+        if not subscribers:
+            return
+
+        frame = encodeEvent(event, data)
+        dropped = [subscriber for subscriber in subscribers if not subscriber.push(frame)]
+        for subscriber in dropped:
+            self.unsubscribe(subscriber)
+        self.stats["published"] += 1
+        self.stats["delivered"] += len(subscribers) - len(dropped)
+        self.stats["dropped"] += len(dropped)
+
+    def publishRows(self, event, rows, versions=None):
+        """
+        Publishes one event per owner with that owner's rows.
+        :param versions: The inventory version each owner's write committed as, if it came from a write
+        """
+        byUser = {}
+        for row in rows:
+            if row["user_id"] is not None:
+                byUser.setdefault(row["user_id"], []).append(row)
+        for userID, userRows in byUser.items():
+            self.publish(userID, event, {"items": userRows})
+        with self.lock:
+            for userID, version in (versions or {}).items():
+                # Only the next version: after a write from elsewhere the streams stay behind until poll() catches up
+                if self.versions.get(userID) == version - 1:
+                    self.versions[userID] = version
+
+    def poll(self):
+        """
+        Sends "resync" to the subscribers of users whose inventory version in the database is newer than the one
+        they are up to date with; needs an app context.
+        :return: The (user_id, version) pairs resynced
+        """
+        with self.lock:
+            known = dict(self.versions)
+        if not known:
+            return []
+
+        current = db.session.execute(db.select(InventoryVersion.user_id, InventoryVersion.version)
+                                     .where(InventoryVersion.user_id.in_(list(known)))).all()
+        moved = [(userID, version) for userID, version in current if version > known[userID]]
+        for userID, version in moved:
+            with self.lock:
+                if userID in self.versions:
+                    self.versions[userID] = max(self.versions[userID], version)
+            self.publish(userID, "resync", {"version": version})
+        return moved
+
+
+def encodeEvent(event, data):
+    payload = json.dumps(data, default=lambda value: value.isoformat(), separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+def initEventBroker(app):
+    broker = EventBroker(maxQueue=app.config.get('EVENT_STREAM_MAX_QUEUE', 100),
+                         maxSubscribers=app.config.get('EVENT_STREAM_MAX_SUBSCRIBERS', 1000))
+    app.extensions['eventBroker'] = broker
+    # Items crossing their expiry date are pushed too, from the tracker's tick
+    app.extensions['expiryTracker'].listeners.append(lambda rows: broker.publishRows("expire", rows))
+
+    interval = app.config.get('EVENT_STREAM_POLL_SECONDS')
+    if interval:
+        def runPolls():
+            while not stopEvent.wait(interval):
+                with app.app_context():
+                    try:
+                        broker.poll()
+                    except SQLAlchemyError:
+                        app.logger.exception("Event stream poll failed")
+
+        stopEvent = threading.Event()
+        broker.stopPolls = stopEvent.set
+        threading.Thread(target=runPolls, name="event-stream-poll", daemon=True).start()
+
+    return broker
+
+
+def getEventBroker():
+    return current_app.extensions.get('eventBroker')
+
+
+@onInventoryChange
+def publishInventoryChange(action, rows, versions):
+    broker = getEventBroker()
+    if broker is not None:
+        broker.publishRows(action, rows, versions)
@@ -0,0 +1,372 @@
+import heapq
+import threading
+import time
+from datetime import date, datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from exts import db
+from models import FoodInventory, FoodInventoryArchive, InventoryVersion, onInventoryChange
+
+
+class ExpiryTracker:
+    """
+    In-memory index of inventory items ordered by expiry date, with one heap per owner.
+
+    Items that have not yet been announced as expired live in their owner's min-heap of (expiry_date, item_id).
+    Changed or deleted items leave stale heap entries behind, which are skipped by comparing against
+    self.items and cleared out when that heap is compacted. The periodic tick pops every entry that has
+    passed its expiry date, moves it to self.expired and emits one "expired" event for the batch.
+
+    Each owner's items are known to reflect one inventory version. Writes in this process move it forward
+    through the inventory listener; writes from other workers or the CLI only show up as a newer version in the
+    database, and reconcile() then reloads that owner's items.
+    """
+
+    def __init__(self):
+        self.items = {}      # item_id -> row dict of every tracked item
+        self.expired = {}    # item_id -> row dict of items already announced as expired
+        self.heaps = {}      # user_id -> heap of (expiry_date, item_id) of unannounced items, may contain stale entries
+        self.owned = {}      # user_id -> ids of their tracked items, for compacting and reloading one owner
+        self.versions = {}   # user_id -> inventory version their tracked items reflect; 0 when absent
+        self.listeners = []  # Callbacks of the form listener(rows), run on every tick that expires items
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self, rows, versions=None):
+        """Replaces the tracked items with rows, heapifying each owner's items in O(n)"""
+        with self.lock:
+            self.items = {row["id"]: row for row in rows}
+            self.expired = {}
+            self.heaps, self.owned = {}, {}
+            self.versions = dict(versions or {})
+            for row in rows:
+                self.heaps.setdefault(row["user_id"], []).append((row["expiry_date"], row["id"]))
+                self.owned.setdefault(row["user_id"], set()).add(row["id"])
+            for heap in self.heaps.values():
+                heapq.heapify(heap)
+            self.loaded = True
+
+    def loadFromDatabase(self):
+        # Versions are read first, so a write landing in between makes them older than the rows, never newer
+        versions = dict(db.session.execute(db.select(InventoryVersion.user_id, InventoryVersion.version)).all())
+        rows = db.session.execute(
+            db.select(FoodInventory.id, FoodInventory.name, FoodInventory.quantity, FoodInventory.expiry_date,
+                      FoodInventory.user_id))
+        self.load([row._asdict() for row in rows], versions)
+
+    def loadUser(self, userID, rows, version):
+        """Replaces userID's tracked items with rows, keeping those already announced as expired announced"""
+        with self.lock:
+            announced = {}
+            for itemID in self.owned.pop(userID, ()):
+                if self.items.get(itemID, {}).get("user_id") != userID:
+                    continue  # Its id went to another user's item, reloaded first
+                del self.items[itemID]
+                row = self.expired.pop(itemID, None)
+                if row is not None:
+                    announced[itemID] = row["expiry_date"]
+
+            heap = []
+            for row in rows:
+                self.items[row["id"]] = row
+                if announced.get(row["id"]) == row["expiry_date"]:
+                    self.expired[row["id"]] = row
+                else:
+                    heap.append((row["expiry_date"], row["id"]))
+            heapq.heapify(heap)
+            self.heaps[userID] = heap
+            self.owned[userID] = {row["id"] for row in rows}
+            self.versions[userID] = version
+
+    def reconcile(self, userID, version):
+        """
+        Reloads userID's items with one query on the (user_id, expiry_date) index when version, their current
+        inventory version in the database, is not the one the tracker reflects.
+        """
+        if self.versions.get(userID, 0) == version:
+            return
+        rows = db.session.execute(
+            db.select(FoodInventory.id, FoodInventory.name, FoodInventory.quantity, FoodInventory.expiry_date,
+                      FoodInventory.user_id).where(FoodInventory.user_id == userID))
+        self.loadUser(userID, [row._asdict() for row in rows], version)
+
+    def advance(self, userID, version):
+        """Records that a write in this process moved userID to version, unless the tracker had missed one before it"""
+        with self.lock:
+            if self.versions.get(userID, 0) == version - 1:
+                self.versions[userID] = version
+
+    def track(self, row):
+        """Adds or replaces an item, in O(log n)"""
+        with self.lock:
+            previous = self.items.get(row["id"])
+            self.items[row["id"]] = row
+            if previous is not None and previous["expiry_date"] == row["expiry_date"] \
+                    and previous["user_id"] == row["user_id"]:
+                if row["id"] in self.expired:
+                    self.expired[row["id"]] = row
+                return  # The existing heap entry is still valid
+
+            if previous is not None:
+                self.owned[previous["user_id"]].discard(row["id"])
+            self.owned.setdefault(row["user_id"], set()).add(row["id"])
+            self.expired.pop(row["id"], None)
+            heapq.heappush(self.heaps.setdefault(row["user_id"], []), (row["expiry_date"], row["id"]))
+            self.compactIfStale(row["user_id"])
+
+    def untrack(self, itemID):
+        """Forgets an item in O(1); its heap entry becomes stale"""
+        with self.lock:
+            row = self.items.pop(itemID, None)
+            if row is None:
+                return
+            self.expired.pop(itemID, None)
+            self.owned[row["user_id"]].discard(itemID)
+            self.compactIfStale(row["user_id"])
+
+    def compactIfStale(self, userID):
+        # Rebuild once stale entries outnumber live ones so each heap stays proportional to its owner's items
+        heap = self.heaps.get(userID, [])
+        if len(heap) > 2 * len(self.owned.get(userID, ())) + 64:
+            heap[:] = [entry for entry in heap if self.isLive(entry)]
+            heapq.heapify(heap)
+
+    def isLive(self, entry):
+        row = self.items.get(entry[1])
+        return row is not None and row["expiry_date"] == entry[0] and entry[1] not in self.expired
+
+    def collect(self, userID, upper, lower=None):
+        """
+        Returns userID's live heap rows with lower <= expiry_date <= upper, soonest first.
+        Walks the heap from the root and prunes every subtree whose root is past upper, so only
+        entries at or before upper are visited.
+        """
+        heap = self.heaps.get(userID, [])
+        found = {}
+        stack = [0] if heap else []
+        while stack:
+            index = stack.pop()
+            entry = heap[index]
+            if entry[0] > upper:
+                continue  # Heap order guarantees the whole subtree is later still
+            if (lower is None or entry[0] >= lower) and self.isLive(entry) \
+                    and self.items[entry[1]]["user_id"] == userID:
+                found[entry[1]] = self.items[entry[1]]
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    stack.append(child)
+        return sorted(found.values(), key=lambda row: (row["expiry_date"], row["id"]))
+
+    def expiringWithin(self, userID, days, today=None):
+        """Returns userID's items expiring between today and today + days, soonest first"""
+        today = today or date.today()
+        with self.lock:
+            return self.collect(userID, today + timedelta(days=days), lower=today)
+
+    def expiredItems(self, userID, today=None):
+        """Returns userID's items whose expiry date is before today, oldest first"""
+        today = today or date.today()
+        with self.lock:
+            rows = [row for row in self.expired.values() if row["user_id"] == userID]
+            rows += self.collect(userID, today - timedelta(days=1))
+        return sorted(rows, key=lambda row: (row["expiry_date"], row["id"]))
+
+    def tick(self, today=None):
+        """
+        Moves every item that expired before today out of the heaps and emits them to the listeners.
+        Each item is emitted once, in O(log n) per item.
+        :return: The rows that expired since the last tick
+        """
+        today = today or date.today()
+        newlyExpired = []
+        with self.lock:
+            for heap in self.heaps.values():
+                while heap and heap[0][0] < today:
+                    entry = heapq.heappop(heap)
+                    if self.isLive(entry):
+                        self.expired[entry[1]] = self.items[entry[1]]
+                        newlyExpired.append(self.items[entry[1]])
+
+        if newlyExpired:
+            for listener in self.listeners:
+                listener(newlyExpired)
+        return newlyExpired
+
+
+def initExpiryTracker(app):
+    """Creates the app's tracker, loads it from the database and starts the periodic tick if configured"""
+    tracker = ExpiryTracker()
+    app.extensions['expiryTracker'] = tracker
+
+    with app.app_context():
+        try:
+            tracker.loadFromDatabase()
+        except SQLAlchemyError:
+            # The table may not exist yet (fresh database or pending migration); load on first use instead
+            db.session.rollback()
+
+    tracker.listeners.append(
+        lambda rows: app.logger.info("Expired inventory items: %s", [row["id"] for row in rows]))
+
+    interval = app.config.get('EXPIRY_TICK_SECONDS')
+    if interval:
+        def runTicks():
+            while not stopEvent.wait(interval):
+                tracker.tick()
+
+        stopEvent = threading.Event()
+        tracker.stopTicks = stopEvent.set
+        threading.Thread(target=runTicks, name="expiry-tick", daemon=True).start()
+
+    return tracker
+
+
+class ExpirySweeper:
+    """
+    Moves items that expired more than graceDays ago out of food_inventory into food_inventory_archive.
+
+    Items are moved chunkSize at a time, each chunk in its own short transaction, with a pause of pauseSeconds
+    in between, so other writers never wait on SQLite's write lock for more than one chunk. Only one sweep runs
+    at a time. Progress of the running sweep and totals across sweeps are kept for the stats endpoint and /metrics.
+    """
+
+    def __init__(self, graceDays=30, chunkSize=500, pauseSeconds=0.05):
+        self.graceDays = graceDays
+        self.chunkSize = chunkSize
+        self.pauseSeconds = pauseSeconds
+        self.running = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.progress = None  # The running sweep's cutoff, total, archived and chunks so far
+        self.lastRun = None
+        self.stats = {"runs": 0, "archived": 0, "chunks": 0, "seconds": 0.0}
+
+    def cutoff(self, today=None):
+        """Items expiring before this date are swept"""
+        return (today or date.today()) - timedelta(days=self.graceDays)
+
+    def run(self, today=None):
+        """
+        Sweeps until no item is past the grace period or stop() is called; needs an app context.
+        :return: A dict describing the sweep, or None if another sweep was already running
+        """
+        if not self.running.acquire(blocking=False):
+            return None
+        try:
+            cutoff = self.cutoff(today)
+            total = db.session.scalar(db.select(func.count()).where(FoodInventory.expiry_date < cutoff))
+            self.progress = {"cutoff": cutoff.isoformat(), "total": total, "archived": 0, "chunks": 0,
+                             "started_at": datetime.utcnow().isoformat()}
+            started = time.perf_counter()
+            while True:
+                moved = FoodInventoryArchive.archiveExpired(cutoff, self.chunkSize)
+                if moved:
+                    self.progress["archived"] += len(moved)
+                    self.progress["chunks"] += 1
+                if len(moved) < self.chunkSize or self.stopEvent.wait(self.pauseSeconds):
+                    break
+
+            seconds = time.perf_counter() - started
+            run = {**self.progress, "seconds": round(seconds, 3),
+                   "rows_per_second": round(self.progress["archived"] / seconds, 1) if seconds else 0.0}
+            self.lastRun = run
+            self.stats["runs"] += 1
+            self.stats["archived"] += run["archived"]
+            self.stats["chunks"] += run["chunks"]
+            self.stats["seconds"] += seconds
+            return run
+        finally:
+            self.progress = None
+            self.running.release()
+
+    def stop(self):
+        self.stopEvent.set()
+
+    def exposition(self):
+        """Renders the sweep counters in the Prometheus text format, for /metrics"""
+        lastRate = self.lastRun["rows_per_second"] if self.lastRun else 0
+        metrics = [
+            ("foodinv_expiry_sweep_runs_total", "counter", "Completed expiry sweeps", self.stats["runs"]),
+            ("foodinv_expiry_sweep_archived_total", "counter", "Items moved to the archive", self.stats["archived"]),
+            ("foodinv_expiry_sweep_chunks_total", "counter", "Chunk transactions committed", self.stats["chunks"]),
+            ("foodinv_expiry_sweep_seconds_total", "counter", "Time spent sweeping", round(self.stats["seconds"], 6)),
+            ("foodinv_expiry_sweep_running", "gauge", "Whether a sweep is in progress", int(self.progress is not None)),
+            ("foodinv_expiry_sweep_last_rows_per_second", "gauge", "Throughput of the last sweep", lastRate),
+        ]
+        lines = []
+        for name, kind, description, value in metrics:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def initExpirySweeper(app):
+    """Creates the app's sweeper and starts sweeping every EXPIRY_SWEEP_SECONDS if configured"""
+    sweeper = ExpirySweeper(graceDays=app.config.get('EXPIRY_SWEEP_GRACE_DAYS', 30),
+                            chunkSize=app.config.get('EXPIRY_SWEEP_CHUNK_SIZE', 500),
+                            pauseSeconds=app.config.get('EXPIRY_SWEEP_PAUSE_SECONDS', 0.05))
+    app.extensions['expirySweeper'] = sweeper
+    requestMetrics = app.extensions.get('requestMetrics')
+    if requestMetrics is not None:
+        requestMetrics.collectors.append(sweeper.exposition)
+
+    interval = app.config.get('EXPIRY_SWEEP_SECONDS')
+    if interval:
+        def runSweeps():
+            while not sweeper.stopEvent.wait(interval):
+                with app.app_context():
+                    try:
+                        run = sweeper.run()
+                    except SQLAlchemyError:
+                        app.logger.exception("Expiry sweep failed")
+                        continue
+                if run and run["archived"]:
+                    app.logger.info("Archived %d items that expired before %s in %.1fs",
+                                    run["archived"], run["cutoff"], run["seconds"])
+
+        threading.Thread(target=runSweeps, name="expiry-sweep", daemon=True).start()
+
+    return sweeper
+
+
+@click.command('sweep-expired')
+@click.option('--grace-days', type=int, help="Days past expiry before an item is archived [default: EXPIRY_SWEEP_GRACE_DAYS]")
+@click.option('--chunk-size', type=int, help="Items moved per transaction [default: EXPIRY_SWEEP_CHUNK_SIZE]")
+@with_appcontext
+def sweepExpiredCommand(grace_days, chunk_size):
+    """Moves items expired for longer than the grace period into the archive now"""
+    configured = current_app.extensions['expirySweeper']
+    sweeper = ExpirySweeper(graceDays=configured.graceDays if grace_days is None else grace_days,
+                            chunkSize=chunk_size or configured.chunkSize, pauseSeconds=configured.pauseSeconds)
+    run = sweeper.run()
+    click.echo(f"Archived {run['archived']} items that expired before {run['cutoff']} in {run['chunks']} chunks, "
+               f"{run['seconds']:.1f}s ({run['rows_per_second']:.0f} rows/s)")
+
+
+def getExpiryTracker(userID=None, version=None):
+    """
+    Returns the current app's tracker, loading it from the database if that was deferred. Given userID and
+    their current inventory version, also reloads that user's items if another process changed them.
+    """
+    tracker = current_app.extensions['expiryTracker']
+    if not tracker.loaded:
+        tracker.loadFromDatabase()
+    if userID is not None:
+        tracker.reconcile(userID, version)
+    return tracker
+
+
+@onInventoryChange
+def syncExpiryTracker(action, rows, versions):
+    tracker = current_app.extensions.get('expiryTracker')
+    if tracker is None or not tracker.loaded:
+        return  # An unloaded tracker reads the committed rows when it loads
+
+    for row in rows:
+        if action == "delete":
+            tracker.untrack(row["id"])
+        else:
+            tracker.track(row)
+    for userID, version in versions.items():
+        tracker.advance(userID, version)
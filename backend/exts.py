@@ -1,3 +1,54 @@
+from functools import wraps
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
 
-db = SQLAlchemy()
\ No newline at end of file
+
+class RoutingSession(Session):
+    """Sends queries of read-only requests to the "read" bind when one is configured, everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('readOnly') \
+                and "read" in self._db.engines:
+            return self._db.engines["read"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def readOnly(f):
+    """Marks a view as read-only so its queries may be served by the read engine"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        g.readOnly = True
+        return f(*args, **kwargs)
+    return wrapper
+
+
+def initDatabase(app):
+    """Initialises db for the app and applies SQLITE_PRAGMAS to every new SQLite connection"""
+    db.init_app(app)
+
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+
+    with app.app_context():
+        for bindKey, engine in db.engines.items():
+            if engine.dialect.name != "sqlite":
+                continue
+            # journal_mode is a property of the database file, so only the primary engine sets it
+            enginePragmas = {name: value for name, value in pragmas.items()
+                             if bindKey is None or name != "journal_mode"}
+            event.listen(engine, "connect", makePragmaListener(enginePragmas))
+
+
+def makePragmaListener(pragmas):
+    def setPragmas(dbapiConnection, connectionRecord):
+        cursor = dbapiConnection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+    return setPragmas
@@ -0,0 +1,127 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select
+from exts import db
+from models import FoodInventory, InventoryEvent
+
+MIN_HISTORY_DAYS = 1.0  # Items with a shorter history in the window get no rate, rather than a wild one
+
+
+def fitConsumptionRates(groups, days, deltas, levels, fresh, itemCount, windowDays):
+    """
+    Fits a daily consumption rate for every item at once, from its quantity events in a window of windowDays
+    ending now. The events must be sorted by item, then in the order they happened.
+
+    Each item's rate is the least-squares slope of its cumulative consumption over time, through a point at 0
+    where its history starts, one after each event and one at now carrying the total, so time since it was last
+    used pulls the rate down. History starts at the item's latest create, since SQLite may give a deleted item's
+    id to a new one, or at the window start if that was earlier and the first event in the window did not stock
+    the item from empty. The per-item sums of the fit are taken with np.bincount over all events together.
+    :param groups: Index of each event's item, in 0..itemCount-1
+    :param days: Time of each event, in days since the window start
+    :param deltas: Quantity change of each event; negative is consumption
+    :param levels: Quantity after each event
+    :param fresh: Whether each event created its item, or is the baseline of one that predates the log
+    :return: Array of itemCount rates in units per day, nan where an item has too little history
+    """
+    import numpy as np  # Loaded on the first forecast instead of at startup
+
+    rates = np.full(itemCount, np.nan)
+    latest = np.full(itemCount, -1)
+    np.maximum.at(latest, groups, np.where(fresh, np.arange(len(groups)), -1))
+    kept = np.arange(len(groups)) >= latest[groups]
+    groups, days, deltas, levels, fresh = (array[kept] for array in (groups, days, deltas, levels, fresh))
+    if not len(groups):
+        return rates
+
+    first = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    counts = np.diff(np.r_[first, len(groups)])
+    owners = groups[first]
+    fromEmpty = fresh[first] | (levels[first] == deltas[first])
+    starts = np.where(fromEmpty, days[first], 0.0)
+
+    used = np.maximum(-deltas, 0).astype(np.float64)
+    cumulative = np.cumsum(used)
+    cumulative -= np.repeat(cumulative[first] - used[first], counts)  # Restarts the running total per item
+    totals = cumulative[first + counts - 1]
+
+    pointGroups = np.concatenate([groups, owners, owners])
+    t = np.concatenate([days, starts, np.full(len(owners), float(windowDays))])
+    y = np.concatenate([cumulative, np.zeros(len(owners)), totals])
+    n, sumT, sumY, sumTT, sumTY = (np.bincount(pointGroups, weights, minlength=itemCount)
+                                   for weights in (None, t, y, t * t, t * y))
+
+    fitted = np.zeros(itemCount, dtype=bool)
+    fitted[owners[windowDays - starts >= MIN_HISTORY_DAYS]] = True
+    denominator = n * sumTT - sumT * sumT
+    fitted &= denominator > 0
+    rates[fitted] = np.maximum((n * sumTY - sumT * sumY)[fitted] / denominator[fitted], 0.0)
+    return rates
+
+
+def daysSince(column, start):
+    """Days from start to a DateTime column as a number computed by the database, so no datetime is parsed per row"""
+    if db.engine.dialect.name == "sqlite":
+        return func.julianday(column) - func.julianday(start)
+    return func.extract("epoch", column - start) / 86400
+
+
+def forecastInventory(userID, windowDays=28, now=None):
+    """
+    Returns userID's items as dicts with their fitted daily_rate, the days_left at that rate and the
+    run_out_date, soonest first. daily_rate is None without enough history; days_left and run_out_date are None
+    when no run-out is in sight, or when it would fall past the last date Python can represent.
+    """
+    import numpy as np
+
+    now = now or datetime.utcnow()
+    windowStart = now - timedelta(days=windowDays)
+    items = db.session.execute(
+        select(FoodInventory.id, FoodInventory.name, FoodInventory.quantity, FoodInventory.expiry_date)
+        .where(FoodInventory.user_id == userID).order_by(FoodInventory.id)).all()
+    events = db.session.execute(
+        select(InventoryEvent.item_id, InventoryEvent.id, daysSince(InventoryEvent.created_at, windowStart),
+               InventoryEvent.delta, InventoryEvent.quantity, InventoryEvent.action.in_(["create", "baseline"]))
+        .where(InventoryEvent.user_id == userID, InventoryEvent.created_at >= windowStart)).all()
+
+    if not items:
+        return []
+
+    itemIDs = np.array([item.id for item in items], dtype=np.int64)
+    quantities = np.array([item.quantity for item in items], dtype=np.float64)
+    eventItems, eventIDs, days, deltas, levels, fresh = zip(*events) if events else ((),) * 6
+    eventItems, eventIDs, deltas, levels = (np.array(column, dtype=np.int64)
+                                            for column in (eventItems, eventIDs, deltas, levels))
+    days, fresh = np.array(days, dtype=np.float64), np.array(fresh, dtype=bool)
+
+    positions = np.minimum(np.searchsorted(itemIDs, eventItems), len(itemIDs) - 1)
+    order = np.lexsort((eventIDs, positions))
+    order = order[itemIDs[positions[order]] == eventItems[order]]  # Leaves out events of deleted items
+
+    rates = fitConsumptionRates(positions[order], days[order], deltas[order], levels[order], fresh[order],
+                                len(itemIDs), windowDays)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daysLeft = np.where(quantities == 0, 0.0, quantities / rates)
+
+    today = now.date()
+    horizon = (date.max - today).days
+    forecasts = []
+    for item, rate, left in zip(items, rates.tolist(), daysLeft.tolist()):
+        known = left == left and left <= horizon  # Neither nan nor infinite, nor a date timedelta cannot reach
+        forecasts.append({
+            "id": item.id, "name": item.name, "quantity": item.quantity, "expiry_date": item.expiry_date,
+            "daily_rate": None if rate != rate else round(rate, 3),
+            "days_left": round(left, 1) if known else None,
+            "run_out_date": today + timedelta(days=int(left)) if known else None,
+        })
+    forecasts.sort(key=lambda forecast: (forecast["days_left"] is None, forecast["days_left"] or 0, forecast["id"]))
+    return forecasts
+
+
+def lowStockItems(forecasts, days=7, threshold=1):
+    """
+    Picks the items expected to run out within days from forecasts, soonest first. Items without a fitted rate
+    fall back to the fixed quantity <= threshold test of FoodInventory.getLowQuantityItems.
+    """
+    return [forecast for forecast in forecasts
+            if (forecast["days_left"] is not None and forecast["days_left"] <= days)
+            or (forecast["daily_rate"] is None and forecast["quantity"] <= threshold)]
@@ -1,7 +1,23 @@
-from flask import request
-from flask_restx import Namespace, Resource, fields
-from models import FoodInventory
-from flask_jwt_extended import jwt_required
+from datetime import date
+from functools import wraps
+from math import ceil
+from zlib import crc32
+from flask import current_app, g, request, Response, stream_with_context
+from flask_restx import Namespace, Resource, fields, inputs
+from flask_restx.utils import unpack
+from werkzeug.http import http_date
+from models import FoodInventory, InventoryTombstone, InventoryVersion, User
+from exts import readOnly
+from expiry import getExpiryTracker
+from cache import getResponseCache
+from catalog import defaultExpiryDate, isValidUPC, lookupProduct
+from scans import BufferFull
+from events import EventStream, getEventBroker
+from forecast import forecastInventory, lowStockItems
+from serialization import RowEncoder, preEncoded
+from transfer import EXPORT_CHUNK_ROWS, EXPORT_MIMETYPES, IMPORT_BATCH_SIZE, IMPORT_FORMATS, ImportStopped, \
+    exportInventory, importInventory
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 
 inventoryNS = Namespace('inventory', description="A namespace for Inventory")
 
@@ -14,6 +30,210 @@ foodinvModel = inventoryNS.model("Food Inventory", {
 }
 )
 
+# Inventory Input Serializer, which can prefill name and expiry_date from a scanned UPC
+foodinvInputModel = inventoryNS.inherit("Food Inventory Input", foodinvModel, {
+    "upc": fields.String(description="Scanned barcode; fills in name and expiry_date when they are omitted")
+})
+
+# Product Catalog Serializer
+productModel = inventoryNS.model("Product", {
+    "upc": fields.String(),
+    "name": fields.String(),
+    "shelf_life_days": fields.Integer()
+})
+
+# Scan Ingestion Serializers
+scanModel = inventoryNS.model("Scan", {
+    "upc": fields.String(required=True),
+    "count": fields.Integer(default=1)
+})
+
+scanBatchModel = inventoryNS.model("Scan Batch", {
+    "scans": fields.List(fields.Nested(scanModel), required=True)
+})
+
+# Page of Inventory Serializer
+foodinvPageModel = inventoryNS.model("Food Inventory Page", {
+    "items": fields.List(fields.Nested(foodinvModel)),
+    "next_cursor": fields.Integer(description="Cursor for the next page, null on the last page")
+})
+
+# Delta Sync Serializers
+syncItemModel = inventoryNS.inherit("Sync Item", foodinvModel, {
+    "row_version": fields.Integer(),
+    "updated_at": fields.DateTime()
+})
+
+tombstoneModel = inventoryNS.model("Tombstone", {
+    "id": fields.Integer(attribute="item_id"),
+    "row_version": fields.Integer(),
+    "deleted_at": fields.DateTime()
+})
+
+syncModel = inventoryNS.model("Inventory Changes", {
+    "version": fields.Integer(description="Pass as since on the next sync"),
+    "items": fields.List(fields.Nested(syncItemModel), description="Created or updated since the given version"),
+    "deleted": fields.List(fields.Nested(tombstoneModel), description="Deleted since the given version")
+})
+
+# Import Result Serializer
+importResultModel = inventoryNS.model("Inventory Import Result", {
+    "imported": fields.Integer(description="Also given with a 400 when the upload stops parsing; those items are kept"),
+    "skipped": fields.Integer(description="Malformed records, or lines that are not UTF-8, that were not imported"),
+    "skipped_lines": fields.List(fields.Integer(), description="Line numbers of the first skipped records")
+})
+
+# Search Result Serializer
+searchResultModel = inventoryNS.inherit("Search Result", foodinvModel, {
+    "score": fields.Float(description="Relevance, higher is better")
+})
+
+# Quantity Delta Serializers
+deltaModel = inventoryNS.model("Quantity Delta", {
+    "delta": fields.Integer(required=True, description="Amount to add, negative to use some up"),
+    "remove_empty": fields.Boolean(default=False, description="Delete the item if it reaches zero")
+})
+
+deltaOperationModel = inventoryNS.model("Quantity Delta Operation", {
+    "id": fields.Integer(required=True),
+    "delta": fields.Integer(required=True)
+})
+
+deltaBatchModel = inventoryNS.model("Quantity Delta Batch", {
+    "deltas": fields.List(fields.Nested(deltaOperationModel), required=True),
+    "remove_empty": fields.Boolean(default=False)
+})
+
+deltaResultModel = inventoryNS.inherit("Quantity Delta Result", foodinvModel, {
+    "deleted": fields.Boolean(description="Whether the item reached zero and was removed")
+})
+
+# Run-out Forecast Serializer
+forecastModel = inventoryNS.inherit("Inventory Forecast", foodinvModel, {
+    "daily_rate": fields.Float(description="Fitted units used per day, null without enough history"),
+    "days_left": fields.Float(description="Days until it runs out at that rate, null if it is not being used up"),
+    "run_out_date": fields.Date()
+})
+
+# Bulk Operation Serializers
+bulkOperationModel = inventoryNS.model("Bulk Operation", {
+    "op": fields.String(required=True, enum=["create", "update", "delete"]),
+    "id": fields.Integer(description="Required for update and delete"),
+    "name": fields.String(),
+    "quantity": fields.Integer(),
+    "expiry_date": fields.Date()
+})
+
+bulkRequestModel = inventoryNS.model("Bulk Request", {
+    "operations": fields.List(fields.Nested(bulkOperationModel), required=True)
+})
+
+bulkResultModel = inventoryNS.model("Bulk Result", {
+    "index": fields.Integer(),
+    "op": fields.String(),
+    "id": fields.Integer(),
+    "status": fields.String()
+})
+
+# Encoders for the large list responses, which select column tuples instead of loading FoodInventory objects
+foodinvEncoder = RowEncoder(foodinvModel, FoodInventory)
+syncItemEncoder = RowEncoder(syncItemModel, FoodInventory)
+tombstoneEncoder = RowEncoder(tombstoneModel, InventoryTombstone)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_BULK_OPERATIONS = 1000
+MAX_DELTA = 1000000
+MAX_PAGE_SIZE = 500
+DEFAULT_SEARCH_RESULTS = 20
+MAX_SEARCH_RESULTS = 100
+DEFAULT_FORECAST_WINDOW = 28
+
+# Query string arguments accepted by GET /inventory
+inventoryListParser = inventoryNS.parser()
+inventoryListParser.add_argument('cursor', type=int, help="Id of the last item of the previous page")
+inventoryListParser.add_argument('limit', type=inputs.int_range(1, MAX_PAGE_SIZE), default=DEFAULT_PAGE_SIZE,
+                                 help=f"Page size, at most {MAX_PAGE_SIZE}")
+inventoryListParser.add_argument('name', type=str, help="Case-insensitive substring of the item name")
+inventoryListParser.add_argument('min_quantity', type=int)
+inventoryListParser.add_argument('max_quantity', type=int)
+inventoryListParser.add_argument('expires_after', type=inputs.date_from_iso8601, help="YYYY-MM-DD, inclusive")
+inventoryListParser.add_argument('expires_before', type=inputs.date_from_iso8601, help="YYYY-MM-DD, inclusive")
+
+# Query string arguments accepted by GET /inventory/sync
+syncParser = inventoryNS.parser()
+syncParser.add_argument('since', type=inputs.natural, default=0,
+                        help="The version returned by the previous sync, 0 for everything")
+
+# Query string arguments accepted by GET /inventory/export
+exportParser = inventoryNS.parser()
+exportParser.add_argument('format', choices=tuple(EXPORT_MIMETYPES), default="ndjson",
+                          help="ndjson for one JSON object per line, or csv")
+
+# Query string arguments accepted by GET /inventory/search
+searchParser = inventoryNS.parser()
+searchParser.add_argument('q', type=str, required=True, help="Name, part of a name or a misspelling of one")
+searchParser.add_argument('limit', type=inputs.int_range(1, MAX_SEARCH_RESULTS), default=DEFAULT_SEARCH_RESULTS,
+                          help=f"Number of results, at most {MAX_SEARCH_RESULTS}")
+
+def currentUserID():
+    """Returns the id of the user making the request, from the token's uid claim when it carries one"""
+    claims = get_jwt()
+    if "uid" in claims:
+        return claims["uid"]
+
+    # Tokens issued before the uid claim existed only carry the username
+    user = User.query.filter_by(username=get_jwt_identity()).first()
+    if user is None:
+        inventoryNS.abort(401, "Unknown user")
+    return user.id
+
+
+def conditionalGet(daily=False, tags=None):
+    """
+    Adds a strong ETag (and Last-Modified) to a GET handler and answers matching conditional requests with 304.
+    The validators come from the user's inventory version, so a 304 costs one primary key lookup and
+    never runs the handler, its row queries or the marshaller. Other requests are served from the
+    response cache when it holds a body built at the current version. Must sit inside jwt_required.
+    :param daily: Whether the response also depends on today's date, as the expiry views do
+    :param tags: Function of (userID, **view kwargs) returning the cache tags whose invalidation drops this response
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            userID = currentUserID()
+            version, updatedAt = InventoryVersion.current(userID)
+            g.inventoryVersion = version  # Lets the handler check in-memory state against it without a query
+
+            # The body is fully determined by the version, the URL, the field mask and (for daily views) the date
+            key = request.full_path + request.headers.get("X-Fields", "") + (date.today().isoformat() if daily else "")
+            etag = f"{userID}-{version}-{crc32(key.encode()):08x}"
+            headers = {"ETag": f'"{etag}"'}
+            if updatedAt is not None and not daily:
+                headers["Last-Modified"] = http_date(updatedAt)
+
+            if request.if_none_match:
+                if etag in request.if_none_match:
+                    return Response(status=304, headers=headers)
+            elif "Last-Modified" in headers and request.if_modified_since is not None \
+                    and updatedAt.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None):
+                return Response(status=304, headers=headers)
+
+            responseCache = getResponseCache()
+            cacheKey = f"{userID}:{key}"
+            if responseCache is not None:
+                data = responseCache.get(cacheKey, version)
+                if data is not None:
+                    return data, 200, headers
+
+            data, code, extraHeaders = unpack(f(*args, **kwargs))
+            if responseCache is not None and code == 200:
+                cacheTags = tags(userID, **kwargs) if tags else [f"list:{userID}"]
+                responseCache.set(cacheKey, version, data, cacheTags)
+            return data, code, {**headers, **extraHeaders}
+        return wrapper
+    return decorator
+
+
 @inventoryNS.route('/hello')
 class HelloResource(Resource):
     def get(self):
@@ -21,23 +241,57 @@ class HelloResource(Resource):
 
 @inventoryNS.route('/inventory')
 class FoodInventoryList(Resource):
-    @inventoryNS.marshal_list_with(foodinvModel)
+    @inventoryNS.expect(inventoryListParser)
+    @readOnly
+    @jwt_required()
+    @conditionalGet()
+    @preEncoded(foodinvPageModel)
     def get(self):
-        """Returns a list of all FoodInventory objects"""
-        return FoodInventory.query.all()
+        """Returns one page of the user's FoodInventory objects matching the filters"""
+        args = inventoryListParser.parse_args()
 
-    @inventoryNS.expect(foodinvModel)
+        items, nextCursor = FoodInventory.getPage(
+            userID=currentUserID(),
+            cursor=args['cursor'],
+            limit=args['limit'],
+            name=args['name'],
+            minQuantity=args['min_quantity'],
+            maxQuantity=args['max_quantity'],
+            expiresAfter=args['expires_after'],
+            expiresBefore=args['expires_before'],
+            columns=foodinvEncoder.columns
+        )
+
+        return {"items": foodinvEncoder.rows(items), "next_cursor": nextCursor}
+
+    @inventoryNS.expect(foodinvInputModel)
     @inventoryNS.marshal_with(foodinvModel, code=201)
     @jwt_required()
     def post(self):
         """Add a new FoodInventory object to database"""
         data = request.get_json()
+        name = data.get('name')
+        expiryDate = data.get('expiry_date')
+
+        if data.get('upc') and (name is None or expiryDate is None):
+            if not isValidUPC(data['upc']):
+                inventoryNS.abort(400, "UPC must be 8 to 14 digits")
+            product = lookupProduct(data['upc'])
+            if product is None:
+                inventoryNS.abort(400, f"Unknown UPC {data['upc']}; provide name and expiry_date")
+            name = name if name is not None else product['name']
+            if expiryDate is None:
+                expiryDate = defaultExpiryDate(product)
+                if expiryDate is None:
+                    inventoryNS.abort(400, f"No shelf life on record for UPC {data['upc']}; provide expiry_date")
+                expiryDate = expiryDate.isoformat()
 
         newItem = FoodInventory(
             id=data.get('id'),
-            name=data.get('name'),
+            name=name,
             quantity=data.get('quantity'),
-            expiry_date=data.get('expiry_date')
+            expiry_date=parseExpiryDate(expiryDate),
+            user_id=currentUserID()
         )
 
         newItem.save()
@@ -54,13 +308,407 @@ class FoodInventoryList(Resource):
         # return item, 201 # HTTP status code 201 indicates item creation was successful
 
 
+@inventoryNS.route('/inventory/sync')
+class FoodInventorySync(Resource):
+    @inventoryNS.expect(syncParser)
+    @readOnly
+    @jwt_required()
+    @conditionalGet()
+    @preEncoded(syncModel)
+    def get(self):
+        """Returns the user's items changed and deleted since a version, for offline clients to reconcile"""
+        args = syncParser.parse_args()
+        userID = currentUserID()
+
+        # Read first: anything written meanwhile is either included now or in the next sync, never lost
+        version, _ = InventoryVersion.current(userID)
+        items, tombstones = FoodInventory.changedSince(userID, args['since'], columns=syncItemEncoder.columns,
+                                                       tombstoneColumns=tombstoneEncoder.columns)
+        return {"version": version, "items": syncItemEncoder.rows(items), "deleted": tombstoneEncoder.rows(tombstones)}
+
+
+@inventoryNS.route('/inventory/export')
+class FoodInventoryExport(Resource):
+    @inventoryNS.expect(exportParser)
+    @readOnly
+    @jwt_required()
+    def get(self):
+        """Streams every item of the user as NDJSON or CSV, for backups and migrations"""
+        args = exportParser.parse_args()
+        chunks = exportInventory(foodinvEncoder, currentUserID(), args['format'],
+                                 current_app.config.get('INVENTORY_EXPORT_CHUNK_ROWS', EXPORT_CHUNK_ROWS))
+        return Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[args['format']],
+                        headers={"Content-Disposition": f'attachment; filename="inventory.{args["format"]}"'})
+
+
+@inventoryNS.route('/inventory/import')
+class FoodInventoryImport(Resource):
+    @inventoryNS.marshal_with(importResultModel)
+    @jwt_required()
+    def post(self):
+        """Creates items from an NDJSON or CSV upload (name, quantity, expiry_date), committed in batches as it is read"""
+        importFormat = IMPORT_FORMATS.get(request.mimetype)
+        if importFormat is None:
+            inventoryNS.abort(415, f"Content-Type must be one of {', '.join(IMPORT_FORMATS)}")
+
+        try:
+            imported, skipped, skippedLines = importInventory(
+                request.stream, currentUserID(), importFormat,
+                current_app.config.get('INVENTORY_IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE))
+        except ImportStopped as stopped:
+            inventoryNS.abort(400, stopped.message, imported=stopped.imported, skipped=stopped.skipped,
+                              skipped_lines=stopped.skippedLines)
+        return {"imported": imported, "skipped": skipped, "skipped_lines": skippedLines}
+
+
+@inventoryNS.route('/inventory/search')
+class FoodInventorySearch(Resource):
+    @inventoryNS.expect(searchParser)
+    @readOnly
+    @jwt_required()
+    @conditionalGet()
+    @inventoryNS.marshal_list_with(searchResultModel)
+    def get(self):
+        """Returns the user's items ranked by how well their names match q, tolerating prefixes and typos"""
+        args = searchParser.parse_args()
+        if not args['q'].strip():
+            inventoryNS.abort(400, "q must not be blank")
+
+        return FoodInventory.search(args['q'], userID=currentUserID(), limit=args['limit'])
+
+
+def parseExpiryDate(value):
+    """Parses a YYYY-MM-DD string into a date, aborting with 400 when it is malformed"""
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        inventoryNS.abort(400, "expiry_date must be a YYYY-MM-DD date")
+
+
+def validateBulkOperation(operation):
+    """Returns an error message for a malformed bulk operation, or None if it is well formed"""
+    if not isinstance(operation, dict):
+        return "Operation must be an object"
+
+    op = operation.get('op')
+    if op not in ("create", "update", "delete"):
+        return "op must be one of create, update or delete"
+
+    if op in ("update", "delete") and (isinstance(operation.get('id'), bool) or not isinstance(operation.get('id'), int)):
+        return f"id is required for {op}"
+    if op == "create":
+        missing = [field for field in ("name", "quantity", "expiry_date") if operation.get(field) is None]
+        if missing:
+            return f"Missing fields for create: {', '.join(missing)}"
+    if op == "update" and all(operation.get(field) is None for field in ("name", "quantity", "expiry_date")):
+        return "update requires at least one of name, quantity or expiry_date"
+
+    if operation.get('name') is not None and (not isinstance(operation['name'], str) or not operation['name'].strip()):
+        return "name must be a non-empty string"
+    if operation.get('quantity') is not None and (isinstance(operation['quantity'], bool)
+                                                  or not isinstance(operation['quantity'], int)
+                                                  or operation['quantity'] < 0):
+        return "quantity must be a non-negative integer"
+    if operation.get('expiry_date') is not None:
+        try:
+            date.fromisoformat(operation['expiry_date'])
+        except (TypeError, ValueError):
+            return "expiry_date must be a YYYY-MM-DD date"
+    return None
+
+
+@inventoryNS.route('/inventory/bulk')
+class FoodInventoryBulk(Resource):
+    @inventoryNS.expect(bulkRequestModel)
+    @jwt_required()
+    def post(self):
+        """Applies a batch of create, update and delete operations in one transaction"""
+        userID = currentUserID()
+        data = request.get_json() or {}
+        operations = data.get('operations')
+
+        if not isinstance(operations, list) or not operations:
+            return {"message": "operations must be a non-empty list"}, 400
+        if len(operations) > MAX_BULK_OPERATIONS:
+            return {"message": f"At most {MAX_BULK_OPERATIONS} operations per request"}, 400
+
+        # Validate the whole batch before touching the database
+        errors = []
+        for index, operation in enumerate(operations):
+            error = validateBulkOperation(operation)
+            if error:
+                errors.append({"index": index, "error": error})
+
+        if not errors:
+            targetIds = [operation['id'] for operation in operations if operation['op'] != "create"]
+            existing = FoodInventory.existingIds(targetIds, userID)
+            seen = set()
+            for index, operation in enumerate(operations):
+                if operation['op'] == "create":
+                    continue
+                if operation['id'] not in existing:
+                    errors.append({"index": index, "error": f"Item {operation['id']} not found"})
+                elif operation['id'] in seen:
+                    errors.append({"index": index, "error": f"Item {operation['id']} appears more than once"})
+                seen.add(operation['id'])
+
+        if errors:
+            return {"message": "Batch rejected, no changes were made", "errors": errors}, 400
+
+        columns = ("name", "quantity", "expiry_date")
+        creates, updates, deleteIds = [], [], []
+        for operation in operations:
+            values = {column: operation[column] for column in columns if operation.get(column) is not None}
+            if 'expiry_date' in values:
+                values['expiry_date'] = date.fromisoformat(values['expiry_date'])
+
+            if operation['op'] == "create":
+                creates.append({**values, "user_id": userID})
+            elif operation['op'] == "update":
+                updates.append({"id": operation['id'], **values})
+            else:
+                deleteIds.append(operation['id'])
+
+        newIds = iter(FoodInventory.applyBulk(creates, updates, deleteIds))
+
+        results = []
+        for index, operation in enumerate(operations):
+            if operation['op'] == "create":
+                results.append({"index": index, "op": "create", "id": next(newIds), "status": "created"})
+            else:
+                status = "updated" if operation['op'] == "update" else "deleted"
+                results.append({"index": index, "op": operation['op'], "id": operation['id'], "status": status})
+
+        return {"results": inventoryNS.marshal(results, bulkResultModel)}, 200
+
+
+def isValidDelta(value):
+    return isinstance(value, int) and not isinstance(value, bool) and -MAX_DELTA <= value <= MAX_DELTA
+
+
+def deltaResults(updated, deleted):
+    return [{**row, "deleted": False} for row in updated] + [{**row, "deleted": True} for row in deleted]
+
+
+@inventoryNS.route('/inventory/deltas')
+class FoodInventoryDeltas(Resource):
+    @inventoryNS.expect(deltaBatchModel)
+    @jwt_required()
+    def post(self):
+        """Adds quantity deltas to several items in one statement; repeated ids are summed"""
+        userID = currentUserID()
+        data = request.get_json() or {}
+        operations = data.get('deltas')
+
+        if not isinstance(operations, list) or not operations:
+            return {"message": "deltas must be a non-empty list"}, 400
+        if len(operations) > MAX_BULK_OPERATIONS:
+            return {"message": f"At most {MAX_BULK_OPERATIONS} deltas per request"}, 400
+
+        deltas = {}
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict) or not isinstance(operation.get('id'), int) \
+                    or not isValidDelta(operation.get('delta')):
+                return {"message": f"Delta {index} needs an integer id and an integer delta"}, 400
+            deltas[operation['id']] = deltas.get(operation['id'], 0) + operation['delta']
+
+        missing = set(deltas) - FoodInventory.existingIds(list(deltas), userID)
+        if missing:
+            return {"message": "Batch rejected, no changes were made",
+                    "errors": [{"id": itemID, "error": f"Item {itemID} not found"} for itemID in sorted(missing)]}, 400
+
+        updated, deleted = FoodInventory.applyDeltas(deltas, userID, removeEmpty=bool(data.get('remove_empty')))
+        return {"results": inventoryNS.marshal(deltaResults(updated, deleted), deltaResultModel)}, 200
+
+
+@inventoryNS.route('/barcode/<string:upc>')
+class BarcodeLookup(Resource):
+    @inventoryNS.marshal_with(productModel)
+    @jwt_required()
+    def get(self, upc):
+        """Returns the catalog product for a scanned UPC"""
+        if not isValidUPC(upc):
+            inventoryNS.abort(400, "UPC must be 8 to 14 digits")
+
+        product = lookupProduct(upc)
+        if product is None:
+            inventoryNS.abort(404, f"No product with UPC {upc}")
+        return product
+
+
+@inventoryNS.route('/scans')
+class ScanIngestion(Resource):
+    @inventoryNS.expect(scanBatchModel)
+    @jwt_required()
+    def post(self):
+        """Accepts barcode detections into the write-behind buffer; they reach the inventory at the next flush"""
+        userID = currentUserID()
+        scans = (request.get_json() or {}).get('scans')
+
+        if not isinstance(scans, list) or not scans:
+            return {"message": "scans must be a non-empty list"}, 400
+        for scan in scans:
+            count = scan.get('count', 1) if isinstance(scan, dict) else None
+            if not isinstance(scan, dict) or not isValidUPC(scan.get('upc')) \
+                    or isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= 1000:
+                return {"message": "Each scan needs an 8 to 14 digit upc and a count between 1 and 1000"}, 400
+
+        # Checked on arrival, from the product LRU, since the flush could only drop scans it cannot turn into items
+        errors = []
+        for upc in dict.fromkeys(scan['upc'] for scan in scans):
+            product = lookupProduct(upc)
+            if product is None:
+                errors.append({"upc": upc, "error": f"Unknown UPC {upc}"})
+            elif defaultExpiryDate(product) is None:
+                errors.append({"upc": upc, "error": f"No shelf life on record for UPC {upc}"})
+        if errors:
+            return {"message": "Batch rejected, no scans were accepted", "errors": errors}, 400
+
+        scanBuffer = current_app.extensions['scanBuffer']
+        accepted = 0
+        try:
+            for scan in scans:
+                scanBuffer.add(userID, scan['upc'], scan.get('count', 1))
+                accepted += 1
+        except BufferFull:
+            retryAfter = str(max(1, ceil(scanBuffer.flushInterval)))
+            return {"message": "Scan buffer is full, retry shortly", "accepted": accepted}, 503, {"Retry-After": retryAfter}
+
+        return {"accepted": accepted, "pending": scanBuffer.pendingCount()}, 202
+
+
+@inventoryNS.route('/scans/stats')
+class ScanBufferStats(Resource):
+    @jwt_required()
+    def get(self):
+        """Returns the scan buffer's pending size and flush counters"""
+        scanBuffer = current_app.extensions['scanBuffer']
+        return scanBuffer.counters()
+
+
+@inventoryNS.route('/stream')
+class InventoryStream(Resource):
+    @jwt_required(locations=["headers", "query_string"])  # EventSource cannot set headers, so ?jwt= works too
+    def get(self):
+        """Streams the user's create, update, delete and expire events as Server-Sent Events"""
+        broker = getEventBroker()
+        userID = currentUserID()
+        subscriber = broker.subscribe(userID, InventoryVersion.current(userID)[0])
+        if subscriber is None:
+            return {"message": "Too many open event streams, retry shortly"}, 503, {"Retry-After": "5"}
+        stream = EventStream(broker, subscriber, current_app.config.get('EVENT_STREAM_HEARTBEAT_SECONDS', 15))
+        request.environ[EventStream.ENVIRON_KEY] = stream  # Lets the ASGI adapter wait for events on its loop
+        return Response(stream.frames(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@inventoryNS.route('/stream/stats')
+class InventoryStreamStats(Resource):
+    @jwt_required()
+    def get(self):
+        """Returns the number of open event streams and the publish counters"""
+        broker = getEventBroker()
+        return {"subscribers": broker.count, **broker.stats}
+
+
+@inventoryNS.route('/sweeper/stats')
+class ExpirySweeperStats(Resource):
+    @jwt_required()
+    def get(self):
+        """Returns the expiry sweeper's totals, the running sweep's progress and the last sweep's throughput"""
+        sweeper = current_app.extensions['expirySweeper']
+        return {"grace_days": sweeper.graceDays, "progress": sweeper.progress, "last_run": sweeper.lastRun,
+                **sweeper.stats}
+
+
+@inventoryNS.route('/cache/stats')
+class ResponseCacheStats(Resource):
+    @jwt_required()
+    def get(self):
+        """Returns the response cache hit/miss counters and size, for sizing RESPONSE_CACHE_MAX_ENTRIES and _MAX_BYTES"""
+        responseCache = getResponseCache()
+        if responseCache is None:
+            return {"enabled": False}
+        return {"enabled": True, **responseCache.stats()}
+
+
+@inventoryNS.route('/inventory/expired')
+class ExpiredInventory(Resource):
+    @readOnly
+    @jwt_required()
+    @conditionalGet(daily=True)
+    @preEncoded(foodinvModel, asList=True)
+    def get(self):
+        """Returns the user's items that expired before today, oldest first"""
+        userID = currentUserID()
+        return foodinvEncoder.mappings(getExpiryTracker(userID, g.inventoryVersion).expiredItems(userID))
+
+
+# Query string arguments accepted by GET /inventory/expiring
+expiringParser = inventoryNS.parser()
+expiringParser.add_argument('days', type=inputs.int_range(0, 365), default=3,
+                            help="Window in days, counted from today")
+
+@inventoryNS.route('/inventory/expiring')
+class ExpiringInventory(Resource):
+    @inventoryNS.expect(expiringParser)
+    @readOnly
+    @jwt_required()
+    @conditionalGet(daily=True)
+    @preEncoded(foodinvModel, asList=True)
+    def get(self):
+        """Returns the user's items expiring between today and today + days, soonest first"""
+        args = expiringParser.parse_args()
+        userID = currentUserID()
+        return foodinvEncoder.mappings(getExpiryTracker(userID, g.inventoryVersion).expiringWithin(userID, args['days']))
+
+
+# Query string arguments accepted by GET /inventory/forecast
+forecastParser = inventoryNS.parser()
+forecastParser.add_argument('window', type=inputs.int_range(2, 365), default=DEFAULT_FORECAST_WINDOW,
+                            help="Days of consumption history the rates are fitted to")
+
+@inventoryNS.route('/inventory/forecast')
+class InventoryForecast(Resource):
+    @inventoryNS.expect(forecastParser)
+    @readOnly
+    @jwt_required()
+    @inventoryNS.marshal_list_with(forecastModel)
+    def get(self):
+        """Returns the user's items with their fitted consumption rates and run-out dates, soonest first"""
+        args = forecastParser.parse_args()
+        return forecastInventory(currentUserID(), args['window'])
+
+
+# Query string arguments accepted by GET /inventory/low-stock
+lowStockParser = forecastParser.copy()
+lowStockParser.add_argument('days', type=inputs.int_range(0, 365), default=7,
+                            help="Include items expected to run out within this many days")
+lowStockParser.add_argument('threshold', type=inputs.natural, default=1,
+                            help="Quantity at or below which items with no fitted rate are included")
+
+@inventoryNS.route('/inventory/low-stock')
+class LowStockInventory(Resource):
+    @inventoryNS.expect(lowStockParser)
+    @readOnly
+    @jwt_required()
+    @inventoryNS.marshal_list_with(forecastModel)
+    def get(self):
+        """Returns the user's items expected to run out within days, soonest first"""
+        args = lowStockParser.parse_args()
+        return lowStockItems(forecastInventory(currentUserID(), args['window']), args['days'], args['threshold'])
+
+
 @inventoryNS.route("/inventory/<int:item_id>")
 class FoodInventoryItem(Resource):
+    @readOnly
+    @jwt_required()
+    @conditionalGet(tags=lambda userID, item_id: [f"item:{item_id}"])
     @inventoryNS.marshal_with(foodinvModel)
     def get(self, item_id):
         """Returns a specific FoodInventory object by ID"""
-        item = FoodInventory.query.get_or_404(
-            item_id)  # Queries item_id and returns 404 if item isn't found
+        item = FoodInventory.scoped(currentUserID()).filter_by(
+            id=item_id).first_or_404()  # Returns 404 if the item isn't found or belongs to another user
         return item
 
     @inventoryNS.expect(foodinvModel)
@@ -68,11 +716,11 @@ class FoodInventoryItem(Resource):
     @jwt_required()
     def put(self, item_id):
         """Updates a specific FoodInventory object by ID"""
-        itemToUpdate = FoodInventory.query.get_or_404(
-            item_id)  # Queries item_id and returns 404 if item isn't found
+        itemToUpdate = FoodInventory.scoped(currentUserID()).filter_by(
+            id=item_id).first_or_404()  # Returns 404 if the item isn't found or belongs to another user
         
         data=request.get_json()
-        itemToUpdate.update(data.get('name'), data.get('quantity'), data.get('expiry_date'))
+        itemToUpdate.update(data.get('name'), data.get('quantity'), parseExpiryDate(data.get('expiry_date')))
 
         # item.name = request.json.get("name", item.name)
         # item.quantity = request.json.get("quantity", item.quantity)
@@ -80,12 +728,28 @@ class FoodInventoryItem(Resource):
         # db.session.commit()
         return itemToUpdate
 
+    @inventoryNS.expect(deltaModel)
+    @inventoryNS.marshal_with(deltaResultModel)
+    @jwt_required()
+    def patch(self, item_id):
+        """Atomically adds a delta to a specific FoodInventory object's quantity, clamping at zero"""
+        data = request.get_json() or {}
+        if not isValidDelta(data.get('delta')):
+            inventoryNS.abort(400, f"delta must be an integer between -{MAX_DELTA} and {MAX_DELTA}")
+
+        updated, deleted = FoodInventory.applyDeltas({item_id: data['delta']}, currentUserID(),
+                                                     removeEmpty=bool(data.get('remove_empty')))
+        results = deltaResults(updated, deleted)
+        if not results:
+            inventoryNS.abort(404, f"Item {item_id} not found")
+        return results[0]
+
     @inventoryNS.marshal_with(foodinvModel)
     @jwt_required()
     def delete(self, item_id):
         """Deletes a specific FoodInventory object by ID"""
-        itemToDelete = FoodInventory.query.get_or_404(
-            item_id)  # Queries item_id and returns 404 if item isn't found
+        itemToDelete = FoodInventory.scoped(currentUserID()).filter_by(
+            id=item_id).first_or_404()  # Returns 404 if the item isn't found or belongs to another user
         itemToDelete.delete()
         # HTTP status code 204 indicates deletion was successful
         return itemToDelete, 204
@@ -1,12 +1,28 @@
-from flask import Flask
+import time
+STARTED = time.perf_counter()  # Measures the import of the app's modules below
+
+import json
+from contextlib import contextmanager
+import click
+from flask import Flask, Response, current_app
+from flask.cli import with_appcontext
 from flask_restx import Api
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
-from models import FoodInventory, User
+from models import FoodInventory, Product, Recipe, User
 from inventory import inventoryNS
 from auth import authNS
-from exts import db
+from exts import db, initDatabase
+from expiry import initExpirySweeper, initExpiryTracker, sweepExpiredCommand
+from cache import initResponseCache
+from passwords import initPasswordHasher
+from catalog import initProductCatalog
+from scans import initScanBuffer
+from events import initEventBroker
+from metrics import initMetrics
+from recipes import initRecipeCorpus, recipeNS
+
+IMPORT_SECONDS = time.perf_counter() - STARTED
 
 # Decorator Meanings
 # marshal_with(): Takes data obj and applies field filtering.
@@ -15,27 +31,111 @@ from exts import db
 
 
 def createApp(config):
-    app = Flask(__name__)
-    app.config.from_object(config)
+    timings = {"import": IMPORT_SECONDS}
+    with startupPhase(timings, "create_app"):
+        app = Flask(__name__)
+        app.config.from_object(config)
 
-    CORS(app) # Communicates between localhost:3000 and localhost:5000
+        CORS(app) # Communicates between localhost:3000 and localhost:5000
 
-    db.init_app(app)
+        with startupPhase(timings, "extensions"):
+            initDatabase(app)
+            initMetrics(app)
+            initExpiryTracker(app)
+            initExpirySweeper(app)
+            initResponseCache(app)
+            initPasswordHasher(app)
+            initProductCatalog(app)
+            initScanBuffer(app)
+            initEventBroker(app)
+            initRecipeCorpus(app)
 
-    migrate = Migrate(app, db)
-    JWTManager(app)
+            app.cli.add_command(MigrateCommands(app))  # Flask-Migrate is imported when a `flask db` command runs
+            app.cli.add_command(sweepExpiredCommand)
+            JWTManager(app)
 
-    api = Api(app, doc='/docs')
+        with startupPhase(timings, "api"):
+            docs = '/docs' if app.config.get('API_DOCS', True) else False
+            prebuiltSpec = app.config.get('SWAGGER_JSON')
+            api = Api(doc=docs)
+            api.init_app(app, add_specs=not prebuiltSpec)  # Api(app, add_specs=...) would ignore add_specs
+            if prebuiltSpec:
+                app.add_url_rule('/swagger.json', 'specs', prebuiltSpecView(prebuiltSpec))
+                if docs:
+                    app.add_url_rule(docs, 'doc', api.render_doc)
 
-    api.add_namespace(inventoryNS)
-    api.add_namespace(authNS)
+            api.add_namespace(inventoryNS)
+            api.add_namespace(authNS)
+            api.add_namespace(recipeNS)
+            app.extensions['api'] = api
+            app.cli.add_command(exportSwaggerCommand)
+
+    app.extensions['startupTiming'] = timings
+    app.logger.info("App created in %.1f ms (%s)", timings["create_app"] * 1000,
+                    ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in timings.items()))
 
     @app.shell_context_processor
     def makeShellContext():
         return {
             "db": db,
             "Food Inventory": FoodInventory,
+            "Product": Product,
+            "Recipe": Recipe,
             "user": User
         }
     
-    return app
\ No newline at end of file
+    return app
+
+
+@contextmanager
+def startupPhase(timings, phase):
+    started = time.perf_counter()
+    yield
+    timings[phase] = time.perf_counter() - started
+
+
+def initMigrate(app):
+    """Sets up Flask-Migrate on first use; alembic alone takes longer to import than the rest of the app"""
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    return app.extensions['migrate']
+
+
+class MigrateCommands(click.Command):
+    """The `flask db` command group, loaded from Flask-Migrate only when it is used"""
+
+    def __init__(self, app):
+        super().__init__(name='db', help="Perform database migrations.", add_help_option=False,
+                         context_settings={'ignore_unknown_options': True, 'allow_extra_args': True})
+        self.app = app
+
+    def invoke(self, ctx):
+        initMigrate(self.app)
+        from flask_migrate.cli import db as dbGroup
+        with dbGroup.make_context(ctx.info_name, ctx.args, parent=ctx.parent) as groupContext:
+            return dbGroup.invoke(groupContext)
+
+
+def prebuiltSpecView(path):
+    """Serves the Swagger spec written by `flask export-swagger`, read once on first request"""
+    spec = []
+
+    def specs():
+        if not spec:
+            with open(path, 'rb') as specFile:
+                spec.append(specFile.read())
+        return Response(spec[0], mimetype='application/json')
+    return specs
+
+
+@click.command('export-swagger')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@with_appcontext
+def exportSwaggerCommand(path):
+    """Writes the API's Swagger spec to a file, for serving through SWAGGER_JSON"""
+    with current_app.test_request_context():
+        schema = current_app.extensions['api'].__schema__
+    with open(path, 'w') as specFile:
+        json.dump(schema, specFile, indent=2, sort_keys=True)
+    click.echo(f"Wrote the Swagger spec to {path}")
@@ -0,0 +1,152 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from exts import db
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # Seconds
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)  # Bytes
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus model; observe is one bisect and two additions"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def exposition(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6g}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class RequestMetrics:
+    """
+    Per-route request metrics: latency, SQL statements and time, and response size.
+
+    Each (method, route, status) gets its own set of histograms, so memory is bounded by the number of
+    routes rather than requests. Recording a request costs a handful of bisects under one lock.
+    """
+
+    HISTOGRAMS = (
+        ("duration", "foodinv_http_request_duration_seconds", "Time spent handling the request", LATENCY_BUCKETS),
+        ("queries", "foodinv_http_request_sql_queries", "SQL statements executed by the request", QUERY_BUCKETS),
+        ("dbTime", "foodinv_http_request_db_seconds", "Time spent in SQL statements by the request", LATENCY_BUCKETS),
+        ("size", "foodinv_http_response_size_bytes", "Response body size, when known up front", SIZE_BUCKETS),
+    )
+
+    def __init__(self):
+        self.series = {}
+        self.lock = threading.Lock()
+        self.collectors = []  # Functions returning more exposition text, such as the expiry sweeper's counters
+
+    def record(self, method, route, status, duration, queries, dbTime, size):
+        key = (method, route, status)
+        with self.lock:
+            histograms = self.series.get(key)
+            if histograms is None:
+                histograms = self.series[key] = {attribute: Histogram(buckets)
+                                                 for attribute, _, _, buckets in self.HISTOGRAMS}
+            histograms["duration"].observe(duration)
+            histograms["queries"].observe(queries)
+            histograms["dbTime"].observe(dbTime)
+            if size is not None:
+                histograms["size"].observe(size)
+
+    def exposition(self):
+        """Renders every series in the Prometheus text exposition format"""
+        with self.lock:
+            series = sorted(self.series.items())
+            lines = []
+            for attribute, name, description, _ in self.HISTOGRAMS:
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route, status), histograms in series:
+                    if histograms[attribute].count:
+                        labels = f'method="{method}",route="{escapeLabel(route)}",status="{status}"'
+                        lines.extend(histograms[attribute].exposition(name, labels))
+        return "\n".join(lines) + "\n"
+
+
+def escapeLabel(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def beforeCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    context.metricsStarted = time.perf_counter()
+
+
+def afterCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.metricsStarted
+    if has_request_context() and "metricsStarted" in g:
+        g.sqlQueries += 1
+        g.sqlTime += elapsed
+
+
+def startRequestTimer():
+    g.metricsStarted = time.perf_counter()
+    g.sqlQueries = 0
+    g.sqlTime = 0.0
+
+
+def recordRequest(response):
+    if "metricsStarted" not in g:
+        return response
+    duration = time.perf_counter() - g.metricsStarted
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    size = None if response.is_streamed else response.calculate_content_length()
+    current_app.extensions['requestMetrics'].record(request.method, route, response.status_code, duration,
+                                                    g.sqlQueries, g.sqlTime, size)
+
+    if current_app.config.get('METRICS_SERVER_TIMING'):
+        response.headers["Server-Timing"] = (f'app;dur={duration * 1000:.2f}, '
+                                             f'db;dur={g.sqlTime * 1000:.2f};desc="{g.sqlQueries} queries"')
+    return response
+
+
+def startupExposition(timings):
+    lines = ["# HELP foodinv_startup_seconds Time taken by each phase of app startup",
+             "# TYPE foodinv_startup_seconds gauge"]
+    lines.extend(f'foodinv_startup_seconds{{phase="{phase}"}} {seconds:.6g}' for phase, seconds in timings.items())
+    return "\n".join(lines) + "\n"
+
+
+def metricsView():
+    requestMetrics = current_app.extensions['requestMetrics']
+    exposition = requestMetrics.exposition()
+    exposition += startupExposition(current_app.extensions.get('startupTiming', {}))
+    exposition += "".join(collector() for collector in requestMetrics.collectors)
+    return Response(exposition, mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+def initMetrics(app):
+    """Times every request and its SQL statements when METRICS_ENABLED is set, and serves them on /metrics"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return None
+
+    requestMetrics = RequestMetrics()
+    app.extensions['requestMetrics'] = requestMetrics
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", beforeCursorExecute)
+            event.listen(engine, "after_cursor_execute", afterCursorExecute)
+
+    app.before_request(startRequestTimer)
+    app.after_request(recordRequest)
+    app.add_url_rule('/metrics', 'metrics', metricsView)
+    return requestMetrics
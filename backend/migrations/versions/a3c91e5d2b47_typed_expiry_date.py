@@ -0,0 +1,88 @@
+"""typed and indexed expiry_date
+
+Revision ID: a3c91e5d2b47
+Revises: 70665ce9f03f
+Create Date: 2026-10-18 10:12:41.207315
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91e5d2b47'
+down_revision = '70665ce9f03f'
+branch_labels = None
+depends_on = None
+
+# Formats seen in rows written before expiry_date was typed, tried in order
+LEGACY_DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d', '%m/%d/%Y')
+
+foodInventory = sa.table('food_inventory',
+    sa.column('id', sa.Integer()),
+    sa.column('expiry_date', sa.String()),
+    sa.column('expiry_date_typed', sa.Date())
+)
+
+
+def parseLegacyDate(value):
+    value = value.strip()
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        pass
+    for fmt in LEGACY_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def upgrade():
+    # Backfill into a new typed column instead of altering in place, because SQLite's batch
+    # copy would CAST the strings to DATE, which has numeric affinity and truncates them to the year
+    op.add_column('food_inventory', sa.Column('expiry_date_typed', sa.Date(), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(foodInventory.c.id, foodInventory.c.expiry_date)).fetchall()
+
+    backfill, unparseable = [], []
+    for rowID, value in rows:
+        parsed = parseLegacyDate(value or '')
+        if parsed is None:
+            unparseable.append(rowID)
+        else:
+            backfill.append({'rowID': rowID, 'parsed': parsed})
+
+    if unparseable:
+        raise RuntimeError(f"Cannot parse expiry_date for food_inventory ids {unparseable}; fix them and rerun")
+
+    if backfill:
+        conn.execute(
+            foodInventory.update()
+            .where(foodInventory.c.id == sa.bindparam('rowID'))
+            .values(expiry_date_typed=sa.bindparam('parsed')),
+            backfill
+        )
+
+    with op.batch_alter_table('food_inventory') as batch_op:
+        batch_op.drop_column('expiry_date')
+        batch_op.alter_column('expiry_date_typed',
+               new_column_name='expiry_date',
+               existing_type=sa.Date(),
+               nullable=False)
+
+    op.create_index(op.f('ix_food_inventory_expiry_date'), 'food_inventory', ['expiry_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_food_inventory_expiry_date'), table_name='food_inventory')
+    # DATE values are stored as ISO text, so the batch copy back to VARCHAR keeps them intact
+    with op.batch_alter_table('food_inventory') as batch_op:
+        batch_op.alter_column('expiry_date',
+               existing_type=sa.Date(),
+               type_=sa.String(),
+               existing_nullable=False)
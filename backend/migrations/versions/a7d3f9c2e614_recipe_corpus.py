@@ -0,0 +1,30 @@
+"""recipe corpus for use-it-first suggestions
+
+Revision ID: a7d3f9c2e614
+Revises: c4e8a1f6b2d9
+Create Date: 2026-10-18 18:42:37.905114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3f9c2e614'
+down_revision = 'c4e8a1f6b2d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recipe',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('ingredients', sa.Text(), nullable=False),
+    sa.Column('source', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('recipe')
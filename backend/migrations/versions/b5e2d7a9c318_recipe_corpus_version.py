@@ -0,0 +1,29 @@
+"""recipe corpus version bumped by every import
+
+Revision ID: b5e2d7a9c318
+Revises: f3a8d2b6c410
+Create Date: 2026-10-18 22:16:48.203611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2d7a9c318'
+down_revision = 'f3a8d2b6c410'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    recipeCorpusVersion = op.create_table('recipe_corpus_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(recipeCorpusVersion, [{"id": 1, "version": 0}])
+
+
+def downgrade():
+    op.drop_table('recipe_corpus_version')
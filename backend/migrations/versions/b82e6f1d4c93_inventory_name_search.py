@@ -0,0 +1,44 @@
+"""inventory name search
+
+Revision ID: b82e6f1d4c93
+Revises: f19b3d4c7a05
+Create Date: 2026-10-18 13:04:27.518302
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b82e6f1d4c93'
+down_revision = 'f19b3d4c7a05'
+branch_labels = None
+depends_on = None
+
+TRIGGERS = ('food_inventory_fts_insert', 'food_inventory_fts_delete', 'food_inventory_fts_update')
+
+
+def upgrade():
+    # FTS5 is SQLite only; other databases keep searching with LIKE
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("CREATE VIRTUAL TABLE food_inventory_fts USING fts5("
+               "name, content='food_inventory', content_rowid='id', tokenize='trigram')")
+    op.execute("CREATE TRIGGER food_inventory_fts_insert AFTER INSERT ON food_inventory BEGIN "
+               "INSERT INTO food_inventory_fts(rowid, name) VALUES (new.id, new.name); END")
+    op.execute("CREATE TRIGGER food_inventory_fts_delete AFTER DELETE ON food_inventory BEGIN "
+               "INSERT INTO food_inventory_fts(food_inventory_fts, rowid, name) VALUES ('delete', old.id, old.name); END")
+    op.execute("CREATE TRIGGER food_inventory_fts_update AFTER UPDATE OF name ON food_inventory BEGIN "
+               "INSERT INTO food_inventory_fts(food_inventory_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+               "INSERT INTO food_inventory_fts(rowid, name) VALUES (new.id, new.name); END")
+    # Index the names of the rows that already exist
+    op.execute("INSERT INTO food_inventory_fts(food_inventory_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for trigger in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS food_inventory_fts")
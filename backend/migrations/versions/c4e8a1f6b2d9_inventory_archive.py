@@ -0,0 +1,38 @@
+"""archive table for swept expired items
+
+Revision ID: c4e8a1f6b2d9
+Revises: d6a1c8e5f207
+Create Date: 2026-10-18 16:05:12.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1f6b2d9'
+down_revision = 'd6a1c8e5f207'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('food_inventory_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expiry_date', sa.Date(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_food_inventory_archive_item_id', 'food_inventory_archive', ['item_id'], unique=False)
+    op.create_index('ix_food_inventory_archive_user_id', 'food_inventory_archive', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_food_inventory_archive_user_id', table_name='food_inventory_archive')
+    op.drop_index('ix_food_inventory_archive_item_id', table_name='food_inventory_archive')
+    op.drop_table('food_inventory_archive')
@@ -0,0 +1,39 @@
+"""inventory owner and per-user indexes
+
+Revision ID: c58d0f7e91a2
+Revises: a3c91e5d2b47
+Create Date: 2026-10-18 11:03:27.640912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c58d0f7e91a2'
+down_revision = 'a3c91e5d2b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows stay unowned (NULL); the API only returns rows that belong to the requesting user
+    with op.batch_alter_table('food_inventory') as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_food_inventory_user_id_user', 'user', ['user_id'], ['id'])
+
+    op.create_index(op.f('ix_food_inventory_user_id'), 'food_inventory', ['user_id'], unique=False)
+    op.create_index('ix_food_inventory_user_expiry', 'food_inventory', ['user_id', 'expiry_date'], unique=False)
+    op.create_index('ix_food_inventory_user_name', 'food_inventory', ['user_id', 'name'], unique=False)
+    op.create_index('ix_food_inventory_user_quantity', 'food_inventory', ['user_id', 'quantity'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_food_inventory_user_quantity', table_name='food_inventory')
+    op.drop_index('ix_food_inventory_user_name', table_name='food_inventory')
+    op.drop_index('ix_food_inventory_user_expiry', table_name='food_inventory')
+    op.drop_index(op.f('ix_food_inventory_user_id'), table_name='food_inventory')
+
+    with op.batch_alter_table('food_inventory') as batch_op:
+        batch_op.drop_constraint('fk_food_inventory_user_id_user', type_='foreignkey')
+        batch_op.drop_column('user_id')
@@ -0,0 +1,63 @@
+"""index the owner of each item in the name search
+
+Revision ID: c7f1e4a8d295
+Revises: b5e2d7a9c318
+Create Date: 2026-10-18 22:41:09.731254
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f1e4a8d295'
+down_revision = 'b5e2d7a9c318'
+branch_labels = None
+depends_on = None
+
+TRIGGERS = ('food_inventory_fts_insert', 'food_inventory_fts_delete', 'food_inventory_fts_update')
+
+
+def dropSearchIndex():
+    for trigger in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS food_inventory_fts")
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    dropSearchIndex()
+    op.execute("CREATE VIEW food_inventory_fts_source AS "
+               "SELECT id, name, '#' || user_id || '#' AS owner FROM food_inventory")
+    op.execute("CREATE VIRTUAL TABLE food_inventory_fts USING fts5("
+               "name, owner, content='food_inventory_fts_source', content_rowid='id', tokenize='trigram')")
+    op.execute("CREATE TRIGGER food_inventory_fts_insert AFTER INSERT ON food_inventory BEGIN "
+               "INSERT INTO food_inventory_fts(rowid, name, owner) VALUES (new.id, new.name, '#' || new.user_id || '#'); END")
+    op.execute("CREATE TRIGGER food_inventory_fts_delete AFTER DELETE ON food_inventory BEGIN "
+               "INSERT INTO food_inventory_fts(food_inventory_fts, rowid, name, owner) "
+               "VALUES ('delete', old.id, old.name, '#' || old.user_id || '#'); END")
+    op.execute("CREATE TRIGGER food_inventory_fts_update AFTER UPDATE OF name, user_id ON food_inventory BEGIN "
+               "INSERT INTO food_inventory_fts(food_inventory_fts, rowid, name, owner) "
+               "VALUES ('delete', old.id, old.name, '#' || old.user_id || '#'); "
+               "INSERT INTO food_inventory_fts(rowid, name, owner) VALUES (new.id, new.name, '#' || new.user_id || '#'); END")
+    # Index the names and owners of the rows that already exist
+    op.execute("INSERT INTO food_inventory_fts(food_inventory_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    dropSearchIndex()
+    op.execute("DROP VIEW IF EXISTS food_inventory_fts_source")
+    op.execute("CREATE VIRTUAL TABLE food_inventory_fts USING fts5("
+               "name, content='food_inventory', content_rowid='id', tokenize='trigram')")
+    op.execute("CREATE TRIGGER food_inventory_fts_insert AFTER INSERT ON food_inventory BEGIN "
+               "INSERT INTO food_inventory_fts(rowid, name) VALUES (new.id, new.name); END")
+    op.execute("CREATE TRIGGER food_inventory_fts_delete AFTER DELETE ON food_inventory BEGIN "
+               "INSERT INTO food_inventory_fts(food_inventory_fts, rowid, name) VALUES ('delete', old.id, old.name); END")
+    op.execute("CREATE TRIGGER food_inventory_fts_update AFTER UPDATE OF name ON food_inventory BEGIN "
+               "INSERT INTO food_inventory_fts(food_inventory_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+               "INSERT INTO food_inventory_fts(rowid, name) VALUES (new.id, new.name); END")
+    op.execute("INSERT INTO food_inventory_fts(food_inventory_fts) VALUES ('rebuild')")
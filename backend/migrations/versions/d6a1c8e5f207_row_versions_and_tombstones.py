@@ -0,0 +1,51 @@
+"""row versions and tombstones for delta sync
+
+Revision ID: d6a1c8e5f207
+Revises: b82e6f1d4c93
+Create Date: 2026-10-18 13:52:40.771936
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6a1c8e5f207'
+down_revision = 'b82e6f1d4c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ADD COLUMN rather than a batch rebuild, which would drop the search index triggers
+    op.add_column('food_inventory', sa.Column('row_version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('food_inventory', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_food_inventory_user_version', 'food_inventory', ['user_id', 'row_version'], unique=False)
+
+    op.create_table('inventory_tombstone',
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('row_version', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('item_id')
+    )
+    op.create_index('ix_inventory_tombstone_user_version', 'inventory_tombstone', ['user_id', 'row_version'], unique=False)
+
+    # Existing owned rows join their owner's current version, so a first sync from 0 includes them
+    op.execute(sa.text(
+        "INSERT INTO inventory_version (user_id, version, updated_at) "
+        "SELECT DISTINCT user_id, 1, :now FROM food_inventory WHERE user_id IS NOT NULL "
+        "AND user_id NOT IN (SELECT user_id FROM inventory_version)"
+    ).bindparams(now=datetime.utcnow()))
+    op.execute("UPDATE food_inventory SET row_version = (SELECT version FROM inventory_version "
+               "WHERE inventory_version.user_id = food_inventory.user_id) WHERE user_id IS NOT NULL")
+
+
+def downgrade():
+    op.drop_index('ix_inventory_tombstone_user_version', table_name='inventory_tombstone')
+    op.drop_table('inventory_tombstone')
+    op.drop_index('ix_food_inventory_user_version', table_name='food_inventory')
+    op.drop_column('food_inventory', 'updated_at')
+    op.drop_column('food_inventory', 'row_version')
@@ -0,0 +1,30 @@
+"""inventory version counter
+
+Revision ID: e4b7a2c6d813
+Revises: c58d0f7e91a2
+Create Date: 2026-10-18 11:48:09.318554
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7a2c6d813'
+down_revision = 'c58d0f7e91a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inventory_version',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('inventory_version')
@@ -0,0 +1,47 @@
+"""append-only log of inventory quantity changes
+
+Revision ID: e9b4c1d7a352
+Revises: a7d3f9c2e614
+Create Date: 2026-10-18 20:16:54.204718
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9b4c1d7a352'
+down_revision = 'a7d3f9c2e614'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inventory_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_inventory_event_item', 'inventory_event', ['item_id', 'id'], unique=False)
+    op.create_index('ix_inventory_event_user_created', 'inventory_event', ['user_id', 'created_at'], unique=False)
+
+    # A baseline event per owned item, so the first change logged afterwards gets the right delta
+    op.execute(sa.text(
+        "INSERT INTO inventory_event (item_id, user_id, name, action, quantity, delta, created_at) "
+        "SELECT id, user_id, name, 'baseline', quantity, 0, :now FROM food_inventory "
+        "WHERE user_id IS NOT NULL AND quantity != 0"
+    ).bindparams(sa.bindparam("now", datetime.utcnow(), type_=sa.DateTime())))
+
+
+def downgrade():
+    op.drop_index('ix_inventory_event_user_created', table_name='inventory_event')
+    op.drop_index('ix_inventory_event_item', table_name='inventory_event')
+    op.drop_table('inventory_event')
@@ -0,0 +1,29 @@
+"""product catalog
+
+Revision ID: f19b3d4c7a05
+Revises: e4b7a2c6d813
+Create Date: 2026-10-18 12:36:52.115843
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19b3d4c7a05'
+down_revision = 'e4b7a2c6d813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product',
+    sa.Column('upc', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('shelf_life_days', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('upc')
+    )
+
+
+def downgrade():
+    op.drop_table('product')
@@ -0,0 +1,48 @@
+"""key inventory tombstones on item and owner
+
+Revision ID: f3a8d2b6c410
+Revises: e9b4c1d7a352
+Create Date: 2026-10-18 21:04:12.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8d2b6c410'
+down_revision = 'e9b4c1d7a352'
+branch_labels = None
+depends_on = None
+
+
+def rebuildTombstones(primaryKey, copySQL):
+    # SQLite cannot alter a primary key in place, so the small table is rebuilt and copied over
+    op.create_table('_inventory_tombstone_new',
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('row_version', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint(*primaryKey)
+    )
+    op.execute(copySQL)
+    op.drop_index('ix_inventory_tombstone_user_version', table_name='inventory_tombstone')
+    op.drop_table('inventory_tombstone')
+    op.rename_table('_inventory_tombstone_new', 'inventory_tombstone')
+    op.create_index('ix_inventory_tombstone_user_version', 'inventory_tombstone', ['user_id', 'row_version'], unique=False)
+
+
+def upgrade():
+    rebuildTombstones(['item_id', 'user_id'],
+                      "INSERT INTO _inventory_tombstone_new (item_id, user_id, row_version, deleted_at) "
+                      "SELECT item_id, user_id, row_version, deleted_at FROM inventory_tombstone")
+
+
+def downgrade():
+    # Only one tombstone per item fits the old key; the most recent delete is kept
+    rebuildTombstones(['item_id'],
+                      "INSERT INTO _inventory_tombstone_new (item_id, user_id, row_version, deleted_at) "
+                      "SELECT item_id, user_id, row_version, deleted_at FROM inventory_tombstone AS tombstone "
+                      "WHERE deleted_at = (SELECT MAX(deleted_at) FROM inventory_tombstone AS latest "
+                      "WHERE latest.item_id = tombstone.item_id) GROUP BY item_id")
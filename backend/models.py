@@ -1,17 +1,126 @@
 from exts import db
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from sqlalchemy import DDL, bindparam, case, delete, event, func, insert, text, update
+
+
+# Callbacks of the form listener(action, rows, versions), run after an inventory write commits.
+# action is "create", "update" or "delete", rows are dicts of the affected items' column values and versions
+# maps each owner to the inventory version the write committed as.
+inventoryListeners = []
+
+
+def onInventoryChange(listener):
+    """Registers a listener for committed inventory writes; usable as a decorator"""
+    inventoryListeners.append(listener)
+    return listener
+
+
+def commitInventoryChange(*changes):
+    """
+    Bumps the owners' inventory versions, commits the session and then notifies the inventory listeners.
+    Every FoodInventory write path funnels through here, so versions and listeners see single-row and bulk writes alike.
+    :param changes: Tuples of (action, rows) describing what the pending transaction does
+    :return: Nothing
+    """
+    try:
+        versions = InventoryVersion.bump({row["user_id"] for action, rows in changes for row in rows
+                                          if row["user_id"] is not None})
+        stampRowVersions(changes, versions)
+        recordQuantityEvents(changes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for action, rows in changes:
+        if rows:
+            for listener in inventoryListeners:
+                listener(action, rows, versions)
+
+
+def stampRowVersions(changes, versions):
+    """
+    Stamps written rows with their owner's new inventory version and leaves tombstones for deleted ones.
+    A version is only ever handed out once per user, so "rows with row_version > v" is exactly what changed since v.
+    """
+    now = datetime.utcnow()
+    writtenIDs, createdIDs, tombstones = {}, {}, []
+    for action, rows in changes:
+        for row in rows:
+            if row["user_id"] is None:
+                continue
+            if action == "delete":
+                tombstones.append({"item_id": row["id"], "user_id": row["user_id"],
+                                   "row_version": versions[row["user_id"]], "deleted_at": now})
+            else:
+                writtenIDs.setdefault(row["user_id"], []).append(row["id"])
+                if action == "create":
+                    createdIDs.setdefault(row["user_id"], []).append(row["id"])
+
+    for userID, ids in writtenIDs.items():
+        db.session.execute(update(FoodInventory).where(FoodInventory.id.in_(ids))
+                           .values(row_version=versions[userID], updated_at=now),
+                           execution_options={"synchronize_session": False})
+    for userID, ids in createdIDs.items():
+        # SQLite may reuse the id of a deleted last row, which must not be reported as deleted any more to the
+        # user now owning it; a tombstone left for another user stays, as their client still holds the old item
+        db.session.execute(delete(InventoryTombstone).where(InventoryTombstone.user_id == userID,
+                                                            InventoryTombstone.item_id.in_(ids)),
+                           execution_options={"synchronize_session": False})
+    if tombstones:
+        db.session.execute(insert(InventoryTombstone), tombstones)
+
+
+def recordQuantityEvents(changes):
+    """
+    Appends an InventoryEvent for every written row whose quantity moved, as one executemany INSERT ... SELECT.
+    Each row's delta is its new quantity (0 once deleted) less the quantity of the item's latest event, found on
+    the (item_id, id) index in the same statement, so the write paths need not read quantities before writing.
+    """
+    now = datetime.utcnow()
+    levels = [{"item_id": row["id"], "user_id": row["user_id"], "name": row["name"], "action": action,
+               "quantity": 0 if action == "delete" else row["quantity"], "created_at": now}
+              for action, rows in changes for row in rows if row["user_id"] is not None]
+    if not levels:
+        return
+
+    previous = (db.select(InventoryEvent.quantity).where(InventoryEvent.item_id == bindparam("item_id"))
+                .order_by(InventoryEvent.id.desc()).limit(1).scalar_subquery())
+    delta = bindparam("quantity", type_=db.Integer()) - func.coalesce(previous, 0)
+    values = db.select(bindparam("item_id", type_=db.Integer()), bindparam("user_id", type_=db.Integer()),
+                       bindparam("name", type_=db.String()), bindparam("action", type_=db.String()),
+                       bindparam("quantity", type_=db.Integer()), delta,
+                       bindparam("created_at", type_=db.DateTime())).where(delta != 0)
+    columns = ["item_id", "user_id", "name", "action", "quantity", "delta", "created_at"]
+    db.session.execute(insert(InventoryEvent.__table__).from_select(columns, values), levels)  # Core, not ORM bulk mode
 
 
 class FoodInventory(db.Model):
     id = db.Column(db.Integer(), primary_key=True)
     name = db.Column(db.String(), nullable=False)  # String preset 50
     quantity = db.Column(db.Integer(), nullable=False)
-    expiry_date = db.Column(db.String(), nullable=False)
-    # user_id = db.Column(db.Integer(), db.ForeignKey('user.id'), nullable=False)
+    expiry_date = db.Column(db.Date(), nullable=False, index=True)  # B-tree index for expiry range scans
+    # Nullable only for rows created before items had owners; the API never returns unowned rows
+    user_id = db.Column(db.Integer(), db.ForeignKey('user.id'), nullable=True, index=True)
+    # The owner's inventory version as of this row's last write, for delta sync
+    row_version = db.Column(db.Integer(), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(), nullable=True)
+
+    # Composite indexes so per-user queries seek straight to that user's rows
+    __table_args__ = (
+        db.Index('ix_food_inventory_user_expiry', 'user_id', 'expiry_date'),
+        db.Index('ix_food_inventory_user_name', 'user_id', 'name'),
+        db.Index('ix_food_inventory_user_quantity', 'user_id', 'quantity'),
+        db.Index('ix_food_inventory_user_version', 'user_id', 'row_version'),
+    )
 
     def __repr__(self):
         return f"<FoodInventory {self.id}: {self.name}>"
 
+    def toDict(self):
+        return {"id": self.id, "name": self.name, "quantity": self.quantity, "expiry_date": self.expiry_date,
+                "user_id": self.user_id}
+
     # Setter Methods
 
     def save(self):
@@ -22,7 +131,8 @@ class FoodInventory(db.Model):
         :return: The object that was just saved
         """
         db.session.add(self)
-        db.session.commit()
+        db.session.flush()  # Assigns the id so the listeners can be given the new row
+        commitInventoryChange(("create", [self.toDict()]))
     
     def delete(self):
         """
@@ -31,7 +141,7 @@ class FoodInventory(db.Model):
         :return: Nothing
         """
         db.session.delete(self)
-        db.session.commit()
+        commitInventoryChange(("delete", [self.toDict()]))
 
     def update(self, name, quantity, expiry_date):
         """
@@ -46,57 +156,454 @@ class FoodInventory(db.Model):
         self.quantity = quantity
         self.expiry_date = expiry_date
 
-        db.session.commit()
+        commitInventoryChange(("update", [self.toDict()]))
+
+    @classmethod
+    def applyBulk(cls, creates, updates, deleteIds):
+        """
+        Applies a batch of writes in a single transaction with one commit.
+        Updates are sent as one executemany UPDATE keyed on the primary key and deletes as one DELETE ... WHERE id IN.
+        :param creates: List of dicts with name, quantity, expiry_date and user_id
+        :param updates: List of dicts with id and the columns to change
+        :param deleteIds: List of ids to delete
+        :return: The ids of the newly created items, in the order of creates
+        """
+        newItems = [cls(**values) for values in creates]
+        try:
+            db.session.add_all(newItems)
+            db.session.flush()  # Batched INSERT that also assigns the new primary keys
+            created = [item.toDict() for item in newItems]
+            updated, deleted = [], []
+            if updates:
+                db.session.execute(update(cls), updates)
+                updated = cls.snapshot([values["id"] for values in updates])
+            if deleteIds:
+                deleted = cls.snapshot(deleteIds)
+                db.session.execute(delete(cls).where(cls.id.in_(deleteIds)),
+                                   execution_options={"synchronize_session": False})
+        except Exception:
+            db.session.rollback()
+            raise
+
+        commitInventoryChange(("create", created), ("update", updated), ("delete", deleted))
+        return [row["id"] for row in created]
+
+    @classmethod
+    def applyDeltas(cls, deltas, userID=None, removeEmpty=False):
+        """
+        Adds signed deltas to item quantities in a single UPDATE ... RETURNING, clamping at zero.
+        The arithmetic runs in the database, so concurrent deltas to the same item all count and no row is read first.
+        :param deltas: Dict of item id to the amount to add (negative to use some up)
+        :param userID: Owner the items must belong to, or None for any item
+        :param removeEmpty: Whether items left at zero are deleted in the same transaction
+        :return: A tuple of (updated, deleted) lists of row dicts; ids that did not match are in neither
+        """
+        if not deltas:
+            return [], []
+        newQuantity = cls.quantity + case(deltas, value=cls.id)
+        statement = (update(cls)
+                     .where(cls.id.in_(list(deltas)), *cls.ownedBy(userID))
+                     .values(quantity=case((newQuantity < 0, 0), else_=newQuantity))
+                     .returning(cls.id, cls.name, cls.quantity, cls.expiry_date, cls.user_id))
+        try:
+            updated = [row._asdict() for row in
+                       db.session.execute(statement, execution_options={"synchronize_session": False})]
+            deleted = [row for row in updated if row["quantity"] == 0] if removeEmpty else []
+            if deleted:
+                db.session.execute(delete(cls).where(cls.id.in_([row["id"] for row in deleted]), cls.quantity == 0),
+                                   execution_options={"synchronize_session": False})
+                updated = [row for row in updated if row["quantity"] != 0]
+        except Exception:
+            db.session.rollback()
+            raise
+
+        commitInventoryChange(("update", updated), ("delete", deleted))
+        return updated, deleted
+
+    @classmethod
+    def snapshot(cls, ids):
+        """Returns the current column values of the given items as dicts, in a single IN query"""
+        rows = db.session.execute(
+            db.select(cls.id, cls.name, cls.quantity, cls.expiry_date, cls.user_id).where(cls.id.in_(ids)))
+        return [row._asdict() for row in rows]
+
+    @classmethod
+    def existingIds(cls, ids, userID=None):
+        """Returns the subset of ids that exist (and belong to userID, if given), in a single IN query"""
+        if not ids:
+            return set()
+        rows = db.session.execute(db.select(cls.id).where(cls.id.in_(ids), *cls.ownedBy(userID)))
+        return {row.id for row in rows}
 
-    def addItem(self, name, quantity, expiry_date=None):
+    @classmethod
+    def ownedBy(cls, userID):
+        """Returns the filter criteria limiting a query to userID's rows, or none when userID is None"""
+        return [cls.user_id == userID] if userID is not None else []
+
+    @classmethod
+    def scoped(cls, userID=None):
+        return cls.query.filter(*cls.ownedBy(userID))
+
+    def addItem(self, name, quantity, expiry_date=None, userID=None):
         item = FoodInventory(name=name, quantity=quantity,
-                             expiryDate=expiry_date)
-        db.session.add(item)
-        db.session.commit()
+                             expiry_date=expiry_date, user_id=userID)
+        item.save()
 
-    def removeItem(self, name):
-        item = FoodInventory.query.filter_by(name=name).first()
-        db.session.delete(item)
-        db.session.commit()
+    def removeItem(self, name, userID=None):
+        item = FoodInventory.scoped(userID).filter_by(name=name).first()
+        item.delete()
 
-    def updateItemQuantity(self, name, quantity):
-        item = FoodInventory.query.filter_by(name=name).first()
-        item.quantity = quantity
-        db.session.commit()
+    def updateItemQuantity(self, name, quantity, userID=None):
+        # One UPDATE ... RETURNING on the first matching row instead of loading it and writing it back
+        target = db.select(FoodInventory.id).where(
+            FoodInventory.name == name, *FoodInventory.ownedBy(userID)).limit(1).scalar_subquery()
+        rows = db.session.execute(
+            update(FoodInventory).where(FoodInventory.id == target).values(quantity=quantity)
+            .returning(FoodInventory.id, FoodInventory.name, FoodInventory.quantity, FoodInventory.expiry_date,
+                       FoodInventory.user_id),
+            execution_options={"synchronize_session": False})
+        commitInventoryChange(("update", [row._asdict() for row in rows]))
 
-    def updateItemExpiryDate(self, name, expiryDate):
-        item = FoodInventory.query.filter_by(name=name).first()
-        item.expiryDate = expiryDate
-        db.session.commit()
+    def updateItemExpiryDate(self, name, expiryDate, userID=None):
+        item = FoodInventory.scoped(userID).filter_by(name=name).first()
+        item.update(item.name, item.quantity, expiryDate)
 
     # Getter Methods
 
-    def getItem(self, name):
-        item = FoodInventory.query.filter_by(name=name).first()  # ?
+    def getItem(self, name, userID=None):
+        item = FoodInventory.scoped(userID).filter_by(name=name).first()  # ?
         return item
 
-    def getAllItems(self):
-        allItems = FoodInventory.query.all()
+    def getAllItems(self, userID=None):
+        allItems = FoodInventory.scoped(userID).all()
         return allItems
 
-    def getLowQuantityItems(self, lowThreshold):
-        items = FoodInventory.query.filter(
-            FoodInventory.quantity <= lowThreshold).all()
+    @classmethod
+    def getLowQuantityItems(cls, lowThreshold, userID=None):
+        items = cls.scoped(userID).filter(
+            cls.quantity <= lowThreshold).order_by(cls.quantity).all()
         return items
 
-    def getExpriredItems(self):
-        now = datetime.utcnow()
-        items = FoodInventory.query.filter(
-            FoodInventory.expiry_date < now).all()
+    @classmethod
+    def getExpriredItems(cls, userID=None):
+        today = date.today()
+        items = cls.scoped(userID).filter(
+            cls.expiry_date < today).order_by(cls.expiry_date).all()
         return items
 
-    def getCloseExpiryItems(self, days):
-        now = datetime.utcnow()
-        thresholdDate = now + timedelta(days=days)
-        items = FoodInventory.query.filter(FoodInventory.expiry_date >= now,
-                                           FoodInventory.expiry_date <= thresholdDate).all()
+    @classmethod
+    def getPage(cls, userID=None, cursor=None, limit=50, name=None, minQuantity=None, maxQuantity=None,
+                expiresAfter=None, expiresBefore=None, columns=None):
+        """
+        Returns one page of items ordered by id using keyset pagination.
+        Seeks past the cursor on the primary key index instead of using OFFSET, so deep pages cost the same as the first one.
+        :param userID: Owner whose items are listed, or None for every item
+        :param cursor: Id of the last item of the previous page, or None for the first page
+        :param limit: Maximum number of items in the page
+        :param columns: Columns to select, including id, to get tuples instead of FoodInventory objects
+        :return: A tuple of (items, nextCursor) where nextCursor is None on the last page
+        """
+        query = cls.scoped(userID)
+        if columns:
+            query = query.with_entities(*columns)
+        if cursor is not None:
+            query = query.filter(cls.id > cursor)
+        if name:
+            query = query.filter(cls.name.icontains(name, autoescape=True))
+        if minQuantity is not None:
+            query = query.filter(cls.quantity >= minQuantity)
+        if maxQuantity is not None:
+            query = query.filter(cls.quantity <= maxQuantity)
+        if expiresAfter is not None:
+            query = query.filter(cls.expiry_date >= expiresAfter)
+        if expiresBefore is not None:
+            query = query.filter(cls.expiry_date <= expiresBefore)
+
+        # Fetch one extra row to learn whether another page exists without a COUNT query
+        items = query.order_by(cls.id).limit(limit + 1).all()
+        if len(items) > limit:
+            items = items[:limit]
+            return items, items[-1].id
+        return items, None
+
+    @classmethod
+    def changedSince(cls, userID, since, columns=None, tombstoneColumns=None):
+        """
+        Returns what changed in userID's inventory after version since, seeking on the (user_id, row_version) indexes.
+        :param columns: Columns to select to get item tuples instead of FoodInventory objects
+        :param tombstoneColumns: Likewise for the tombstones
+        :return: A tuple of (items, tombstones), each ordered by row_version
+        """
+        itemQuery = cls.query.with_entities(*columns) if columns else cls.query
+        tombstoneQuery = InventoryTombstone.query.with_entities(*tombstoneColumns) if tombstoneColumns \
+            else InventoryTombstone.query
+        items = itemQuery.filter(cls.user_id == userID, cls.row_version > since).order_by(cls.row_version).all()
+        tombstones = tombstoneQuery.filter(
+            InventoryTombstone.user_id == userID, InventoryTombstone.row_version > since
+        ).order_by(InventoryTombstone.row_version).all()
+        return items, tombstones
+
+    @classmethod
+    def getCloseExpiryItems(cls, days, userID=None):
+        today = date.today()
+        thresholdDate = today + timedelta(days=days)
+        items = cls.scoped(userID).filter(cls.expiry_date >= today,
+                                 cls.expiry_date <= thresholdDate).order_by(cls.expiry_date).all()
         return items
 
+    @classmethod
+    def search(cls, query, userID=None, limit=20):
+        """
+        Returns the items whose names best match query, as dicts with a relevance score, best first.
+        On SQLite the candidates come from the food_inventory_fts trigram index: every trigram of the query is
+        OR-ed, so prefixes, substrings and names with a typo or two all match, and bm25 ranks them among the
+        user's own rows. The candidates are then re-ranked by the share of the query's trigrams they contain.
+        Queries shorter than a trigram, and other databases, fall back to a LIKE scan of the user's rows.
+        :param query: Free text typed by the user
+        :param userID: Owner whose items are searched, or None for every item
+        :param limit: Maximum number of results
+        :return: A list of dicts with id, name, quantity, expiry_date, user_id and score
+        """
+        needle = " ".join(query.lower().split())
+        queryTrigrams = trigrams(needle)
+        if not queryTrigrams or db.session.get_bind().dialect.name != "sqlite":
+            items = cls.scoped(userID).filter(cls.name.icontains(needle, autoescape=True)).order_by(cls.name).limit(limit).all()
+            return [{**item.toDict(), "score": 1.0} for item in items]
+
+        # The owner's token is matched inside the FTS query, so bm25 ranks and LIMIT cuts the user's rows only
+        terms = " OR ".join('"{}"'.format(trigram.replace('"', '""')) for trigram in sorted(queryTrigrams))
+        match = f"name : ({terms})"
+        if userID is not None:
+            match = f'owner : "{ownerToken(userID)}" AND {match}'
+        rows = db.session.execute(text(
+            "SELECT food_inventory.id, food_inventory.name, food_inventory.quantity, food_inventory.expiry_date, "
+            "food_inventory.user_id FROM food_inventory_fts "
+            "JOIN food_inventory ON food_inventory.id = food_inventory_fts.rowid "
+            "WHERE food_inventory_fts MATCH :match "
+            "ORDER BY bm25(food_inventory_fts, 1.0, 0.0) LIMIT :candidates"
+        ).columns(expiry_date=db.Date()), {"match": match, "candidates": limit * SEARCH_CANDIDATE_FACTOR})
+
+        results = []
+        for row in rows:
+            name = row.name.lower()
+            score = len(queryTrigrams & trigrams(name)) / len(queryTrigrams)
+            if needle in name:
+                score += 1.0  # Exact substrings, and prefixes above them, outrank fuzzy matches
+                score += 0.5 if name.startswith(needle) else 0.0
+            if score >= SEARCH_MIN_SIMILARITY:
+                results.append({**row._asdict(), "score": round(score, 3)})
+
+        results.sort(key=lambda result: (-result["score"], result["name"]))
+        return results[:limit]
+
+# Full-text search over item names. An external content FTS5 table with the trigram tokenizer indexes
+# FoodInventory.name and triggers keep it in step with every insert, delete and rename. Each row also indexes
+# an owner token, '#<user_id>#', so a search filters on its user inside the MATCH rather than after it; the
+# delimiters keep '#1#' from matching inside '#12#'. The content comes through a view that builds the token.
+SEARCH_CANDIDATE_FACTOR = 5  # FTS candidates fetched per requested result before re-ranking
+SEARCH_MIN_SIMILARITY = 0.4  # Share of the query's trigrams a fuzzy match must contain
+
+FTS_DDL = [
+    "CREATE VIEW IF NOT EXISTS food_inventory_fts_source AS "
+    "SELECT id, name, '#' || user_id || '#' AS owner FROM food_inventory",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS food_inventory_fts USING fts5("
+    "name, owner, content='food_inventory_fts_source', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS food_inventory_fts_insert AFTER INSERT ON food_inventory BEGIN "
+    "INSERT INTO food_inventory_fts(rowid, name, owner) VALUES (new.id, new.name, '#' || new.user_id || '#'); END",
+    "CREATE TRIGGER IF NOT EXISTS food_inventory_fts_delete AFTER DELETE ON food_inventory BEGIN "
+    "INSERT INTO food_inventory_fts(food_inventory_fts, rowid, name, owner) "
+    "VALUES ('delete', old.id, old.name, '#' || old.user_id || '#'); END",
+    "CREATE TRIGGER IF NOT EXISTS food_inventory_fts_update AFTER UPDATE OF name, user_id ON food_inventory BEGIN "
+    "INSERT INTO food_inventory_fts(food_inventory_fts, rowid, name, owner) "
+    "VALUES ('delete', old.id, old.name, '#' || old.user_id || '#'); "
+    "INSERT INTO food_inventory_fts(rowid, name, owner) VALUES (new.id, new.name, '#' || new.user_id || '#'); END",
+]
+
+for statement in FTS_DDL:
+    event.listen(FoodInventory.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in ("DROP TABLE IF EXISTS food_inventory_fts", "DROP VIEW IF EXISTS food_inventory_fts_source"):
+    event.listen(FoodInventory.__table__, "before_drop", DDL(statement).execute_if(dialect="sqlite"))
+
+
+def ownerToken(userID):
+    """Returns the token food_inventory_fts indexes for userID's rows"""
+    return f"#{userID}#"
+
+
+def trigrams(value):
+    """Returns the set of three character substrings of value, as the trigram tokenizer indexes them"""
+    return {value[index:index + 3] for index in range(len(value) - 2)}
+
+
+class InventoryVersion(db.Model):
+    """Per-user counter bumped in the same transaction as every write to that user's inventory"""
+    user_id = db.Column(db.Integer(), db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer(), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(), nullable=False)
+
+    def __repr__(self):
+        return f"<InventoryVersion {self.user_id}: {self.version}>"
+
+    @classmethod
+    def bump(cls, userIDs):
+        """Increments each user's version and returns a dict of user id to their new version"""
+        if not userIDs:
+            return {}
+        now = datetime.utcnow()
+        # One UPDATE ... RETURNING for every user, so a write spanning many owners stays a short transaction
+        versions = dict(db.session.execute(
+            update(cls).where(cls.user_id.in_(list(userIDs))).values(version=cls.version + 1, updated_at=now)
+            .returning(cls.user_id, cls.version),
+            execution_options={"synchronize_session": False}).all())
+        for userID in userIDs:
+            if userID not in versions:
+                versions[userID] = 1
+                db.session.add(cls(user_id=userID, version=1, updated_at=now))
+        return versions
+
+    @classmethod
+    def current(cls, userID):
+        """Returns (version, updated_at) for userID with a single primary key lookup; (0, None) before any write"""
+        row = db.session.execute(
+            db.select(cls.version, cls.updated_at).where(cls.user_id == userID)).first()
+        return (row.version, row.updated_at) if row else (0, None)
+
+class InventoryTombstone(db.Model):
+    """
+    Left behind by a deleted item so clients syncing from an older version learn to drop it. Keyed on the owner
+    too, since SQLite may give the id to another user's item while this one's clients still hold the old one.
+    """
+    item_id = db.Column(db.Integer(), primary_key=True)
+    user_id = db.Column(db.Integer(), db.ForeignKey('user.id'), primary_key=True)
+    row_version = db.Column(db.Integer(), nullable=False)  # The owner's inventory version that deleted the item
+    deleted_at = db.Column(db.DateTime(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_inventory_tombstone_user_version', 'user_id', 'row_version'),
+    )
+
+    def __repr__(self):
+        return f"<InventoryTombstone {self.item_id}: {self.row_version}>"
+
+
+class InventoryEvent(db.Model):
+    """
+    Append-only log of quantity changes: a negative delta is consumption, a positive one a restock.
+    Written by commitInventoryChange for every write that moves a quantity; a deleted item logs its remaining
+    quantity as consumed.
+    """
+    __tablename__ = "inventory_event"
+
+    id = db.Column(db.Integer(), primary_key=True)
+    item_id = db.Column(db.Integer(), nullable=False)
+    user_id = db.Column(db.Integer(), db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(), nullable=False)  # The item's name at the time, kept after it is deleted
+    # The write: "create", "update" or "delete", or "baseline" for items that existed when the table was added.
+    # Creates mark where an item's history starts, since SQLite may give a deleted item's id to a new one.
+    action = db.Column(db.String(), nullable=False)
+    quantity = db.Column(db.Integer(), nullable=False)  # After the change
+    delta = db.Column(db.Integer(), nullable=False)  # 0 only for baselines
+    created_at = db.Column(db.DateTime(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_inventory_event_item', 'item_id', 'id'),  # The latest event of an item, when logging the next
+        db.Index('ix_inventory_event_user_created', 'user_id', 'created_at'),  # A user's recent history
+    )
+
+    def __repr__(self):
+        return f"<InventoryEvent {self.item_id}: {self.delta:+d}>"
+
+
+class FoodInventoryArchive(db.Model):
+    """An item moved out of food_inventory by the expiry sweeper, long enough after its expiry date"""
+    __tablename__ = "food_inventory_archive"
+
+    # Its own key, since SQLite may hand a swept item's id to a new item that is later swept too
+    id = db.Column(db.Integer(), primary_key=True)
+    item_id = db.Column(db.Integer(), nullable=False, index=True)
+    name = db.Column(db.String(), nullable=False)
+    quantity = db.Column(db.Integer(), nullable=False)
+    expiry_date = db.Column(db.Date(), nullable=False)
+    user_id = db.Column(db.Integer(), db.ForeignKey('user.id'), nullable=True, index=True)
+    archived_at = db.Column(db.DateTime(), nullable=False)
+
+    def __repr__(self):
+        return f"<FoodInventoryArchive {self.item_id}: {self.name}>"
+
+    @classmethod
+    def archiveExpired(cls, cutoff, limit):
+        """
+        Moves up to limit items that expired before cutoff into the archive, in one short transaction.
+        The oldest are picked on the expiry_date index and deleted with DELETE ... RETURNING, so an item written
+        meanwhile is only moved if it still qualifies; the returned rows are then inserted here.
+        :return: The moved rows as dicts
+        """
+        expired = (db.select(FoodInventory.id).where(FoodInventory.expiry_date < cutoff)
+                   .order_by(FoodInventory.expiry_date, FoodInventory.id).limit(limit))
+        statement = (delete(FoodInventory)
+                     .where(FoodInventory.id.in_(expired.scalar_subquery()), FoodInventory.expiry_date < cutoff)
+                     .returning(FoodInventory.id, FoodInventory.name, FoodInventory.quantity,
+                                FoodInventory.expiry_date, FoodInventory.user_id))
+        now = datetime.utcnow()
+        try:
+            moved = [row._asdict() for row in
+                     db.session.execute(statement, execution_options={"synchronize_session": False})]
+            if moved:
+                db.session.execute(insert(cls), [{"item_id": row["id"], "name": row["name"], "quantity": row["quantity"],
+                                                  "expiry_date": row["expiry_date"], "user_id": row["user_id"],
+                                                  "archived_at": now} for row in moved])
+        except Exception:
+            db.session.rollback()
+            raise
+
+        commitInventoryChange(("delete", moved))
+        return moved
+
+# Recipe Corpus Model
+class Recipe(db.Model):
+    id = db.Column(db.Integer(), primary_key=True)
+    name = db.Column(db.String(), nullable=False)
+    ingredients = db.Column(db.Text(), nullable=False)  # Ingredient names, one per line
+    source = db.Column(db.String(), nullable=True)  # Where the recipe came from, e.g. a URL
+
+    def __repr__(self):
+        return f"<Recipe {self.id}: {self.name}>"
+
+class RecipeCorpusVersion(db.Model):
+    """
+    Single-row counter bumped in the same transaction as every change to the recipe table. A replaced corpus of
+    the same size gets the same ids back from SQLite, so workers compare this rather than the table's shape.
+    """
+    id = db.Column(db.Integer(), primary_key=True)  # Always 1
+    version = db.Column(db.Integer(), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<RecipeCorpusVersion {self.version}>"
+
+    @classmethod
+    def bump(cls):
+        updated = db.session.execute(update(cls).where(cls.id == 1).values(version=cls.version + 1),
+                                     execution_options={"synchronize_session": False}).rowcount
+        if not updated:
+            db.session.add(cls(id=1, version=1))
+
+    @classmethod
+    def current(cls):
+        """Returns the corpus version with a single primary key lookup; 0 before any import"""
+        return db.session.execute(db.select(cls.version).where(cls.id == 1)).scalar() or 0
+
+# Product Catalog Model
+class Product(db.Model):
+    upc = db.Column(db.String(), primary_key=True)  # Digits only, as decoded by the scanner
+    name = db.Column(db.String(), nullable=False)
+    shelf_life_days = db.Column(db.Integer(), nullable=True)  # Default days until expiry for a new item
+
+    def __repr__(self):
+        return f"<Product {self.upc}: {self.name}>"
+
+    def toDict(self):
+        return {"upc": self.upc, "name": self.name, "shelf_life_days": self.shelf_life_days}
+
 # User Model
 class User(db.Model):
     id=db.Column(db.Integer(), primary_key=True) #unique=True ?
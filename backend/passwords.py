@@ -0,0 +1,70 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords inline, or in a bounded process pool when `workers` is set.
+
+    werkzeug hashes with hashlib.pbkdf2_hmac, which releases the GIL, so inline hashes on a threaded server
+    already run in parallel with each other and with other requests. The pool is opt-in: it caps how many
+    hashes run at once, so a burst of logins cannot take every core, at the cost of a round trip to another
+    process per hash. On a single core that makes logins slower than hashing inline.
+    """
+
+    def __init__(self, method, workers=0):
+        self.method = method
+        self.storedMethod = normalizeMethod(method)
+        self.workers = workers
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        with self.lock:
+            if self.pool is None:
+                # Spawned rather than forked children, since forking a threaded server process is unsafe
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+                atexit.register(self.shutdown)  # Unregistered by shutdown, so a stopped app is not kept alive
+        return self.pool.submit(function, *args).result()
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method)
+
+    def verify(self, passwordHash, password):
+        return self.run(check_password_hash, passwordHash, password)
+
+    def needsRehash(self, passwordHash):
+        """Whether a stored hash was made with a different method or cost than the configured one"""
+        return passwordHash.split("$", 1)[0] != self.storedMethod
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+                atexit.unregister(self.shutdown)
+
+
+def normalizeMethod(method):
+    """Returns method as werkzeug records it at the start of a hash, with the default PBKDF2 cost filled in"""
+    if method.startswith("pbkdf2:") and len(method.split(":")) == 2:
+        return f"{method}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+
+def initPasswordHasher(app):
+    app.extensions['passwordHasher'] = PasswordHasher(
+        app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'),
+        app.config.get('PASSWORD_HASH_WORKERS', 0))
+    return app.extensions['passwordHasher']
+
+
+def getPasswordHasher():
+    return current_app.extensions['passwordHasher']
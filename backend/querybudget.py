@@ -0,0 +1,75 @@
+import re
+from contextlib import ContextDecorator
+from flask import current_app
+from sqlalchemy import event
+from exts import db
+
+# A plan step reading a whole table, optionally in index order, e.g. "SCAN food_inventory USING INDEX ix_...";
+# SQLite before 3.36 words it "SCAN TABLE food_inventory ..."
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(?!CONSTANT ROW|TABLE )(\w+)\b(?! VIRTUAL TABLE)")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block runs more statements than its budget or scans a table it was not allowed to"""
+
+
+class queryBudget(ContextDecorator):
+    """
+    Fails the enclosed block if it runs more than maxQueries SQL statements or, on SQLite, if any of them
+    reads a whole table outside allowScans.
+
+    Statements are captured from every engine of the app while the block runs. On exit each captured SELECT,
+    UPDATE and DELETE is re-planned with EXPLAIN QUERY PLAN, which shows a SCAN step wherever no index
+    narrows the rows read. Per-row lazy loads show up as a statement count that grows with the data, and an
+    unfiltered query.all() as a SCAN. Usable as `with queryBudget(3, app=app):` or as a decorator on a view.
+    :param maxQueries: Most statements the block may execute
+    :param allowScans: Tables the block may read in full, such as tiny lookup tables
+    :param app: Flask app whose engines are watched; defaults to current_app
+    """
+
+    def __init__(self, maxQueries, allowScans=(), app=None):
+        self.maxQueries = maxQueries
+        self.allowScans = set(allowScans)
+        self.app = app
+        self.statements = []
+
+    def capture(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((conn.engine, statement, parameters, executemany))
+
+    def __enter__(self):
+        self.statements = []
+        app = self.app or current_app._get_current_object()
+        with app.app_context():
+            self.engines = list(db.engines.values())
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self.capture)
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self.capture)
+        if excType is not None:
+            return False
+
+        problems = []
+        if len(self.statements) > self.maxQueries:
+            problems.append(f"{len(self.statements)} statements executed, budget is {self.maxQueries}")
+        for statement, table in self.fullScans():
+            problems.append(f"Full scan of {table} in: {statement}")
+        if problems:
+            executed = "\n".join(f"  {statement}" for _, statement, _, _ in self.statements)
+            raise QueryBudgetExceeded("\n".join(problems) + f"\nStatements:\n{executed}")
+        return False
+
+    def fullScans(self):
+        """Yields (statement, table) for each captured statement whose SQLite plan scans a table not in allowScans"""
+        for engine, statement, parameters, executemany in self.statements:
+            if engine.dialect.name != "sqlite" or executemany \
+                    or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+                continue
+            with engine.connect() as connection:
+                plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            for row in plan:
+                match = FULL_SCAN.match(row[-1])
+                if match and match.group(1) not in self.allowScans:
+                    yield statement, match.group(1)
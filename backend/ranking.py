@@ -0,0 +1,215 @@
+import re
+import threading
+import numpy as np
+from cache import LRUCache
+
+TOKEN_PATTERN = re.compile(r"[a-z]+")
+
+
+def normalizeTokens(text):
+    """Lowercased words of text with a plural s dropped, so "Free Range Eggs" gives ("free", "range", "egg")"""
+    return tuple(token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+                 for token in TOKEN_PATTERN.findall(text.lower()))
+
+
+class Pantry:
+    """A user's usable items mapped onto a ranker's ingredients, with the per-recipe sums they add up to"""
+
+    def __init__(self, day, ingredientCount, version=0):
+        self.day = day     # The date urgencies were computed against
+        self.version = version  # The owner's inventory version the items reflect
+        self.items = {}    # item_id -> (name, expiry_date, ingredient indexes) of items in stock and not expired
+        self.holders = {}  # ingredient index -> set of item_ids covering it
+        self.have = np.zeros(ingredientCount, dtype=np.float32)       # 1 where some item covers the ingredient
+        self.urgency = np.zeros(ingredientCount, dtype=np.float64)    # Urgency of its soonest-expiring item
+        self.covered = None  # Per recipe: ingredients on hand
+        self.urgent = None   # Per recipe: summed urgency of those ingredients
+
+
+class RecipeRanker:
+    """
+    Ranks recipes by how much of them a user's inventory covers, weighted towards items about to expire.
+
+    The corpus is held twice over an ingredient vocabulary: recipe -> ingredients as CSR arrays (ingredientsPtr,
+    ingredientsIdx), to score every recipe from scratch with one gather and np.add.reduceat, and the inverted
+    index ingredient -> recipes (recipesPtr, recipesIdx), so a changed item only touches the recipes using its
+    ingredients. A recipe's score is (covered + urgencyWeight * urgent) / its ingredient count, where an
+    ingredient's urgency halves every urgencyHalfLife days until its soonest-expiring item expires.
+
+    An inventory item covers an ingredient when every word of the ingredient is in the item's name, so
+    "Organic Whole Milk" covers "milk" and "whole milk".
+    """
+
+    def __init__(self, recipes, urgencyHalfLife=3.0, urgencyWeight=1.0, maxPantries=64, pantryTTL=300):
+        """:param recipes: Iterable of (id, name, ingredient names); recipes with no usable ingredient are left out"""
+        self.urgencyHalfLife = urgencyHalfLife
+        self.urgencyWeight = urgencyWeight
+        self.ingredientNames = []  # Display name of each ingredient, as first seen
+        vocabulary = {}            # normalized tokens -> ingredient index
+        seen = {}                  # raw ingredient name -> ingredient index, or None when it has no words
+        ids, self.recipeNames, ptr, indices = [], [], [0], []
+        for recipeID, name, ingredientNames in recipes:
+            row = {}  # Ingredient indexes in the recipe's order, each once
+            for ingredientName in ingredientNames:
+                index = seen.get(ingredientName, -1)
+                if index == -1:
+                    tokens = normalizeTokens(ingredientName)
+                    index = vocabulary.get(tokens) if tokens else None
+                    if tokens and index is None:
+                        index = vocabulary[tokens] = len(self.ingredientNames)
+                        self.ingredientNames.append(ingredientName.strip())
+                    seen[ingredientName] = index
+                if index is not None:
+                    row[index] = None
+            if row:
+                ids.append(recipeID)
+                self.recipeNames.append(name)
+                indices.extend(row)
+                ptr.append(len(indices))
+
+        ingredientCount = len(self.ingredientNames)
+        self.recipeIDs = np.array(ids, dtype=np.int64)
+        self.ingredientsPtr = np.array(ptr, dtype=np.int64)
+        self.ingredientsIdx = np.array(indices, dtype=np.int32)
+        self.sizes = np.diff(self.ingredientsPtr).astype(np.float64)
+        # The same incidence sorted by ingredient; a stable sort keeps each ingredient's recipes in order
+        order = np.argsort(self.ingredientsIdx, kind="stable")
+        self.recipesIdx = np.repeat(np.arange(len(ids), dtype=np.int32), np.diff(self.ingredientsPtr))[order]
+        self.recipesPtr = np.concatenate(([0], np.cumsum(np.bincount(self.ingredientsIdx, minlength=ingredientCount))))
+
+        self.byToken = {}  # token -> [(ingredient index, its token set)], for matching item names
+        for tokens, index in vocabulary.items():
+            for token in set(tokens):
+                self.byToken.setdefault(token, []).append((index, frozenset(tokens)))
+
+        self.pantries = LRUCache(maxEntries=maxPantries, ttl=pantryTTL)
+        self.lock = threading.Lock()  # Guards pantry updates against rankings reading them
+
+    def __len__(self):
+        return len(self.recipeIDs)
+
+    def match(self, name):
+        """Returns the indexes of the ingredients an item called name covers"""
+        tokens = set(normalizeTokens(name))
+        return tuple(sorted({index for token in tokens for index, ingredientTokens in self.byToken.get(token, ())
+                             if ingredientTokens <= tokens}))
+
+    def urgencyOf(self, expiryDate, today):
+        return 0.5 ** ((expiryDate - today).days / self.urgencyHalfLife)
+
+    def place(self, pantry, row):
+        """Adds an item to pantry.items and .holders if it is in stock, unexpired and covers something"""
+        if row["quantity"] <= 0 or row["expiry_date"] < pantry.day:
+            return ()
+        ingredients = self.match(row["name"])
+        if ingredients:
+            pantry.items[row["id"]] = (row["name"], row["expiry_date"], ingredients)
+            for index in ingredients:
+                pantry.holders.setdefault(index, set()).add(row["id"])
+        return ingredients
+
+    def ingredientState(self, pantry, index):
+        holders = pantry.holders.get(index)
+        if not holders:
+            return 0.0, 0.0
+        return 1.0, max(self.urgencyOf(pantry.items[itemID][1], pantry.day) for itemID in holders)
+
+    def buildPantry(self, rows, today, version=0):
+        """Scores every recipe for a user's item rows from scratch, with one gather and reduceat per sum"""
+        pantry = Pantry(today, len(self.ingredientNames), version)
+        for row in rows:
+            self.place(pantry, row)
+        for index in pantry.holders:
+            pantry.have[index], pantry.urgency[index] = self.ingredientState(pantry, index)
+
+        if len(self):
+            starts = self.ingredientsPtr[:-1]
+            pantry.covered = np.add.reduceat(pantry.have[self.ingredientsIdx], starts)
+            pantry.urgent = np.add.reduceat(pantry.urgency[self.ingredientsIdx], starts)
+        else:
+            pantry.covered, pantry.urgent = np.zeros(0, dtype=np.float32), np.zeros(0)
+        return pantry
+
+    def applyChange(self, action, rows, versions=None):
+        """
+        Applies committed inventory writes to the cached pantries of their owners; others are built when needed.
+        A pantry only moves to the write's version if it reflected the one before, otherwise it stays behind and
+        is rebuilt on its next ranking.
+        """
+        with self.lock:
+            for row in rows:
+                pantry = self.pantries.get(row["user_id"])
+                if pantry is not None:
+                    self.updatePantry(pantry, row, deleted=action == "delete")
+            for userID, version in (versions or {}).items():
+                pantry = self.pantries.get(userID)
+                if pantry is not None and pantry.version == version - 1:
+                    pantry.version = version
+
+    def updatePantry(self, pantry, row, deleted=False):
+        """Replaces or removes one item, adjusting only the recipes that use the ingredients it covers or covered"""
+        affected = set()
+        previous = pantry.items.pop(row["id"], None)
+        if previous is not None:
+            for index in previous[2]:
+                pantry.holders[index].discard(row["id"])
+                if not pantry.holders[index]:
+                    del pantry.holders[index]
+            affected.update(previous[2])
+        if not deleted:
+            affected.update(self.place(pantry, row))
+
+        for index in affected:
+            have, urgency = self.ingredientState(pantry, index)
+            haveDelta, urgencyDelta = have - pantry.have[index], urgency - pantry.urgency[index]
+            if haveDelta or urgencyDelta:
+                recipes = self.recipesIdx[self.recipesPtr[index]:self.recipesPtr[index + 1]]
+                pantry.covered[recipes] += haveDelta  # An ingredient is listed once per recipe, so no np.add.at
+                pantry.urgent[recipes] += urgencyDelta
+                pantry.have[index], pantry.urgency[index] = have, urgency
+
+    def suggest(self, userID, today, loadItems, limit=10, maxMissing=None, version=0):
+        """
+        Returns userID's top recipes as dicts, best first, building their pantry from loadItems() when it is not
+        cached for today and version. Only recipes with at least one ingredient on hand are ranked.
+        :param loadItems: Function returning the user's item rows with id, name, quantity and expiry_date
+        :param maxMissing: Leave out recipes missing more ingredients than this
+        :param version: The user's current inventory version, read before loadItems would be called
+        """
+        with self.lock:
+            pantry = self.pantries.get(userID)
+        if pantry is None or pantry.day != today or pantry.version != version:
+            pantry = self.buildPantry(loadItems(), today, version)  # Outside the lock, so other users' rankings go on
+            self.pantries.set(userID, pantry)
+
+        with self.lock:
+            top = self.rank(pantry, limit, maxMissing)
+            return [self.describe(pantry, recipe, score) for recipe, score in top]
+
+    def rank(self, pantry, limit, maxMissing=None):
+        """Returns (recipe index, score) of the best limit recipes, ties broken by recipe id"""
+        usable = pantry.covered > 0
+        if maxMissing is not None:
+            usable &= self.sizes - pantry.covered <= maxMissing
+        candidates = np.flatnonzero(usable)
+        scores = (pantry.covered[candidates] + self.urgencyWeight * pantry.urgent[candidates]) / self.sizes[candidates]
+        if len(candidates) > limit:
+            # Keeps everything scoring at least the limit-th best, so ties at the cut are settled by id below
+            kept = scores >= np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            candidates, scores = candidates[kept], scores[kept]
+        order = np.lexsort((self.recipeIDs[candidates], -scores))[:limit]
+        return list(zip(candidates[order].tolist(), scores[order].tolist()))
+
+    def describe(self, pantry, recipe, score):
+        ingredients = self.ingredientsIdx[self.ingredientsPtr[recipe]:self.ingredientsPtr[recipe + 1]].tolist()
+        uses = sorted({itemID for index in ingredients for itemID in pantry.holders.get(index, ())},
+                      key=lambda itemID: (pantry.items[itemID][1], itemID))
+        return {
+            "id": int(self.recipeIDs[recipe]),
+            "name": self.recipeNames[recipe],
+            "score": round(score, 4),
+            "coverage": round(float(pantry.covered[recipe]) / len(ingredients), 4),
+            "ingredients": [self.ingredientNames[index] for index in ingredients],
+            "missing": [self.ingredientNames[index] for index in ingredients if index not in pantry.holders],
+            "use_first": [pantry.items[itemID][0] for itemID in uses],
+        }
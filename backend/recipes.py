@@ -0,0 +1,198 @@
+import csv
+import json
+import threading
+import time
+from datetime import date
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_jwt_extended import jwt_required
+from flask_restx import Namespace, Resource, fields, inputs
+from sqlalchemy import insert, select
+from exts import db, readOnly
+from inventory import currentUserID
+from models import FoodInventory, InventoryVersion, Recipe, RecipeCorpusVersion, onInventoryChange
+
+IMPORT_BATCH_SIZE = 5000
+
+recipeNS = Namespace('recipes', description="A namespace for Recipe suggestions")
+
+# Recipe Suggestion Serializer
+suggestionModel = recipeNS.model("Recipe Suggestion", {
+    "id": fields.Integer(),
+    "name": fields.String(),
+    "score": fields.Float(description="Coverage plus the urgency of the expiring items it uses, higher is better"),
+    "coverage": fields.Float(description="Share of the ingredients on hand"),
+    "ingredients": fields.List(fields.String()),
+    "missing": fields.List(fields.String()),
+    "use_first": fields.List(fields.String(), description="Names of the items it uses, soonest expiry first")
+})
+
+
+class RecipeCorpus:
+    """
+    Holds the app's RecipeRanker, built from the recipe table on first use and rebuilt when the table changes.
+    Imports in this process reset it straight away; the corpus version is also checked every checkSeconds, for
+    imports run from another process.
+    """
+
+    def __init__(self, rankerOptions, checkSeconds=300):
+        self.rankerOptions = rankerOptions
+        self.checkSeconds = checkSeconds
+        self.ranker = None
+        self.version = None
+        self.checkedAt = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.ranker is not None and now - self.checkedAt < self.checkSeconds:
+                return self.ranker
+
+            version = RecipeCorpusVersion.current()
+            self.checkedAt = now
+            if self.ranker is None or version != self.version:
+                # Imported on demand: numpy adds ~70 ms to startup and only the suggestions need it
+                from ranking import RecipeRanker
+                rows = db.session.execute(select(Recipe.id, Recipe.name, Recipe.ingredients).order_by(Recipe.id))
+                self.ranker = RecipeRanker(((row.id, row.name, row.ingredients.splitlines()) for row in rows),
+                                           **self.rankerOptions)
+                self.version = version
+            return self.ranker
+
+    def reset(self):
+        with self.lock:
+            self.ranker = None
+
+
+def usableItems(userID, today):
+    """Returns userID's items that are in stock and not expired as dicts, on the (user_id, expiry_date) index"""
+    rows = db.session.execute(
+        select(FoodInventory.id, FoodInventory.name, FoodInventory.quantity, FoodInventory.expiry_date)
+        .where(FoodInventory.user_id == userID, FoodInventory.expiry_date >= today, FoodInventory.quantity > 0))
+    return [row._asdict() for row in rows]
+
+
+def suggestRecipes(userID, limit=10, maxMissing=None, today=None):
+    """
+    Returns the recipes that best use up userID's inventory, soonest-expiring items first, as dicts. The user's
+    inventory version is checked on every call, so a cached pantry that missed writes made by another worker or
+    the CLI is rebuilt.
+    """
+    today = today or date.today()
+    ranker = current_app.extensions['recipeCorpus'].get()
+    version, _ = InventoryVersion.current(userID)
+    return ranker.suggest(userID, today, lambda: usableItems(userID, today), limit, maxMissing, version)
+
+
+def readRecipes(lines, format):
+    """Yields (name, ingredient names, source) from CSV with name,ingredients[,source] or NDJSON lines"""
+    if format == "csv":
+        for row in csv.DictReader(lines):
+            # Ingredients are separated by semicolons within their column
+            yield row.get("name"), (row.get("ingredients") or "").split(";"), row.get("source")
+        return
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None, None, None
+            continue
+        if not isinstance(record, dict):
+            yield None, None, None
+            continue
+        yield record.get("name"), record.get("ingredients"), record.get("source")
+
+
+def importRecipes(lines, format="csv", batchSize=IMPORT_BATCH_SIZE):
+    """
+    Adds recipes from CSV or NDJSON lines, written as one executemany INSERT per batch in its own transaction.
+    Recipes without a name or any ingredient are skipped.
+    :return: A tuple of (imported, skipped) counts
+    """
+    statement = insert(Recipe)
+    imported = skipped = 0
+    batch = []
+
+    def flush():
+        db.session.execute(statement, batch)
+        RecipeCorpusVersion.bump()
+        db.session.commit()
+        batch.clear()
+
+    for name, ingredients, source in readRecipes(lines, format):
+        if isinstance(ingredients, list):
+            ingredients = [ingredient.strip() for ingredient in ingredients
+                           if isinstance(ingredient, str) and ingredient.strip()]
+        if not isinstance(name, str) or not name.strip() or not ingredients:
+            skipped += 1
+            continue
+
+        batch.append({"name": name.strip(), "ingredients": "\n".join(ingredients),
+                      "source": (source.strip() or None) if isinstance(source, str) else None})
+        imported += 1
+        if len(batch) >= batchSize:
+            flush()
+
+    if batch:
+        flush()
+
+    current_app.extensions['recipeCorpus'].reset()
+    return imported, skipped
+
+
+@click.command('import-recipes')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(["csv", "ndjson"]), default=None,
+              help="Defaults to ndjson for .ndjson and .jsonl files, csv otherwise")
+@click.option('--replace', is_flag=True, help="Deletes the existing recipes first")
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+@with_appcontext
+def importRecipesCommand(path, format, replace, batch_size):
+    """Bulk loads the recipe corpus from a CSV (name,ingredients[,source]) or NDJSON file"""
+    format = format or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    if replace:
+        db.session.execute(Recipe.__table__.delete())
+        RecipeCorpusVersion.bump()
+        db.session.commit()
+    with open(path, newline="" if format == "csv" else None, encoding="utf-8") as lines:
+        imported, skipped = importRecipes(lines, format, batch_size)
+    click.echo(f"Imported {imported} recipes, skipped {skipped} invalid records")
+
+
+def initRecipeCorpus(app):
+    options = {"urgencyHalfLife": app.config.get('RECIPE_URGENCY_HALF_LIFE_DAYS', 3.0),
+               "urgencyWeight": app.config.get('RECIPE_URGENCY_WEIGHT', 1.0),
+               "maxPantries": app.config.get('RECIPE_PANTRY_MAX_ENTRIES', 64),
+               "pantryTTL": app.config.get('RECIPE_PANTRY_TTL', 300)}
+    app.extensions['recipeCorpus'] = RecipeCorpus(options, app.config.get('RECIPE_CORPUS_CHECK_SECONDS', 300))
+    app.cli.add_command(importRecipesCommand)
+
+
+@onInventoryChange
+def syncRecipePantries(action, rows, versions):
+    corpus = current_app.extensions.get('recipeCorpus')
+    if corpus is not None and corpus.ranker is not None:
+        corpus.ranker.applyChange(action, rows, versions)  # Pantries not cached yet read the committed rows when built
+
+
+# Query string arguments accepted by GET /recipes/suggestions
+suggestionParser = recipeNS.parser()
+suggestionParser.add_argument('limit', type=inputs.int_range(1, 50), default=10)
+suggestionParser.add_argument('max_missing', type=inputs.natural,
+                              help="Leave out recipes missing more ingredients than this")
+
+@recipeNS.route('/suggestions')
+class RecipeSuggestions(Resource):
+    @recipeNS.expect(suggestionParser)
+    @readOnly
+    @jwt_required()
+    @recipeNS.marshal_list_with(suggestionModel)
+    def get(self):
+        """Returns the recipes that use the most of the user's inventory, favouring items about to expire"""
+        args = suggestionParser.parse_args()
+        return suggestRecipes(currentUserID(), args['limit'], args['max_missing'])
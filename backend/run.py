@@ -1,6 +1,19 @@
+from decouple import config
 from main import createApp
-from config import DevConfig
+from config import DevConfig, ProdConfig
+
+CONFIGS = {"dev": DevConfig, "prod": ProdConfig}
 
 if __name__ == '__main__':
-    app = createApp(DevConfig)
-    app.run()
\ No newline at end of file
+    appConfig = CONFIGS[config('APP_CONFIG', default='dev')]
+
+    if config('SERVER_MODE', default='wsgi') == 'asgi':
+        # Event-loop server for many slow or idle connections
+        import uvicorn
+        from asgi import createAsgiApp
+
+        uvicorn.run(createAsgiApp(appConfig), host=config('HOST', default='127.0.0.1'),
+                    port=config('PORT', default=5000, cast=int))
+    else:
+        app = createApp(appConfig)
+        app.run()
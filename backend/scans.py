@@ -0,0 +1,180 @@
+import atexit
+import threading
+from sqlalchemy import bindparam, update
+from catalog import defaultExpiryDate, lookupProduct
+from exts import db
+from models import FoodInventory, commitInventoryChange
+
+
+class BufferFull(Exception):
+    """Raised when the scan buffer holds as many distinct pending products as it is allowed to"""
+
+
+class ScanBuffer:
+    """
+    Write-behind buffer for barcode scans.
+
+    Scans are accepted in O(1) into a dict of (user_id, upc) -> count, so a burst of repeated detections
+    becomes a single quantity increment. The buffer is written to FoodInventory in one transaction when it
+    reaches `flushSize` distinct products, every `flushInterval` seconds from a background thread, and at
+    interpreter exit. Once `maxPending` distinct products are waiting, new ones raise BufferFull.
+    """
+
+    def __init__(self, app, maxPending=10000, flushSize=500, flushInterval=2.0):
+        self.app = app
+        self.maxPending = maxPending
+        self.flushSize = flushSize
+        self.flushInterval = flushInterval
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flushLock = threading.Lock()  # Serialises flushes from the thread, the size trigger and shutdown
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.stats = {"accepted": 0, "rejected": 0, "flushes": 0, "items_created": 0, "items_incremented": 0,
+                      "unknown_upcs": 0}
+
+    def start(self):
+        if self.flushInterval:
+            self.thread = threading.Thread(target=self.run, name="scan-flush", daemon=True)
+            self.thread.start()
+        atexit.register(self.shutdown)  # Unregistered by shutdown, so a stopped buffer does not keep its app alive
+
+    def add(self, userID, upc, count=1):
+        """Records count scans of upc for userID, raising BufferFull instead of growing past maxPending"""
+        key = (userID, upc)
+        with self.lock:
+            if key not in self.pending and len(self.pending) >= self.maxPending:
+                self.stats["rejected"] += 1
+                raise BufferFull()
+            self.pending[key] = self.pending.get(key, 0) + count
+            self.stats["accepted"] += count
+            full = len(self.pending) >= self.flushSize
+
+        if full:
+            if self.thread is not None:
+                self.wake.set()
+            else:
+                self.flush()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.flushInterval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("Scan buffer flush failed; scans kept for the next attempt")
+
+    def shutdown(self):
+        """Stops the background thread and writes whatever is still pending"""
+        atexit.unregister(self.shutdown)
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def flush(self):
+        """Writes every pending scan in a single transaction; on failure the scans are put back"""
+        with self.flushLock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return
+
+            try:
+                with self.app.app_context():
+                    self.write(batch)
+            except Exception:
+                with self.lock:
+                    for key, count in batch.items():
+                        self.pending[key] = self.pending.get(key, 0) + count
+                raise
+
+    def write(self, batch):
+        # New stock is matched to an item with the same name and default expiry date, i.e. bought the same day
+        wanted = {}
+        unknown = 0
+        for (userID, upc), count in batch.items():
+            product = lookupProduct(upc)
+            expiryDate = defaultExpiryDate(product)
+            if expiryDate is None:
+                unknown += 1  # Without a name and shelf life the scan cannot become an item
+                continue
+            key = (userID, product["name"], expiryDate)
+            wanted[key] = wanted.get(key, 0) + count
+
+        if unknown:
+            with self.lock:
+                self.stats["unknown_upcs"] += unknown
+        if not wanted:
+            return
+
+        userIDs = {userID for userID, _, _ in wanted}
+        names = {name for _, name, _ in wanted}
+        existing = db.session.execute(
+            db.select(FoodInventory.id, FoodInventory.user_id, FoodInventory.name, FoodInventory.expiry_date)
+            .where(FoodInventory.user_id.in_(userIDs), FoodInventory.name.in_(names)))
+        existingIDs = {(row.user_id, row.name, row.expiry_date): row.id for row in existing}
+
+        increments, newItems = {}, []
+        for key, count in wanted.items():
+            itemID = existingIDs.get(key)
+            if itemID is not None:
+                increments[itemID] = (key, count)
+            else:
+                newItems.append(key)
+
+        try:
+            updated = []
+            if increments:
+                # The item must still be the one selected above; one deleted or renamed since matches nothing
+                db.session.execute(
+                    update(FoodInventory.__table__)
+                    .where(FoodInventory.id == bindparam("itemID"), FoodInventory.user_id == bindparam("userID"),
+                           FoodInventory.name == bindparam("itemName"),
+                           FoodInventory.expiry_date == bindparam("expiryDate"))
+                    .values(quantity=FoodInventory.quantity + bindparam("increment")),
+                    [{"itemID": itemID, "userID": key[0], "itemName": key[1], "expiryDate": key[2], "increment": count}
+                     for itemID, (key, count) in increments.items()])
+                # The UPDATE holds the write lock, so the rows read back are the ones it changed
+                updated = [row for row in FoodInventory.snapshot(list(increments))
+                           if (row["user_id"], row["name"], row["expiry_date"]) == increments[row["id"]][0]]
+                changedIDs = {row["id"] for row in updated}
+                newItems += [key for itemID, (key, _) in increments.items() if itemID not in changedIDs]
+
+            items = [FoodInventory(name=name, quantity=wanted[(userID, name, expiryDate)], expiry_date=expiryDate,
+                                   user_id=userID) for userID, name, expiryDate in newItems]
+            db.session.add_all(items)
+            db.session.flush()
+            created = [item.toDict() for item in items]
+        except Exception:
+            db.session.rollback()
+            raise
+
+        commitInventoryChange(("create", created), ("update", updated))
+        with self.lock:
+            self.stats["flushes"] += 1
+            self.stats["items_created"] += len(created)
+            self.stats["items_incremented"] += len(updated)
+
+    def counters(self):
+        """Returns the pending size and a consistent copy of the flush counters"""
+        with self.lock:
+            return {"pending": len(self.pending), **self.stats}
+
+    def pendingCount(self):
+        with self.lock:
+            return len(self.pending)
+
+
+def initScanBuffer(app):
+    scanBuffer = ScanBuffer(app,
+                            maxPending=app.config.get('SCAN_BUFFER_MAX_PENDING', 10000),
+                            flushSize=app.config.get('SCAN_FLUSH_SIZE', 500),
+                            flushInterval=app.config.get('SCAN_FLUSH_SECONDS', 2))
+    app.extensions['scanBuffer'] = scanBuffer
+    scanBuffer.start()
+    return scanBuffer
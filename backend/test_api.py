@@ -1,7 +1,29 @@
+import asyncio
+import json as jsonlib
+import os
+import tempfile
+import threading
 import unittest
+from datetime import date, datetime, timedelta
+import numpy
+from sqlalchemy import event, text
+from flask import Response
+from flask_restx import marshal
 from main import createApp
-from config import TestConfig
+from asgi import AsgiAdapter
+from config import ProdConfig, TestConfig
 from exts import db as flask_db
+from models import User
+from catalog import importProducts
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash
+from expiry import ExpiryTracker
+from cache import LRUCache, approximateSize
+from events import EventBroker
+from passwords import PasswordHasher
+from querybudget import FULL_SCAN, QueryBudgetExceeded, queryBudget
+from models import FoodInventory, FoodInventoryArchive, InventoryEvent
+from inventory import foodinvModel, syncItemModel
+from recipes import importRecipes, usableItems
 
 
 class APITestCase(unittest.TestCase):
@@ -83,7 +105,10 @@ class APITestCase(unittest.TestCase):
         Returns: None
         """
 
-        response = self.client.get('/inventory/inventory')
+        accessToken = self.getAccessToken()
+
+        response = self.client.get('/inventory/inventory',
+                                   headers={"Authorization": f"Bearer {accessToken}"})
         # print(response.json)
         statusCode = response.status_code
         self.assertEqual(statusCode, 200)
@@ -97,12 +122,18 @@ class APITestCase(unittest.TestCase):
         Returns:
             None
         """
+        accessToken = self.getAccessToken()
+
         id = 1
-        response = self.client.get(f'/inventory/inventory/{id}')
+        response = self.client.get(f'/inventory/inventory/{id}',
+                                   headers={"Authorization": f"Bearer {accessToken}"})
         statusCode = response.status_code
 
         self.assertEqual(statusCode, 404)
 
+        unauthorizedResponse = self.client.get(f'/inventory/inventory/{id}')
+        self.assertEqual(unauthorizedResponse.status_code, 401)
+
     def testCreateItem(self):
         """
         Create a new item in the food inventory.
@@ -241,11 +272,1362 @@ class APITestCase(unittest.TestCase):
 
         self.assertEqual(statusCode, 204)
 
+    def testLoginRehashesOutdatedPassword(self):
+        """
+        Test that logging in upgrades a password hash made with an outdated method.
+
+        Stores a user whose hash uses fewer iterations than the configured method, logs in and asserts the stored hash now uses the configured method and still verifies.
+
+        Returns:
+        None
+        """
+        with self.app.app_context():
+            User(username="olduser", email="olduser@company.com",
+                 password=generate_password_hash("password", method="pbkdf2:sha256:500")).save()
+
+        loginResponse = self.client.post('/auth/login',
+                                         json={
+                                             "username": "olduser",
+                                             "password": "password"
+                                         })
+        self.assertEqual(loginResponse.status_code, 200)
+
+        with self.app.app_context():
+            storedHash = User.query.filter_by(username="olduser").first().password
+        self.assertTrue(storedHash.startswith(self.app.config["PASSWORD_HASH_METHOD"] + "$"))
+
+        secondLogin = self.client.post('/auth/login', json={"username": "olduser", "password": "password"})
+        self.assertEqual(secondLogin.status_code, 200)
+
+    def getAccessToken(self, username="testuser"):
+        """Registers and logs in a user, returning its access token"""
+        self.client.post('/auth/register',
+                         json={
+                             "username": username,
+                             "email": f"{username}@company.com",
+                             "password": "password"
+                         })
+
+        loginResponse = self.client.post('/auth/login',
+                                         json={
+                                             "username": username,
+                                             "password": "password"
+                                         })
+
+        return loginResponse.json["accessToken"]
+
+    def testInventoryPagination(self):
+        """
+        Test keyset pagination and filtering on the inventory list endpoint.
+
+        Creates three items, then walks the list two items at a time and asserts that following next_cursor returns the remaining item and ends with a null cursor. Also checks the quantity and name filters.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+
+        for name, quantity in [("apple", 1), ("banana", 5), ("apple juice", 10)]:
+            self.client.post('inventory/inventory',
+                             json={
+                                 "name": name,
+                                 "quantity": quantity,
+                                 "expiry_date": "2023-03-15"
+                             },
+                             headers={
+                                 "Authorization": f"Bearer {accessToken}"
+                             })
+
+        firstPage = self.client.get('/inventory/inventory?limit=2', headers=headers).json
+        self.assertEqual([item["name"] for item in firstPage["items"]], ["apple", "banana"])
+        self.assertIsNotNone(firstPage["next_cursor"])
+
+        secondPage = self.client.get(f'/inventory/inventory?limit=2&cursor={firstPage["next_cursor"]}', headers=headers).json
+        self.assertEqual([item["name"] for item in secondPage["items"]], ["apple juice"])
+        self.assertIsNone(secondPage["next_cursor"])
+
+        filtered = self.client.get('/inventory/inventory?name=APPLE&min_quantity=5', headers=headers).json
+        self.assertEqual([item["name"] for item in filtered["items"]], ["apple juice"])
+        for wildcard in ("%25", "_"):  # LIKE wildcards typed by the user match themselves only
+            self.assertEqual(self.client.get(f'/inventory/inventory?name={wildcard}', headers=headers).json["items"], [])
+
+        badLimit = self.client.get('/inventory/inventory?limit=0', headers=headers)
+        self.assertEqual(badLimit.status_code, 400)
+
+    def testBulkOperations(self):
+        """
+        Test the bulk endpoint.
+
+        Sends a batch that creates two items, updates one and deletes the other, and asserts the per-item results. Then sends a batch containing an invalid operation and asserts that it is rejected as a whole without creating anything, and that boolean ids and quantities, non-string or blank names and negative quantities are rejected before the transaction.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+
+        createResponse = self.client.post('/inventory/inventory/bulk',
+                                          json={"operations": [
+                                              {"op": "create", "name": "milk", "quantity": 1, "expiry_date": "2023-03-15"},
+                                              {"op": "create", "name": "eggs", "quantity": 12, "expiry_date": "2023-03-20"}
+                                          ]},
+                                          headers=headers)
+        self.assertEqual(createResponse.status_code, 200)
+        milkID, eggsID = [result["id"] for result in createResponse.json["results"]]
+
+        mixedResponse = self.client.post('/inventory/inventory/bulk',
+                                         json={"operations": [
+                                             {"op": "update", "id": milkID, "quantity": 3},
+                                             {"op": "delete", "id": eggsID}
+                                         ]},
+                                         headers=headers)
+        self.assertEqual([result["status"] for result in mixedResponse.json["results"]], ["updated", "deleted"])
+
+        items = self.client.get('/inventory/inventory', headers=headers).json["items"]
+        self.assertEqual([(item["name"], item["quantity"]) for item in items], [("milk", 3)])
+
+        rejectedResponse = self.client.post('/inventory/inventory/bulk',
+                                            json={"operations": [
+                                                {"op": "create", "name": "bread", "quantity": 1, "expiry_date": "2023-03-15"},
+                                                {"op": "delete", "id": eggsID}
+                                            ]},
+                                            headers=headers)
+        self.assertEqual(rejectedResponse.status_code, 400)
+        self.assertEqual(rejectedResponse.json["errors"][0]["index"], 1)
+        self.assertEqual(len(self.client.get('/inventory/inventory', headers=headers).json["items"]), 1)
+
+        # Booleans are not ids or quantities, and names and quantities are checked before the transaction
+        malformedResponse = self.client.post('/inventory/inventory/bulk',
+                                             json={"operations": [
+                                                 {"op": "update", "id": True, "quantity": 5},
+                                                 {"op": "create", "name": "bread", "quantity": True, "expiry_date": "2023-03-15"},
+                                                 {"op": "create", "name": ["bread"], "quantity": 1, "expiry_date": "2023-03-15"},
+                                                 {"op": "create", "name": " ", "quantity": 1, "expiry_date": "2023-03-15"},
+                                                 {"op": "create", "name": "bread", "quantity": -5, "expiry_date": "2023-03-15"},
+                                                 {"op": "update", "id": milkID, "name": 7}
+                                             ]},
+                                             headers=headers)
+        self.assertEqual(malformedResponse.status_code, 400)
+        self.assertEqual([(error["index"], error["error"]) for error in malformedResponse.json["errors"]],
+                         [(0, "id is required for update"), (1, "quantity must be a non-negative integer"),
+                          (2, "name must be a non-empty string"), (3, "name must be a non-empty string"),
+                          (4, "quantity must be a non-negative integer"), (5, "name must be a non-empty string")])
+        items = self.client.get('/inventory/inventory', headers=headers).json["items"]
+        self.assertEqual([(item["name"], item["quantity"]) for item in items], [("milk", 3)])
+
+    def testInventoryIsScopedToUser(self):
+        """
+        Test that inventory items are only visible to the user who created them.
+
+        Two users each create an item, and each user's list only contains their own item. The second user gets a 404 when reading, updating or deleting the first user's item.
+
+        Returns:
+        None
+        """
+        aliceHeaders = {"Authorization": f"Bearer {self.getAccessToken('alice')}"}
+        bobHeaders = {"Authorization": f"Bearer {self.getAccessToken('bob')}"}
+
+        aliceItem = self.client.post('inventory/inventory',
+                                     json={"name": "alice milk", "quantity": 1, "expiry_date": "2023-03-15"},
+                                     headers=aliceHeaders).json
+        self.client.post('inventory/inventory',
+                         json={"name": "bob milk", "quantity": 1, "expiry_date": "2023-03-15"},
+                         headers=bobHeaders)
+
+        aliceItems = self.client.get('/inventory/inventory', headers=aliceHeaders).json["items"]
+        bobItems = self.client.get('/inventory/inventory', headers=bobHeaders).json["items"]
+        self.assertEqual([item["name"] for item in aliceItems], ["alice milk"])
+        self.assertEqual([item["name"] for item in bobItems], ["bob milk"])
+
+        itemURL = f'/inventory/inventory/{aliceItem["id"]}'
+        self.assertEqual(self.client.get(itemURL, headers=bobHeaders).status_code, 404)
+        self.assertEqual(self.client.delete(itemURL, headers=bobHeaders).status_code, 404)
+        self.assertEqual(self.client.get(itemURL, headers=aliceHeaders).status_code, 200)
+
+        bulkResponse = self.client.post('/inventory/inventory/bulk',
+                                        json={"operations": [{"op": "delete", "id": aliceItem["id"]}]},
+                                        headers=bobHeaders)
+        self.assertEqual(bulkResponse.status_code, 400)
+
+    def testConditionalGet(self):
+        """
+        Test ETag validation on the inventory endpoints.
+
+        Fetches the list and an item, then repeats the requests with If-None-Match and asserts a 304 with no body. After a write the old ETag no longer matches and the full response is returned again.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+
+        item = self.client.post('inventory/inventory',
+                                json={"name": "milk", "quantity": 1, "expiry_date": "2023-03-15"},
+                                headers=headers).json
+
+        listResponse = self.client.get('/inventory/inventory', headers=headers)
+        etag = listResponse.headers["ETag"]
+        self.assertIn("Last-Modified", listResponse.headers)
+
+        notModified = self.client.get('/inventory/inventory', headers={**headers, "If-None-Match": etag})
+        self.assertEqual(notModified.status_code, 304)
+        self.assertEqual(notModified.data, b"")
+
+        itemURL = f'/inventory/inventory/{item["id"]}'
+        itemETag = self.client.get(itemURL, headers=headers).headers["ETag"]
+        self.assertNotEqual(itemETag, etag)
+        self.assertEqual(self.client.get(itemURL, headers={**headers, "If-None-Match": itemETag}).status_code, 304)
+
+        self.client.put(itemURL,
+                        json={"name": "milk", "quantity": 2, "expiry_date": "2023-03-15"},
+                        headers=headers)
+
+        modified = self.client.get('/inventory/inventory', headers={**headers, "If-None-Match": etag})
+        self.assertEqual(modified.status_code, 200)
+        self.assertEqual(modified.json["items"][0]["quantity"], 2)
+
+    def testResponseCache(self):
+        """
+        Test the read-through response cache.
+
+        Reads the list twice and asserts the second read is a cache hit. After an update, asserts the cached list is dropped and the next read returns the new quantity.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+
+        item = self.client.post('inventory/inventory',
+                                json={"name": "milk", "quantity": 1, "expiry_date": "2023-03-15"},
+                                headers=headers).json
+
+        self.client.get('/inventory/inventory', headers=headers)
+        self.client.get('/inventory/inventory', headers=headers)
+        self.assertEqual(self.client.get('/inventory/cache/stats').status_code, 401)
+        stats = self.client.get('/inventory/cache/stats', headers=headers).json
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+        self.client.put(f'inventory/inventory/{item["id"]}',
+                        json={"name": "milk", "quantity": 5, "expiry_date": "2023-03-15"},
+                        headers=headers)
+        self.assertEqual(self.client.get('/inventory/cache/stats', headers=headers).json["invalidations"], 1)
+
+        items = self.client.get('/inventory/inventory', headers=headers).json["items"]
+        self.assertEqual(items[0]["quantity"], 5)
+
+    def testBarcodeLookupAndScanCreate(self):
+        """
+        Test the UPC product catalog.
+
+        Imports a small catalog through the import-products CLI command, looks up a known and an unknown UPC, and creates an inventory item from a UPC alone, asserting its name and expiry date are prefilled from the catalog.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as catalogFile:
+            catalogFile.write("upc,name,shelf_life_days\n012345678905,Whole Milk,7\n036000291452,Tissues,\nbad,Row,1\n")
+        try:
+            result = self.app.test_cli_runner().invoke(args=["import-products", catalogFile.name])
+        finally:
+            os.remove(catalogFile.name)
+        self.assertIn("Imported 2 products, skipped 1", result.output)
+
+        product = self.client.get('/inventory/barcode/012345678905', headers=headers).json
+        self.assertEqual(product, {"upc": "012345678905", "name": "Whole Milk", "shelf_life_days": 7})
+        self.assertEqual(self.client.get('/inventory/barcode/099999999999', headers=headers).status_code, 404)
+
+        scanned = self.client.post('inventory/inventory',
+                                   json={"upc": "012345678905", "quantity": 1},
+                                   headers=headers)
+        self.assertEqual(scanned.status_code, 201)
+        self.assertEqual(scanned.json["name"], "Whole Milk")
+        self.assertEqual(scanned.json["expiry_date"], (date.today() + timedelta(days=7)).isoformat())
+
+        noShelfLife = self.client.post('inventory/inventory', json={"upc": "036000291452", "quantity": 1},
+                                       headers=headers)
+        self.assertEqual(noShelfLife.status_code, 400)
+        numericUPC = self.client.post('inventory/inventory', json={"upc": 12345678905, "quantity": 1}, headers=headers)
+        self.assertEqual(numericUPC.status_code, 400)
+
+    def testQueryBudgets(self):
+        """
+        Test every endpoint against its SQL statement budget.
+
+        Seeds enough items that per-row lazy loads would blow the budgets, then asserts that each endpoint stays within its declared number of statements and never scans a whole table. Also asserts that the budget catches an unfiltered query.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        refreshHeaders = {"Authorization": "Bearer " + self.client.post(
+            '/auth/login', json={"username": "testuser", "password": "password"}).json["refreshToken"]}
+        with self.app.app_context():
+            importProducts(["upc,name,shelf_life_days", "012345678905,Whole Milk,7"])
+            importRecipes(['{"name": "Item Salad", "ingredients": ["Item", "Bread", "Oil"]}'], format="ndjson")
+            recipeCorpus = self.app.extensions['recipeCorpus']
+            recipeCorpus.checkSeconds = 3600  # Budgets the ranking; the corpus is reread once and rechecked periodically
+            recipeCorpus.get()
+        for index in range(30):
+            self.client.post('/inventory/inventory', json={"name": f"Item {index}", "quantity": index,
+                                                           "expiry_date": (date.today() + timedelta(days=index - 10)).isoformat()},
+                             headers=headers)
+        self.client.get('/inventory/inventory/expired', headers=headers)  # Loads the expiry tracker
+
+        expiryDate = (date.today() + timedelta(days=30)).isoformat()
+        budgets = [
+            ("GET", "/inventory/inventory", None, 2),
+            ("GET", f"/inventory/inventory?name=Item&min_quantity=2&expires_after={date.today().isoformat()}", None, 2),
+            ("GET", "/inventory/inventory?cursor=5&limit=5", None, 2),
+            ("GET", "/inventory/inventory/3", None, 2),
+            ("PUT", "/inventory/inventory/3", {"name": "Bread", "quantity": 2, "expiry_date": expiryDate}, 6),
+            ("PATCH", "/inventory/inventory/3", {"delta": -1}, 4),
+            ("POST", "/inventory/inventory/deltas", {"deltas": [{"id": 3, "delta": 1}, {"id": 4, "delta": 1}]}, 5),
+            ("POST", "/inventory/inventory/bulk", {"operations": [
+                {"op": "create", "name": "Jam", "quantity": 1, "expiry_date": expiryDate},
+                {"op": "update", "id": 4, "quantity": 9}, {"op": "delete", "id": 5}]}, 11),
+            ("DELETE", "/inventory/inventory/6", None, 5),
+            ("GET", "/inventory/inventory/expired", None, 1),
+            ("GET", "/inventory/inventory/expiring?days=7", None, 1),
+            ("GET", "/inventory/inventory/search?q=item", None, 2),
+            ("GET", "/inventory/inventory/search?q=it", None, 2),
+            ("GET", "/inventory/inventory/sync?since=10", None, 4),
+            ("GET", "/inventory/inventory/export?format=csv", None, 1),
+            ("GET", "/inventory/inventory/forecast", None, 2),
+            ("GET", "/inventory/inventory/low-stock?days=3", None, 2),
+            ("GET", "/inventory/barcode/012345678905", None, 1),
+            ("POST", "/inventory/inventory", {"upc": "012345678905", "quantity": 1}, 6),
+            ("POST", "/inventory/scans", {"scans": [{"upc": "012345678905"}]}, 0),
+            ("GET", "/recipes/suggestions?limit=5", None, 2),
+            ("POST", "/auth/register", {"username": "budgetuser", "email": "budgetuser@company.com", "password": "password"}, 2),
+            ("POST", "/auth/login", {"username": "testuser", "password": "password"}, 1),
+            ("POST", "/auth/refresh", None, 0, refreshHeaders),
+        ]
+        for method, path, body, budget, *requestHeaders in budgets:
+            with self.subTest(method=method, path=path), queryBudget(budget, app=self.app):
+                response = self.client.open(path, method=method, json=body, headers=requestHeaders[0] if requestHeaders else headers)
+                response.get_data()  # Streamed bodies run their queries as they are read
+                self.assertLess(response.status_code, 400)
+
+        with self.app.app_context():
+            with self.assertRaisesRegex(QueryBudgetExceeded, "Full scan of food_inventory"):
+                with queryBudget(1):
+                    FoodInventory.query.all()
+            with self.assertRaisesRegex(QueryBudgetExceeded, "2 statements executed, budget is 1"):
+                with queryBudget(1):
+                    FoodInventory.getPage(userID=1)
+                    FoodInventory.getPage(userID=1)
+
+    def testRequestMetrics(self):
+        """
+        Test the request instrumentation.
+
+        Makes authenticated requests and asserts that /metrics reports their latency, SQL statement count and response size per route, and that the Server-Timing header appears once enabled.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        self.client.post('/inventory/inventory', json={"name": "Jam", "quantity": 1, "expiry_date": "2030-01-01"},
+                         headers=headers)
+        listResponse = self.client.get('/inventory/inventory', headers=headers)
+        self.assertNotIn("Server-Timing", listResponse.headers)
+
+        metricsResponse = self.client.get('/metrics')
+        self.assertEqual(metricsResponse.status_code, 200)
+        self.assertTrue(metricsResponse.content_type.startswith("text/plain"))
+        metrics = metricsResponse.get_data(as_text=True)
+        labels = 'method="GET",route="/inventory/inventory",status="200"'
+        self.assertIn(f'foodinv_http_request_duration_seconds_count{{{labels}}} 1', metrics)
+        self.assertIn(f'foodinv_http_request_sql_queries_bucket{{{labels},le="+Inf"}} 1', metrics)
+        self.assertIn(f'foodinv_http_response_size_bytes_count{{{labels}}} 1', metrics)
+        queryCount = float(metrics.split(f'foodinv_http_request_sql_queries_sum{{{labels}}} ')[1].split()[0])
+        self.assertGreaterEqual(queryCount, 2)
+        self.assertRegex(metrics, r'foodinv_startup_seconds\{phase="import"\} [0-9.e-]+')
+
+        self.app.config['METRICS_SERVER_TIMING'] = True
+        timedResponse = self.client.get('/inventory/inventory', headers=headers)
+        self.assertRegex(timedResponse.headers["Server-Timing"], r'^app;dur=[0-9.]+, db;dur=[0-9.]+;desc="\d+ queries"$')
+
+    def testDeltaSync(self):
+        """
+        Test the delta sync endpoint.
+
+        Writes to the user's inventory between syncs and asserts that each sync returns only the rows written and the items deleted since the version returned by the previous one.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        otherHeaders = {"Authorization": f"Bearer {self.getAccessToken('otheruser')}"}
+        itemIDs = [self.client.post('/inventory/inventory', json={"name": name, "quantity": 1, "expiry_date": "2030-01-01"},
+                                    headers=headers).json["id"] for name in ("Flour", "Sugar")]
+        self.client.post('/inventory/inventory', json={"name": "Salt", "quantity": 1, "expiry_date": "2030-01-01"},
+                         headers=otherHeaders)
+
+        fullSync = self.client.get('/inventory/inventory/sync', headers=headers).json
+        self.assertEqual(fullSync["version"], 2)
+        self.assertEqual([(item["name"], item["row_version"]) for item in fullSync["items"]], [("Flour", 1), ("Sugar", 2)])
+        self.assertEqual(fullSync["deleted"], [])
+
+        self.client.patch(f'/inventory/inventory/{itemIDs[0]}', json={"delta": 1}, headers=headers)
+        self.client.delete(f'/inventory/inventory/{itemIDs[1]}', headers=headers)
+
+        deltaSync = self.client.get(f'/inventory/inventory/sync?since={fullSync["version"]}', headers=headers).json
+        self.assertEqual(deltaSync["version"], 4)
+        self.assertEqual([(item["id"], item["quantity"], item["row_version"]) for item in deltaSync["items"]],
+                         [(itemIDs[0], 2, 3)])
+        self.assertEqual([(tombstone["id"], tombstone["row_version"]) for tombstone in deltaSync["deleted"]],
+                         [(itemIDs[1], 4)])
+
+        emptySync = self.client.get(f'/inventory/inventory/sync?since={deltaSync["version"]}', headers=headers).json
+        self.assertEqual((emptySync["version"], emptySync["items"], emptySync["deleted"]), (4, [], []))
+        self.assertEqual(self.client.get('/inventory/inventory/sync?since=-1', headers=headers).status_code, 400)
+
+    def testDeltaSyncReusedID(self):
+        """
+        Test delta sync when SQLite reuses a deleted item's id for another user.
+
+        Deletes one user's last item, creates an item for another user that gets the same id, and asserts that the first user still syncs the delete while the second sees only their item, also once both are deleted.
+
+        Returns:
+        None
+        """
+        headers = {"Authorization": f"Bearer {self.getAccessToken()}"}
+        otherHeaders = {"Authorization": f"Bearer {self.getAccessToken('otheruser')}"}
+        itemID = self.client.post('/inventory/inventory', json={"name": "Flour", "quantity": 1, "expiry_date": "2030-01-01"},
+                                  headers=headers).json["id"]
+        self.client.delete(f'/inventory/inventory/{itemID}', headers=headers)
+        otherID = self.client.post('/inventory/inventory', json={"name": "Salt", "quantity": 1, "expiry_date": "2030-01-01"},
+                                   headers=otherHeaders).json["id"]
+        self.assertEqual(otherID, itemID)
+
+        sync = self.client.get('/inventory/inventory/sync?since=1', headers=headers).json
+        self.assertEqual((sync["version"], sync["items"]), (2, []))
+        self.assertEqual([(tombstone["id"], tombstone["row_version"]) for tombstone in sync["deleted"]], [(itemID, 2)])
+        otherSync = self.client.get('/inventory/inventory/sync', headers=otherHeaders).json
+        self.assertEqual(([item["name"] for item in otherSync["items"]], otherSync["deleted"]), (["Salt"], []))
+
+        self.assertEqual(self.client.delete(f'/inventory/inventory/{otherID}', headers=otherHeaders).status_code, 204)
+        otherSync = self.client.get('/inventory/inventory/sync?since=1', headers=otherHeaders).json
+        self.assertEqual([tombstone["id"] for tombstone in otherSync["deleted"]], [otherID])
+        self.assertEqual(len(self.client.get('/inventory/inventory/sync?since=1', headers=headers).json["deleted"]), 1)
+
+    def testInventoryStream(self):
+        """
+        Test the Server-Sent Events change feed.
+
+        Opens a stream authenticated through the query string, writes to the user's inventory and asserts that the create and delta update arrive as events, while another user's writes do not.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        otherHeaders = {"Authorization": f"Bearer {self.getAccessToken('otheruser')}"}
+
+        streamResponse = self.client.get(f'/inventory/stream?jwt={accessToken}', buffered=False)
+        self.assertEqual(streamResponse.status_code, 200)
+        self.assertEqual(streamResponse.mimetype, "text/event-stream")
+        frames = iter(streamResponse.response)
+        self.assertIn(b"connected", next(frames))
+
+        self.client.post('/inventory/inventory', json={"name": "Rice", "quantity": 1, "expiry_date": "2030-01-01"},
+                         headers=otherHeaders)
+        itemID = self.client.post('/inventory/inventory', json={"name": "Pasta", "quantity": 2, "expiry_date": "2030-01-01"},
+                                  headers=headers).json["id"]
+        self.client.patch(f'/inventory/inventory/{itemID}', json={"delta": 3}, headers=headers)
+
+        event, data = next(frames).decode().split("\n")[:2]
+        self.assertEqual(event, "event: create")
+        self.assertEqual(jsonlib.loads(data[len("data: "):])["items"][0]["name"], "Pasta")
+        event, data = next(frames).decode().split("\n")[:2]
+        self.assertEqual(event, "event: update")
+        self.assertEqual(jsonlib.loads(data[len("data: "):])["items"][0]["quantity"], 5)
+
+        self.assertEqual(self.client.get('/inventory/stream/stats').status_code, 401)
+        self.assertEqual(self.client.get('/inventory/stream/stats', headers=headers).json["subscribers"], 1)
+        streamResponse.close()
+        self.assertEqual(self.client.get('/inventory/stream/stats', headers=headers).json["subscribers"], 0)
+
+    def testQuantityDeltas(self):
+        """
+        Test the atomic quantity delta endpoints.
+
+        Applies deltas to an item and asserts that quantities are clamped at zero, that remove_empty deletes an emptied item, and that other users' items are not found. Then sends a batch with repeated ids and asserts that they are summed, and that a batch naming a missing item changes nothing.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        otherHeaders = {"Authorization": f"Bearer {self.getAccessToken('otheruser')}"}
+        itemIDs = [self.client.post('/inventory/inventory', json={"name": name, "quantity": 5, "expiry_date": "2030-01-01"},
+                                    headers=headers).json["id"] for name in ("Eggs", "Apples")]
+
+        def patch(delta, **extra):
+            return self.client.patch(f'/inventory/inventory/{itemIDs[0]}', json={"delta": delta, **extra}, headers=headers)
+
+        self.assertEqual(patch(-2).json["quantity"], 3)
+        self.assertEqual(patch(-10).json["quantity"], 0)
+        self.assertEqual(patch(4).json, {"id": itemIDs[0], "name": "Eggs", "quantity": 4, "expiry_date": "2030-01-01",
+                                         "deleted": False})
+        self.assertEqual(patch("1").status_code, 400)
+        self.assertEqual(self.client.patch(f'/inventory/inventory/{itemIDs[0]}', json={"delta": -1},
+                                           headers=otherHeaders).status_code, 404)
+
+        removedResponse = patch(-4, remove_empty=True)
+        self.assertEqual((removedResponse.json["quantity"], removedResponse.json["deleted"]), (0, True))
+        self.assertEqual(self.client.get(f'/inventory/inventory/{itemIDs[0]}', headers=headers).status_code, 404)
+
+        rejectedResponse = self.client.post('/inventory/inventory/deltas',
+                                            json={"deltas": [{"id": itemIDs[1], "delta": -1}, {"id": itemIDs[0], "delta": 1}]},
+                                            headers=headers)
+        self.assertEqual(rejectedResponse.status_code, 400)
+        self.assertEqual(self.client.get(f'/inventory/inventory/{itemIDs[1]}', headers=headers).json["quantity"], 5)
+
+        batchResponse = self.client.post('/inventory/inventory/deltas',
+                                         json={"deltas": [{"id": itemIDs[1], "delta": -1}, {"id": itemIDs[1], "delta": -2}]},
+                                         headers=headers)
+        self.assertEqual(batchResponse.status_code, 200)
+        self.assertEqual([(result["id"], result["quantity"]) for result in batchResponse.json["results"]],
+                         [(itemIDs[1], 2)])
+
+    def testInventorySearch(self):
+        """
+        Test the inventory search endpoint.
+
+        Creates items for two users and asserts that searches match substrings, prefixes and misspellings of the user's own item names, rank exact matches first, are not crowded out by another user's better matches, and follow renames and deletes.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        otherHeaders = {"Authorization": f"Bearer {self.getAccessToken('otheruser')}"}
+        for name in ("Cheddar Cheese", "Cream Cheese", "Chicken Breast", "Milk"):
+            self.client.post('/inventory/inventory', json={"name": name, "quantity": 1, "expiry_date": "2030-01-01"},
+                             headers=headers)
+        self.client.post('/inventory/inventory', json={"name": "Cheese Curds", "quantity": 1, "expiry_date": "2030-01-01"},
+                         headers=otherHeaders)
+
+        def search(query):
+            response = self.client.get(f'/inventory/inventory/search?q={query.replace(" ", "+")}', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            return [result["name"] for result in response.json]
+
+        self.assertEqual(sorted(search("cheese")), ["Cheddar Cheese", "Cream Cheese"])
+        self.assertEqual(search("chedar")[0], "Cheddar Cheese")
+        self.assertEqual(search("chiken brest"), ["Chicken Breast"])
+        self.assertEqual(search("mi"), ["Milk"])
+        self.assertEqual(search("yoghurt"), [])
+        self.assertEqual(search("%25"), [])
+        self.assertEqual(search("_"), [])
+
+        # Another user's closer matches do not take the candidate slots ahead of the user's own
+        self.client.post('/inventory/inventory/bulk', json={"operations": [
+            {"op": "create", "name": "Cheese", "quantity": 1, "expiry_date": "2030-01-01"}] * 10}, headers=otherHeaders)
+        ownMatches = self.client.get('/inventory/inventory/search?q=cheese&limit=1', headers=headers).json
+        self.assertEqual([result["name"] for result in ownMatches], ["Cheddar Cheese"])
+
+        itemID = self.client.get('/inventory/inventory?name=Milk', headers=headers).json["items"][0]["id"]
+        self.client.put(f'/inventory/inventory/{itemID}', json={"name": "Oat Milk", "quantity": 1, "expiry_date": "2030-01-01"},
+                        headers=headers)
+        self.assertEqual(search("oat"), ["Oat Milk"])
+        self.client.delete(f'/inventory/inventory/{itemID}', headers=headers)
+        self.assertEqual(search("milk"), [])
+
+        blankResponse = self.client.get('/inventory/inventory/search?q=+', headers=headers)
+        self.assertEqual(blankResponse.status_code, 400)
+
+    def testScanIngestionCoalescesBursts(self):
+        """
+        Test the write-behind scan ingestion endpoint.
+
+        Posts a burst of repeated detections, flushes the buffer and asserts they became a single item with the summed quantity. A later scan increments that item, one whose item is deleted mid-flush recreates it, malformed scans are rejected, and a full buffer answers 503 with Retry-After.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        with self.app.app_context():
+            importProducts(["upc,name,shelf_life_days", "012345678905,Whole Milk,7", "036000291452,Bread,3",
+                            "041196910759,Sea Salt,"])
+        scanBuffer = self.app.extensions['scanBuffer']
+
+        for _ in range(3):
+            response = self.client.post('/inventory/scans',
+                                        json={"scans": [{"upc": "012345678905"}, {"upc": "012345678905", "count": 2}]},
+                                        headers=headers)
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json["pending"], 1)
+        self.assertEqual(self.client.get('/inventory/inventory', headers=headers).json["items"], [])
+
+        scanBuffer.flush()
+        items = self.client.get('/inventory/inventory', headers=headers).json["items"]
+        self.assertEqual([(item["name"], item["quantity"]) for item in items], [("Whole Milk", 9)])
+
+        self.client.post('/inventory/scans', json={"scans": [{"upc": "012345678905"}]}, headers=headers)
+        scanBuffer.flush()
+        items = self.client.get('/inventory/inventory', headers=headers).json["items"]
+        self.assertEqual([(item["name"], item["quantity"]) for item in items], [("Whole Milk", 10)])
+
+        # An item deleted between the flush's lookup and its UPDATE gets the scans as a new item
+        self.client.post('/inventory/scans', json={"scans": [{"upc": "012345678905", "count": 2}]}, headers=headers)
+
+        def deleteBeforeUpdate(connection, cursor, statement, parameters, context, executemany):
+            if statement.startswith("UPDATE food_inventory SET quantity"):
+                cursor.connection.execute("DELETE FROM food_inventory WHERE id = ?", (items[0]["id"],))
+
+        with self.app.app_context():
+            engine = flask_db.engine
+        event.listen(engine, "before_cursor_execute", deleteBeforeUpdate)
+        try:
+            scanBuffer.flush()
+        finally:
+            event.remove(engine, "before_cursor_execute", deleteBeforeUpdate)
+        recreated = self.client.get('/inventory/inventory', headers=headers).json["items"]
+        self.assertEqual([(item["name"], item["quantity"]) for item in recreated], [("Whole Milk", 2)])
+        self.assertEqual(self.client.get('/inventory/scans/stats').status_code, 401)
+        stats = self.client.get('/inventory/scans/stats', headers=headers).json
+        self.assertEqual((stats["pending"], stats["items_created"], stats["items_incremented"]), (0, 2, 1))
+
+        numericResponse = self.client.post('/inventory/scans', json={"scans": [{"upc": 12345678905}]}, headers=headers)
+        self.assertEqual(numericResponse.status_code, 400)
+        booleanResponse = self.client.post('/inventory/scans', json={"scans": [{"upc": "012345678905", "count": True}]},
+                                           headers=headers)
+        self.assertEqual(booleanResponse.status_code, 400)
+        unusableResponse = self.client.post('/inventory/scans', json={"scans": [
+            {"upc": "012345678905"}, {"upc": "99999999"}, {"upc": "041196910759"}]}, headers=headers)
+        self.assertEqual(unusableResponse.status_code, 400)
+        self.assertEqual([error["upc"] for error in unusableResponse.json["errors"]], ["99999999", "041196910759"])
+        self.assertEqual(scanBuffer.pendingCount(), 0)
+
+        scanBuffer.maxPending = 1
+        self.client.post('/inventory/scans', json={"scans": [{"upc": "012345678905"}]}, headers=headers)
+        fullResponse = self.client.post('/inventory/scans', json={"scans": [{"upc": "036000291452"}]}, headers=headers)
+        self.assertEqual(fullResponse.status_code, 503)
+        self.assertIn("Retry-After", fullResponse.headers)
+        scanBuffer.flush()
+
+    def testExpiryQueries(self):
+        """
+        Test the expired and expiring endpoints.
+
+        Creates one expired item, one expiring tomorrow and one expiring next month, and asserts that each endpoint returns only the matching item.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        today = date.today()
+
+        for name, expiry in [("old", today - timedelta(days=2)), ("soon", today + timedelta(days=1)),
+                             ("later", today + timedelta(days=30))]:
+            self.client.post('inventory/inventory',
+                             json={"name": name, "quantity": 1, "expiry_date": expiry.isoformat()},
+                             headers={"Authorization": f"Bearer {accessToken}"})
+
+        expired = self.client.get('/inventory/inventory/expired', headers=headers).json
+        self.assertEqual([item["name"] for item in expired], ["old"])
+
+        expiring = self.client.get('/inventory/inventory/expiring?days=3', headers=headers).json
+        self.assertEqual([item["name"] for item in expiring], ["soon"])
+
+        # Writes keep the in-memory expiry tracker current
+        self.client.put(f'inventory/inventory/{expiring[0]["id"]}',
+                        json={"name": "soon", "quantity": 1, "expiry_date": (today + timedelta(days=10)).isoformat()},
+                        headers={"Authorization": f"Bearer {accessToken}"})
+        self.assertEqual(self.client.get('/inventory/inventory/expiring?days=3', headers=headers).json, [])
+
+        badDate = self.client.post('inventory/inventory',
+                                   json={"name": "bad", "quantity": 1, "expiry_date": "15/03/2023"},
+                                   headers={"Authorization": f"Bearer {accessToken}"})
+        self.assertEqual(badDate.status_code, 400)
+
+    def otherWorker(self):
+        """Returns a second app on the same database, standing in for another worker process or the CLI"""
+        otherApp = createApp(TestConfig)
+        self.addCleanup(otherApp.extensions['scanBuffer'].shutdown)
+        return otherApp
+
+    def testExpiryFollowsOtherWorkers(self):
+        """
+        Test the expired and expiring endpoints against writes made by another worker.
+
+        Loads the expiry tracker, then deletes and creates items through a second app sharing the database, and asserts that the first app serves the new state rather than its tracker's.
+
+        Returns:
+        None
+        """
+        headers = {"Authorization": f"Bearer {self.getAccessToken()}"}
+        today = date.today()
+        oldID = self.client.post('/inventory/inventory', json={
+            "name": "old", "quantity": 1, "expiry_date": (today - timedelta(days=2)).isoformat()}, headers=headers).json["id"]
+        expired = self.client.get('/inventory/inventory/expired', headers=headers)
+        self.assertEqual([item["name"] for item in expired.json], ["old"])
+
+        otherClient = self.otherWorker().test_client()
+        otherClient.delete(f'/inventory/inventory/{oldID}', headers=headers)
+        otherClient.post('/inventory/inventory', json={
+            "name": "soon", "quantity": 1, "expiry_date": (today + timedelta(days=1)).isoformat()}, headers=headers)
+
+        refetched = self.client.get('/inventory/inventory/expired', headers={**headers, "If-None-Match": expired.headers["ETag"]})
+        self.assertEqual((refetched.status_code, refetched.json), (200, []))
+        expiring = self.client.get('/inventory/inventory/expiring?days=3', headers=headers).json
+        self.assertEqual([item["name"] for item in expiring], ["soon"])
+
+        # Writes here after the reload are applied in place again
+        self.client.delete(f'/inventory/inventory/{expiring[0]["id"]}', headers=headers)
+        with queryBudget(1, app=self.app):
+            self.assertEqual(self.client.get('/inventory/inventory/expiring?days=3', headers=headers).json, [])
+
+    def testExportAndImport(self):
+        """
+        Test the streaming export and import endpoints.
+
+        Exports a user's inventory as NDJSON and CSV, imports each file into another user's inventory in small batches and asserts that the items arrive intact, that malformed records and lines that are not UTF-8 are skipped and reported by line, that a CSV file the parser gives up on is rejected with the counts imported before it, and that unsupported uploads are rejected.
+
+        Returns:
+        None
+        """
+        headers = {"Authorization": f"Bearer {self.getAccessToken()}"}
+        otherHeaders = {"Authorization": f"Bearer {self.getAccessToken('otheruser')}"}
+        for index in range(5):
+            self.client.post('/inventory/inventory', json={"name": f"Item, {index}", "quantity": index,
+                                                           "expiry_date": f"2030-01-0{index + 1}"}, headers=headers)
+        self.app.config['INVENTORY_EXPORT_CHUNK_ROWS'] = 2
+        self.app.config['INVENTORY_IMPORT_BATCH_SIZE'] = 2
+        items = self.client.get('/inventory/inventory', headers=headers).json["items"]
+
+        ndjsonResponse = self.client.get('/inventory/inventory/export', headers=headers)
+        self.assertEqual(ndjsonResponse.mimetype, "application/x-ndjson")
+        ndjson = ndjsonResponse.get_data(as_text=True)
+        self.assertEqual([jsonlib.loads(line) for line in ndjson.splitlines()], items)
+
+        csvResponse = self.client.get('/inventory/inventory/export?format=csv', headers=headers)
+        self.assertEqual(csvResponse.mimetype, "text/csv")
+        csvText = csvResponse.get_data(as_text=True)
+        self.assertEqual(csvText.splitlines()[:2], ["id,name,quantity,expiry_date", '1,"Item, 0",0,2030-01-01'])
+
+        ndjsonImport = self.client.post('/inventory/inventory/import', data=ndjson + '\n{"name": "Bad"}\nnot json\n',
+                                        content_type="application/x-ndjson", headers=otherHeaders)
+        self.assertEqual(ndjsonImport.json, {"imported": 5, "skipped": 2, "skipped_lines": [7, 8]})
+        csvImport = self.client.post('/inventory/inventory/import', data=csvText, content_type="text/csv",
+                                     headers=otherHeaders)
+        self.assertEqual(csvImport.json, {"imported": 5, "skipped": 0, "skipped_lines": []})
+
+        imported = self.client.get('/inventory/inventory', headers=otherHeaders).json["items"]
+        withoutIDs = [{key: value for key, value in item.items() if key != "id"} for item in items]
+        self.assertEqual([{key: value for key, value in item.items() if key != "id"} for item in imported],
+                         withoutIDs * 2)
+        self.assertEqual(self.client.get('/inventory/inventory/sync', headers=otherHeaders).json["version"], 6)
+
+        # Lines that are not UTF-8 are skipped like any malformed record
+        undecodable = ndjson.splitlines()[0].encode() + b'\n{"name": "Caf\xe9", "quantity": 1, "expiry_date": "2030-01-01"}\n'
+        self.assertEqual(self.client.post('/inventory/inventory/import', data=undecodable,
+                                          content_type="application/x-ndjson", headers=otherHeaders).json,
+                         {"imported": 1, "skipped": 1, "skipped_lines": [2]})
+        csvLines = csvText.encode().splitlines()
+        undecodable = b"\n".join(csvLines[:2] + [b"3,Caf\xe9,1,2030-01-01"] + csvLines[2:3]) + b"\n"
+        self.assertEqual(self.client.post('/inventory/inventory/import', data=undecodable, content_type="text/csv",
+                                          headers=otherHeaders).json,
+                         {"imported": 2, "skipped": 1, "skipped_lines": [3]})
+
+        # A CSV file the parser gives up on keeps the batches before it and says how far it got
+        unparseable = "\n".join(csvText.splitlines()[:4] + ["9," + "x" * 200000 + ",1,2030-01-01"]) + "\n"
+        stopped = self.client.post('/inventory/inventory/import', data=unparseable, content_type="text/csv",
+                                   headers=otherHeaders)
+        self.assertEqual(stopped.status_code, 400)
+        self.assertIn("field larger than field limit", stopped.json["message"])
+        self.assertEqual({key: stopped.json[key] for key in ("imported", "skipped", "skipped_lines")},
+                         {"imported": 3, "skipped": 0, "skipped_lines": []})
+        self.assertEqual(len(self.client.get('/inventory/inventory', headers=otherHeaders).json["items"]), 16)
+
+        self.assertEqual(self.client.post('/inventory/inventory/import', json=items[0], headers=otherHeaders).status_code, 415)
+        self.assertEqual(self.client.get('/inventory/inventory/export?format=xml', headers=headers).status_code, 400)
+
+    def testExpirySweeper(self):
+        """
+        Test the sweeper that archives long-expired items.
+
+        Creates items expired beyond and within the grace period, sweeps in chunks of two and asserts that only the former move to the archive, that sync reports them deleted and that the stats and /metrics report the work. Then runs the sweep-expired command from a second app on the same database, as from another process, and asserts that this app's expiry views and open event streams catch up.
+
+        Returns:
+        None
+        """
+        headers = {"Authorization": f"Bearer {self.getAccessToken()}"}
+        today = date.today()
+        for name, days in [("Old", -40), ("Older", -60), ("Oldest", -90), ("Recent", -5), ("Fresh", 10)]:
+            self.client.post('/inventory/inventory', json={"name": name, "quantity": 1,
+                                                           "expiry_date": (today + timedelta(days=days)).isoformat()},
+                             headers=headers)
+        self.assertEqual(len(self.client.get('/inventory/inventory/expired', headers=headers).json), 4)
+
+        sweeper = self.app.extensions['expirySweeper']
+        sweeper.chunkSize, sweeper.pauseSeconds = 2, 0
+        with self.app.app_context():
+            run = sweeper.run()
+            archived = [(row.name, row.item_id) for row in FoodInventoryArchive.query.order_by(FoodInventoryArchive.expiry_date)]
+        self.assertEqual((run["total"], run["archived"], run["chunks"]), (3, 3, 2))
+        self.assertEqual([name for name, _ in archived], ["Oldest", "Older", "Old"])
+
+        self.assertEqual([item["name"] for item in self.client.get('/inventory/inventory/expired', headers=headers).json],
+                         ["Recent"])
+        sync = self.client.get('/inventory/inventory/sync?since=5', headers=headers).json
+        self.assertEqual(sorted(tombstone["id"] for tombstone in sync["deleted"]), sorted(itemID for _, itemID in archived))
+
+        self.assertEqual(self.client.get('/inventory/sweeper/stats').status_code, 401)
+        stats = self.client.get('/inventory/sweeper/stats', headers=headers).json
+        self.assertEqual((stats["runs"], stats["archived"], stats["progress"]), (1, 3, None))
+        self.assertIn("foodinv_expiry_sweep_archived_total 3", self.client.get('/metrics').get_data(as_text=True))
+
+        broker = self.app.extensions['eventBroker']
+        subscriber = broker.subscribe(1, sync["version"])
+        result = self.otherWorker().test_cli_runner().invoke(args=["sweep-expired", "--grace-days", "0"])
+        self.assertIn("Archived 1 items", result.output)
+        self.assertEqual(self.client.get('/inventory/inventory/expired', headers=headers).json, [])
+        with self.app.app_context():
+            self.assertEqual(broker.poll(), [(1, sync["version"] + 1)])
+            self.assertEqual(broker.poll(), [])
+        self.assertEqual(subscriber.next(0), b'event: resync\ndata: {"version":%d}\n\n' % (sync["version"] + 1))
+        broker.unsubscribe(subscriber)
+
+    def testFastSerializationMatchesMarshal(self):
+        """
+        Test the column tuple serialization of the list endpoints.
+
+        Asserts that the list, sync and expiry endpoints return exactly what marshalling the ORM objects with their models gives, and that an X-Fields mask still applies.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        today = date.today()
+        for name, days in [("Milk", -1), ("Jam", 2), ("Rice", 90)]:
+            self.client.post('/inventory/inventory', headers=headers,
+                             json={"name": name, "quantity": days % 7, "expiry_date": (today + timedelta(days=days)).isoformat()})
+
+        with self.app.app_context():
+            items = FoodInventory.query.order_by(FoodInventory.id).all()
+            expected = jsonlib.loads(jsonlib.dumps(marshal(items, foodinvModel)))
+            expectedSync = jsonlib.loads(jsonlib.dumps(marshal(items, syncItemModel)))
+
+        page = self.client.get('/inventory/inventory', headers=headers).json
+        self.assertEqual(page, {"items": expected, "next_cursor": None})
+        self.assertEqual(self.client.get('/inventory/inventory/sync', headers=headers).json["items"], expectedSync)
+        self.assertEqual(self.client.get('/inventory/inventory/expired', headers=headers).json, expected[:1])
+        self.assertEqual(self.client.get('/inventory/inventory/expiring?days=7', headers=headers).json, expected[1:2])
+
+        masked = self.client.get('/inventory/inventory', headers={**headers, "X-Fields": "items{id,name}"}).json
+        self.assertEqual(masked, {"items": [{"id": item["id"], "name": item["name"]} for item in expected]})
+
+    def testRecipeSuggestions(self):
+        """
+        Test the use-it-first recipe suggestions.
+
+        Imports a small corpus with the import-recipes command, creates items expiring at different times and asserts the ranking, then changes and deletes items and asserts that the incrementally updated scores match ones built from scratch. Finally replaces the corpus from a second app with as many recipes and asserts the suggestions come from the new one.
+
+        Returns:
+        None
+        """
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as corpus:
+            corpus.write("name,ingredients\n"
+                         "Omelette,eggs;milk;butter;salt\n"
+                         "Pancakes,flour;eggs;milk;sugar\n"
+                         "Fried Rice,rice;eggs;onions;soy sauce\n"
+                         "Beef Stew,beef;carrots;potatoes;onions\n"
+                         "Nothing,\n")
+        result = self.app.test_cli_runner().invoke(args=["import-recipes", corpus.name])
+        os.unlink(corpus.name)
+        self.assertIn("Imported 4 recipes, skipped 1", result.output)
+
+        headers = {"Authorization": f"Bearer {self.getAccessToken()}"}
+        today = date.today()
+        itemIDs = {}
+        for name, quantity, days in [("Free Range Eggs", 6, 1), ("Whole Milk", 1, 2), ("Basmati Rice", 2, 30),
+                                     ("Butter", 1, -1), ("Carrots", 0, 5)]:
+            response = self.client.post('/inventory/inventory', json={
+                "name": name, "quantity": quantity, "expiry_date": (today + timedelta(days=days)).isoformat()},
+                headers=headers)
+            itemIDs[name] = response.json["id"]
+
+        suggestions = self.client.get('/recipes/suggestions', headers=headers).json
+        self.assertEqual([recipe["name"] for recipe in suggestions], ["Omelette", "Pancakes", "Fried Rice"])
+        self.assertEqual((suggestions[0]["coverage"], suggestions[0]["missing"], suggestions[0]["use_first"]),
+                         (0.5, ["butter", "salt"], ["Free Range Eggs", "Whole Milk"]))
+        self.assertEqual(self.client.get('/recipes/suggestions?max_missing=1', headers=headers).json, [])
+
+        # Unexpired butter completes more of the omelette; without eggs the fried rice drops below the pancakes
+        self.client.put(f"/inventory/inventory/{itemIDs['Butter']}", json={
+            "name": "Butter", "quantity": 1, "expiry_date": (today + timedelta(days=5)).isoformat()}, headers=headers)
+        self.client.delete(f"/inventory/inventory/{itemIDs['Free Range Eggs']}", headers=headers)
+        suggestions = self.client.get('/recipes/suggestions?limit=2', headers=headers).json
+        self.assertEqual([(recipe["name"], recipe["missing"]) for recipe in suggestions],
+                         [("Omelette", ["eggs", "salt"]), ("Pancakes", ["flour", "eggs", "sugar"])])
+
+        with self.app.app_context():
+            ranker = self.app.extensions['recipeCorpus'].get()
+            userID = flask_db.session.get(FoodInventory, itemIDs['Whole Milk']).user_id
+            pantry = ranker.pantries.get(userID)
+            rebuilt = ranker.buildPantry(usableItems(userID, today), today)
+        self.assertEqual(pantry.covered.tolist(), rebuilt.covered.tolist())
+        self.assertEqual([round(value, 9) for value in pantry.urgent.tolist()],
+                         [round(value, 9) for value in rebuilt.urgent.tolist()])
+
+        # A write from another worker is picked up on the next ranking, though no listener here saw it
+        self.otherWorker().test_client().delete(f"/inventory/inventory/{itemIDs['Whole Milk']}", headers=headers)
+        suggestions = self.client.get('/recipes/suggestions?limit=1', headers=headers).json
+        self.assertEqual([(recipe["name"], recipe["use_first"]) for recipe in suggestions], [("Omelette", ["Butter"])])
+
+        # A corpus replaced from another process with as many recipes reuses the ids, yet is still picked up
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as corpus:
+            corpus.write("".join(jsonlib.dumps({"name": name, "ingredients": ingredients}) + "\n" for name, ingredients in [
+                ("Rice Pudding", ["rice", "milk", "sugar"]), ("Butter Rice", ["butter", "rice"]),
+                ("Toast", ["bread", "butter"]), ("Tea", ["tea"])]))
+        result = self.otherWorker().test_cli_runner().invoke(args=["import-recipes", "--replace", corpus.name])
+        os.unlink(corpus.name)
+        self.assertIn("Imported 4 recipes", result.output)
+        suggestions = self.client.get('/recipes/suggestions?limit=1', headers=headers).json
+        self.assertEqual([(recipe["name"], recipe["coverage"]) for recipe in suggestions], [("Butter Rice", 1.0)])
+
+    def testConsumptionForecast(self):
+        """
+        Test the consumption event log and the run-out forecasts built on it.
+
+        Changes quantities through the PUT, PATCH, deltas and DELETE endpoints and asserts the logged deltas, then backdates the events and asserts the fitted rates against a per-item least-squares fit, the run-out ordering and the low-stock list.
+
+        Returns:
+        None
+        """
+        headers = {"Authorization": f"Bearer {self.getAccessToken()}"}
+        expiryDate = (date.today() + timedelta(days=60)).isoformat()
+        itemIDs = {}
+        for name, quantity in [("Milk", 10), ("Rice", 5), ("Jam", 3), ("Tea", 2)]:
+            itemIDs[name] = self.client.post('/inventory/inventory', json={
+                "name": name, "quantity": quantity, "expiry_date": expiryDate}, headers=headers).json["id"]
+        for _ in range(3):
+            self.client.patch(f"/inventory/inventory/{itemIDs['Milk']}", json={"delta": -1}, headers=headers)
+        self.client.post('/inventory/inventory/deltas', json={"deltas": [{"id": itemIDs['Rice'], "delta": -4}]},
+                         headers=headers)
+        self.client.put(f"/inventory/inventory/{itemIDs['Jam']}", json={
+            "name": "Apricot Jam", "quantity": 3, "expiry_date": expiryDate}, headers=headers)  # Logs nothing
+        self.client.delete(f"/inventory/inventory/{itemIDs['Tea']}", headers=headers)
+
+        # Spreads the history over the last ten days, oldest first
+        ages = {itemIDs['Milk']: [10, 8, 6, 4], itemIDs['Rice']: [10, 2], itemIDs['Jam']: [10], itemIDs['Tea']: [10, 9]}
+        now = datetime.utcnow()
+        with self.app.app_context():
+            events = InventoryEvent.query.order_by(InventoryEvent.id).all()
+            self.assertEqual([(quantityEvent.item_id, quantityEvent.delta) for quantityEvent in events],
+                             [(itemIDs['Milk'], 10), (itemIDs['Rice'], 5), (itemIDs['Jam'], 3), (itemIDs['Tea'], 2),
+                              (itemIDs['Milk'], -1), (itemIDs['Milk'], -1), (itemIDs['Milk'], -1),
+                              (itemIDs['Rice'], -4), (itemIDs['Tea'], -2)])
+            for quantityEvent in events:
+                quantityEvent.created_at = now - timedelta(days=ages[quantityEvent.item_id].pop(0))
+            flask_db.session.commit()
+
+        self.client.post('/inventory/inventory', json={"name": "Salt", "quantity": 1, "expiry_date": expiryDate},
+                         headers=headers)
+        forecasts = self.client.get('/inventory/inventory/forecast?window=28', headers=headers).json
+        self.assertEqual([forecast["name"] for forecast in forecasts], ["Rice", "Milk", "Apricot Jam", "Salt"])
+        rice, milk, jam, salt = forecasts
+
+        # Cumulative consumption from where each history starts (day 18 of 28) to now
+        for forecast, points in [(milk, [(18, 0), (18, 0), (20, 1), (22, 2), (24, 3), (28, 3)]),
+                                 (rice, [(18, 0), (18, 0), (26, 4), (28, 4)])]:
+            slope = numpy.polyfit(*zip(*points), 1)[0]
+            self.assertAlmostEqual(forecast["daily_rate"], slope, places=2)
+            self.assertAlmostEqual(forecast["days_left"], forecast["quantity"] / slope, places=0)
+        self.assertEqual((jam["daily_rate"], jam["days_left"], jam["run_out_date"]), (0.0, None, None))
+        self.assertEqual((salt["daily_rate"], salt["days_left"]), (None, None))  # Too new to fit
+
+        lowStock = self.client.get('/inventory/inventory/low-stock?days=7', headers=headers).json
+        self.assertEqual([item["name"] for item in lowStock], ["Rice", "Salt"])
+        self.assertEqual(self.client.get('/inventory/inventory/low-stock?days=7&threshold=0', headers=headers).json,
+                         lowStock[:1])
+
+    def testForecastPastLastDate(self):
+        """
+        Test the run-out forecast of an item whose stock outlasts the calendar.
+
+        Logs a single unit used from a billion over ten days and asserts that the forecast and low-stock endpoints report no run-out for it instead of failing.
+
+        Returns:
+        None
+        """
+        headers = {"Authorization": f"Bearer {self.getAccessToken()}"}
+        itemID = self.client.post('/inventory/inventory', json={
+            "name": "Salt", "quantity": 10 ** 9, "expiry_date": "2030-01-01"}, headers=headers).json["id"]
+        self.client.patch(f'/inventory/inventory/{itemID}', json={"delta": -1}, headers=headers)
+        now = datetime.utcnow()
+        with self.app.app_context():
+            for quantityEvent, age in zip(InventoryEvent.query.order_by(InventoryEvent.id).all(), [10, 5]):
+                quantityEvent.created_at = now - timedelta(days=age)
+            flask_db.session.commit()
+
+        forecastResponse = self.client.get('/inventory/inventory/forecast', headers=headers)
+        self.assertEqual(forecastResponse.status_code, 200)
+        salt, = forecastResponse.json
+        self.assertGreater(salt["daily_rate"], 0)
+        self.assertEqual((salt["days_left"], salt["run_out_date"]), (None, None))
+        lowStockResponse = self.client.get('/inventory/inventory/low-stock', headers=headers)
+        self.assertEqual((lowStockResponse.status_code, lowStockResponse.json), (200, []))
+
     def tearDown(self):
+        self.app.extensions['scanBuffer'].shutdown()  # Writes buffered scans while their tables still exist
         with self.app.app_context():
             flask_db.session.remove()
             flask_db.drop_all()
 
 
+class AsgiTestClient:
+    """Drives an ASGI app with the same call shape as Flask's test client"""
+
+    def __init__(self, asgiApp):
+        self.asgiApp = asgiApp
+
+    def open(self, path, method="GET", json=None, headers=None, data=None, content_type=None):
+        path, _, query = path.partition("?")
+        body = jsonlib.dumps(json).encode() if json is not None else (data.encode() if isinstance(data, str) else data or b"")
+        requestHeaders = {"content-length": str(len(body)), **{name.lower(): value for name, value in (headers or {}).items()}}
+        if json is not None or content_type is not None:
+            requestHeaders["content-type"] = content_type or "application/json"
+
+        scope = {
+            "type": "http", "http_version": "1.1", "method": method, "scheme": "http",
+            "path": path if path.startswith("/") else f"/{path}", "query_string": query.encode(),
+            "headers": [(name.encode(), value.encode()) for name, value in requestHeaders.items()],
+            "server": ("localhost", 80), "client": ("127.0.0.1", 12345),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.Event().wait()  # The client stays connected until the response is complete
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.asgiApp(scope, receive, send))
+
+        start = sent[0]
+        return Response(b"".join(message.get("body", b"") for message in sent[1:]), status=start["status"],
+                        headers=[(name.decode(), value.decode()) for name, value in start["headers"]])
+
+    def get(self, path, **kwargs):
+        return self.open(path, method="GET", **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, method="POST", **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.open(path, method="PUT", **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.open(path, method="PATCH", **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open(path, method="DELETE", **kwargs)
+
+
+class AsgiAPITestCase(APITestCase):
+    """Runs every APITestCase scenario against the ASGI serving mode"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = AsgiTestClient(AsgiAdapter(self.app, maxThreads=4))
+
+    def testInventoryStream(self):
+        """
+        Test the Server-Sent Events change feed over ASGI.
+
+        Opens a stream through the adapter, asserts that no thread waits on it, writes to the user's inventory from another thread and asserts that the event arrives, then disconnects and asserts that the stream was unsubscribed.
+
+        Returns:
+        None
+        """
+        accessToken = self.getAccessToken()
+        headers = {"Authorization": f"Bearer {accessToken}"}
+        broker = self.app.extensions['eventBroker']
+        sent = []
+
+        async def openStream():
+            messages = [{"type": "http.request", "body": b"", "more_body": False}]
+            eventArrived = asyncio.Event()
+
+            async def receive():
+                if messages:
+                    return messages.pop(0)
+                await eventArrived.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+                if message.get("body", b"").startswith(b"event: create"):
+                    eventArrived.set()
+
+            scope = {"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+                     "path": "/inventory/stream", "query_string": f"jwt={accessToken}".encode(), "headers": [],
+                     "server": ("localhost", 80), "client": ("127.0.0.1", 12345)}
+            threadsBefore = set(threading.enumerate())
+            stream = asyncio.create_task(self.client.asgiApp(scope, receive, send))
+            while broker.count == 0:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            self.assertEqual([thread for thread in set(threading.enumerate()) - threadsBefore
+                              if thread.name.startswith("asgi-stream")], [])
+
+            await loopThread(self.app.test_client().post, '/inventory/inventory',
+                             json={"name": "Pasta", "quantity": 2, "expiry_date": "2030-01-01"}, headers=headers)
+            await asyncio.wait_for(stream, 5)
+
+        def loopThread(function, *args, **kwargs):
+            return asyncio.get_running_loop().run_in_executor(None, lambda: function(*args, **kwargs))
+
+        asyncio.run(openStream())
+        self.assertEqual(sent[0]["status"], 200)
+        bodies = [message.get("body", b"") for message in sent[1:]]
+        self.assertIn(b"connected", bodies[0])
+        event, data = bodies[1].decode().split("\n")[:2]
+        self.assertEqual(event, "event: create")
+        self.assertEqual(jsonlib.loads(data[len("data: "):])["items"][0]["name"], "Pasta")
+        self.assertEqual(broker.count, 0)
+
+
+class ProductionProfileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        databasePath = os.path.join(self.directory.name, "prod.db")
+
+        class ProfileConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + databasePath
+            SQLALCHEMY_BINDS = {"read": f"sqlite:///file:{databasePath}?mode=ro&uri=true"}
+            SQLALCHEMY_ENGINE_OPTIONS = ProdConfig.SQLALCHEMY_ENGINE_OPTIONS
+            SQLITE_PRAGMAS = ProdConfig.SQLITE_PRAGMAS
+
+        self.app = createApp(ProfileConfig)
+        self.client = self.app.test_client(self)
+
+        with self.app.app_context():
+            flask_db.create_all(bind_key=None)
+
+    def testPragmasAndReadRouting(self):
+        """
+        Test the production database profile.
+
+        Asserts that connections use WAL mode with the configured pragmas, and that inventory GETs run on the read engine while writes stay on the primary.
+
+        Returns:
+        None
+        """
+        with self.app.app_context():
+            connection = flask_db.engines[None].connect()
+            self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+            self.assertEqual(connection.execute(text("PRAGMA synchronous")).scalar(), 1)  # NORMAL
+            connection.close()
+            readStatements = []
+            event.listen(flask_db.engines["read"], "before_cursor_execute",
+                         lambda *args: readStatements.append(args[2]))
+
+        self.client.post('/auth/register', json={"username": "prod", "email": "prod@company.com", "password": "password"})
+        accessToken = self.client.post('/auth/login', json={"username": "prod", "password": "password"}).json["accessToken"]
+        headers = {"Authorization": f"Bearer {accessToken}"}
+
+        createResponse = self.client.post('inventory/inventory',
+                                          json={"name": "milk", "quantity": 1, "expiry_date": "2023-03-15"},
+                                          headers=headers)
+        self.assertEqual(createResponse.status_code, 201)
+        self.assertEqual(readStatements, [])
+
+        listResponse = self.client.get('/inventory/inventory', headers=headers)
+        self.assertEqual(listResponse.json["items"][0]["name"], "milk")
+        self.assertTrue(any("food_inventory" in statement for statement in readStatements))
+
+    def tearDown(self):
+        with self.app.app_context():
+            flask_db.session.remove()
+            for engine in flask_db.engines.values():
+                engine.dispose()
+        self.directory.cleanup()
+
+
+class ExpiryTrackerTestCase(unittest.TestCase):
+    def testTickEmitsEachExpiryOnce(self):
+        """
+        Test the expiry tracker heap.
+
+        Loads three items, ticks past the first expiry and asserts it is emitted once, then moves it into the future and asserts it is tracked as expiring again.
+
+        Returns:
+        None
+        """
+        today = date(2023, 3, 15)
+        tracker = ExpiryTracker()
+        tracker.load([
+            {"id": 1, "name": "milk", "quantity": 1, "expiry_date": today - timedelta(days=1), "user_id": 1},
+            {"id": 2, "name": "eggs", "quantity": 6, "expiry_date": today + timedelta(days=2), "user_id": 1},
+            {"id": 3, "name": "rice", "quantity": 1, "expiry_date": today + timedelta(days=90), "user_id": 1},
+            {"id": 4, "name": "soup", "quantity": 2, "expiry_date": today + timedelta(days=1), "user_id": 2}
+        ])
+        emitted = []
+        tracker.listeners.append(emitted.append)
+
+        self.assertEqual([row["id"] for row in tracker.tick(today)], [1])
+        self.assertEqual(tracker.tick(today), [])
+        self.assertEqual(len(emitted), 1)
+        self.assertEqual([row["id"] for row in tracker.expiredItems(1, today)], [1])
+        self.assertEqual([row["id"] for row in tracker.expiringWithin(1, 7, today)], [2])
+        self.assertEqual([row["id"] for row in tracker.expiringWithin(2, 7, today)], [4])
+
+        tracker.track({"id": 1, "name": "milk", "quantity": 1, "expiry_date": today + timedelta(days=1), "user_id": 1})
+        tracker.untrack(2)
+        self.assertEqual(tracker.expiredItems(1, today), [])
+        self.assertEqual([row["id"] for row in tracker.expiringWithin(1, 7, today)], [1])
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    def testEvictionExpiryAndTags(self):
+        """
+        Test LRU eviction, TTL expiry and tag invalidation of the cache backend.
+
+        Returns:
+        None
+        """
+        now = [0]
+        cache = LRUCache(maxEntries=2, ttl=10, clock=lambda: now[0])
+
+        cache.set("a", 1, tags=["list:1"])
+        cache.set("b", 2, tags=["item:2"])
+        cache.get("a")  # a is now the most recently used
+        cache.set("c", 3, tags=["list:1"])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        self.assertEqual(cache.invalidate(["list:1"]), 2)
+        self.assertIsNone(cache.get("a"))
+
+        cache.set("d", 4)
+        now[0] = 10
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def testByteBound(self):
+        """
+        Test that the cache backend evicts by approximate size as well as by count, and does not store a value larger than its whole budget.
+
+        Returns:
+        None
+        """
+        value = {"items": [{"name": "x" * 1000}]}
+        cache = LRUCache(maxEntries=10, ttl=10, maxBytes=approximateSize(value) * 2)
+
+        cache.set("a", value)
+        cache.set("b", value)
+        cache.set("c", value)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual((cache.stats()["entries"], cache.stats()["bytes"]), (2, approximateSize(value) * 2))
+
+        cache.set("d", {"items": [{"name": "x" * 1000}] * 3})
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(cache.get("c"), value)
+        self.assertEqual((cache.stats()["oversized"], cache.stats()["evictions"]), (1, 1))
+
+
+class PasswordHasherTestCase(unittest.TestCase):
+    def testProcessPool(self):
+        """
+        Test hashing and checking passwords in a one-process pool, and that shutting it down releases the pool and its exit hook.
+
+        Returns:
+        None
+        """
+        hasher = PasswordHasher("pbkdf2:sha256:1000", workers=1)
+        passwordHash = hasher.hash("password")
+        self.assertTrue(passwordHash.startswith("pbkdf2:sha256:1000$"))
+        self.assertTrue(hasher.verify(passwordHash, "password"))
+        self.assertFalse(hasher.verify(passwordHash, "wrong"))
+        self.assertIsNotNone(hasher.pool)
+
+        hasher.shutdown()
+        self.assertIsNone(hasher.pool)
+        self.assertTrue(hasher.verify(hasher.hash("again"), "again"))  # A new pool is started on demand
+        hasher.shutdown()
+
+    def testNeedsRehash(self):
+        """
+        Test that a method configured without a cost matches hashes werkzeug made with its default cost.
+
+        Returns:
+        None
+        """
+        hasher = PasswordHasher("pbkdf2:sha256")
+        self.assertFalse(hasher.needsRehash(f"pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}$salt$digest"))
+        self.assertTrue(hasher.needsRehash("pbkdf2:sha256:1000$salt$digest"))
+        self.assertTrue(PasswordHasher("pbkdf2:sha256:600000").needsRehash("pbkdf2:sha256:1000$salt$digest"))
+
+
+class EventBrokerTestCase(unittest.TestCase):
+    def testFanOutAndSlowConsumerDrop(self):
+        """
+        Test that published events reach only their user's subscribers, that a subscriber falling maxQueue frames behind is dropped, and that subscriptions are capped.
+
+        Returns:
+        None
+        """
+        broker = EventBroker(maxQueue=2, maxSubscribers=3)
+        fast, slow, other = broker.subscribe(1), broker.subscribe(1), broker.subscribe(2)
+        self.assertIsNone(broker.subscribe(3))
+
+        broker.publish(1, "update", {"items": [{"id": 1, "expiry_date": date(2030, 1, 1)}]})
+        self.assertEqual(fast.next(0), b'event: update\ndata: {"items":[{"id":1,"expiry_date":"2030-01-01"}]}\n\n')
+        self.assertIsNone(other.next(0))
+
+        broker.publish(1, "update", {})
+        fast.next(0)
+        self.assertFalse(slow.dropped)
+        broker.publish(1, "delete", {})
+        self.assertEqual(fast.next(0), b"event: delete\ndata: {}\n\n")
+        self.assertTrue(slow.dropped)
+        self.assertIsNone(slow.next(0))
+        self.assertEqual((broker.count, broker.stats["dropped"]), (2, 1))
+
+
+class QueryBudgetTestCase(unittest.TestCase):
+    def testFullScanPlanWording(self):
+        """
+        Test that full scans are recognised in the plan wording of both current and older SQLite versions.
+
+        Returns:
+        None
+        """
+        plans = {
+            "SCAN food_inventory": "food_inventory",
+            "SCAN TABLE food_inventory": "food_inventory",
+            "SCAN food_inventory USING INDEX ix_food_inventory_name": "food_inventory",
+            "SCAN TABLE food_inventory USING INDEX ix_food_inventory_name": "food_inventory",
+            "SCAN CONSTANT ROW": None,
+            "SCAN food_inventory_fts VIRTUAL TABLE INDEX 0:M1": None,
+            "SCAN TABLE food_inventory_fts VIRTUAL TABLE INDEX 0:M1": None,
+            "SEARCH food_inventory USING INDEX ix_food_inventory_user_id (user_id=?)": None,
+        }
+        for plan, table in plans.items():
+            with self.subTest(plan=plan):
+                match = FULL_SCAN.match(plan)
+                self.assertEqual(match and match.group(1), table)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,165 @@
+import csv
+import io
+import json
+from datetime import date
+from sqlalchemy import insert, select
+from exts import db
+from models import FoodInventory, commitInventoryChange
+
+EXPORT_CHUNK_ROWS = 1000
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_SKIPS = 100
+
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+IMPORT_FORMATS = {"application/x-ndjson": "ndjson", "application/jsonl": "ndjson", "text/csv": "csv"}
+
+
+class ImportStopped(Exception):
+    """Raised when an upload cannot be read any further; carries what was imported up to that point"""
+
+    def __init__(self, message, imported, skipped, skippedLines):
+        super().__init__(message)
+        self.message = message
+        self.imported = imported
+        self.skipped = skipped
+        self.skippedLines = skippedLines
+
+
+def exportInventory(encoder, userID, format="ndjson", chunkRows=EXPORT_CHUNK_ROWS):
+    """
+    Yields userID's items, in id order, as NDJSON lines or CSV rows encoded to UTF-8.
+    The rows are read through a server-side cursor chunkRows at a time (yield_per) and each chunk is encoded
+    and yielded before the next is fetched, so memory stays flat however large the inventory is.
+    :param encoder: RowEncoder giving the columns to select and the shape of each record
+    :param format: "ndjson" for one JSON object per line, or "csv" with a header row
+    """
+    statement = (select(*encoder.columns).where(FoodInventory.user_id == userID).order_by(FoodInventory.id)
+                 .execution_options(yield_per=chunkRows))
+    fieldNames = list(encoder.model.resolved)
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldNames, lineterminator="\n")
+        writer.writeheader()
+
+    for partition in db.session.execute(statement).partitions():
+        records = encoder.rows(partition)
+        if format == "csv":
+            writer.writerows(records)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            chunk = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        yield chunk.encode()
+
+    if format == "csv" and buffer.tell():
+        yield buffer.getvalue().encode()  # The header of an empty export
+
+
+def parseImportRecord(record):
+    """Returns the name, quantity and expiry_date of an imported record, or None if it is malformed"""
+    if not isinstance(record, dict):
+        return None
+    name = record.get("name")
+    quantity = record.get("quantity")
+    if isinstance(quantity, str) and quantity.strip().isdigit():
+        quantity = int(quantity)  # CSV values are all strings
+    if not isinstance(name, str) or not name.strip() or isinstance(quantity, bool) \
+            or not isinstance(quantity, int) or quantity < 0:
+        return None
+    try:
+        expiryDate = date.fromisoformat(record.get("expiry_date"))
+    except (TypeError, ValueError):
+        return None
+    return {"name": name.strip(), "quantity": quantity, "expiry_date": expiryDate}
+
+
+def decodeLines(stream, badLines):
+    """Yields the lines of a binary stream decoded as UTF-8, adding the numbers of undecodable ones to badLines"""
+    for number, line in enumerate(stream, start=1):
+        try:
+            yield line.decode("utf-8")
+        except UnicodeDecodeError:
+            badLines.add(number)
+            yield line.decode("utf-8", errors="replace")
+
+
+def readRecords(stream, format):
+    """
+    Yields (line number, record) from a binary stream of NDJSON or CSV, decoding it a line at a time.
+    Records on lines that are not valid UTF-8 are yielded as None. A CSV file the csv module cannot parse
+    any further raises csv.Error.
+    """
+    badLines = set()
+    lines = decodeLines(stream, badLines)
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        lastLine = 1  # The header
+        for record in reader:
+            # A quoted field may span lines, so the record covers every line read since the previous one
+            if badLines.intersection(range(lastLine + 1, reader.line_num + 1)):
+                record = None
+            lastLine = reader.line_num
+            yield reader.line_num, record
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        if number in badLines:
+            yield number, None
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def importInventory(stream, userID, format="ndjson", batchSize=IMPORT_BATCH_SIZE):
+    """
+    Creates items for userID from a stream of NDJSON or CSV records with name, quantity and expiry_date.
+    Records are parsed as they are read and inserted batchSize at a time, each batch as one executemany
+    INSERT in its own transaction, so memory stays flat however large the upload is. Ids in the records are
+    ignored; every record becomes a new item. Malformed records, including lines that are not valid UTF-8, are
+    skipped. Batches are committed as they fill, so if a CSV upload cannot be parsed any further the records
+    read before that point stay imported, and the ImportStopped raised reports how many.
+    :return: A tuple of (imported, skipped, skippedLines) where skippedLines are the line numbers of the first
+             MAX_REPORTED_SKIPS skipped records
+    """
+    statement = insert(FoodInventory).returning(FoodInventory.id, FoodInventory.name, FoodInventory.quantity,
+                                                FoodInventory.expiry_date, FoodInventory.user_id)
+    imported = skipped = 0
+    skippedLines = []
+    batch = []
+
+    def flush():
+        try:
+            created = [row._asdict() for row in db.session.execute(statement, batch)]
+        except Exception:
+            db.session.rollback()
+            raise
+        commitInventoryChange(("create", created))
+        batch.clear()
+
+    try:
+        for number, record in readRecords(stream, format):
+            values = parseImportRecord(record)
+            if values is None:
+                skipped += 1
+                if len(skippedLines) < MAX_REPORTED_SKIPS:
+                    skippedLines.append(number)
+                continue
+
+            batch.append({**values, "user_id": userID})
+            imported += 1
+            if len(batch) >= batchSize:
+                flush()
+    except csv.Error as error:
+        if batch:
+            flush()
+        raise ImportStopped(f"Import stopped after {imported + skipped} records: {error}",
+                            imported, skipped, skippedLines)
+
+    if batch:
+        flush()
+    return imported, skipped, skippedLines